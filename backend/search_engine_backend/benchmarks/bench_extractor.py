@@ -0,0 +1,142 @@
+"""
+Benchmark the streaming HTML extractor against the BeautifulSoup extractor
+
+Usage:
+    python benchmarks/bench_extractor.py [--pages 200] [--paragraphs 80]
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import time
+from typing import List, Dict
+from bs4 import BeautifulSoup
+from src.crawler import WebCrawler
+from src.extractor import HTMLExtractor, etree
+
+WORDS = ('search engine crawler index python flask query ranking page content '
+         'domain link title meta keyword mesin pencari halaman data').split()
+
+def generate_page(rng: random.Random, paragraphs: int) -> bytes:
+    """Build a synthetic article page with navigation, scripts and links"""
+    def sentence(length):
+        return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+    body = []
+    for number in range(paragraphs):
+        body.append(f'<p>{sentence(40)} <a href="/article/{number}">{sentence(3)}</a> '
+                    f'<b>{sentence(5)}</b></p>')
+        if number % 10 == 0:
+            body.append(f'<script>var tracking_{number} = "{sentence(10)}";</script>')
+
+    return f'''<!DOCTYPE html>
+<html><head>
+<meta charset="utf-8">
+<title>{sentence(6)}</title>
+<meta name="description" content="{sentence(20)}">
+<meta name="keywords" content="{', '.join(WORDS[:5])}">
+<style>body {{ font-family: sans-serif; }}</style>
+</head><body>
+<header><a href="/">Home</a> {sentence(5)}</header>
+<nav>{''.join(f'<a href="/section/{n}">{sentence(2)}</a>' for n in range(30))}</nav>
+<main>{''.join(body)}</main>
+<footer>{sentence(15)}</footer>
+</body></html>'''.encode('utf-8')
+
+# BeautifulSoup extraction crawl_page performed before the streaming
+# extractor, kept here as the baseline
+
+def extract_text_content(soup: BeautifulSoup) -> str:
+    """Extract clean text content from HTML"""
+    # Remove script and style elements
+    for script in soup(["script", "style", "nav", "footer", "header"]):
+        script.decompose()
+
+    # Get text and clean it
+    text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
+
+def extract_metadata(soup: BeautifulSoup) -> Dict[str, str]:
+    """Extract title, meta description and meta keywords from HTML"""
+    metadata = {
+        'title': '',
+        'description': '',
+        'keywords': ''
+    }
+
+    title_tag = soup.find('title')
+    if title_tag:
+        metadata['title'] = title_tag.get_text().strip()
+
+    desc_tag = soup.find('meta', attrs={'name': 'description'})
+    if desc_tag:
+        metadata['description'] = desc_tag.get('content', '').strip()
+
+    keywords_tag = soup.find('meta', attrs={'name': 'keywords'})
+    if keywords_tag:
+        metadata['keywords'] = keywords_tag.get('content', '').strip()
+
+    return metadata
+
+def extract_links(crawler: WebCrawler, soup: BeautifulSoup, base_url: str) -> List[str]:
+    """Allowed links of a parsed page, cleaned and de-duplicated in document order"""
+    return crawler.resolve_links(
+        (link['href'] for link in soup.find_all('a', href=True)), base_url
+    )
+
+def soup_extract(crawler: WebCrawler, html: bytes, base_url: str):
+    """The extraction steps crawl_page performed before the streaming extractor"""
+    soup = BeautifulSoup(html, 'html.parser')
+    links = extract_links(crawler, soup, base_url)
+    content = extract_text_content(soup)
+    metadata = extract_metadata(soup)
+    return content, metadata, links
+
+def stream_extract(crawler: WebCrawler, extractor: HTMLExtractor, html: bytes, base_url: str):
+    extracted = extractor.extract(html, 'text/html; charset=utf-8')
+    return extracted, crawler.resolve_links(extracted['links'], base_url)
+
+def measure(name, func, pages):
+    start = time.perf_counter()
+    for html in pages:
+        func(html)
+    elapsed = time.perf_counter() - start
+    total_mb = sum(len(html) for html in pages) / 1e6
+    print(f"{name:<28} {elapsed:8.3f}s {len(pages) / elapsed:9.1f} pages/s {total_mb / elapsed:7.2f} MB/s")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--paragraphs', type=int, default=80)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pages = [generate_page(rng, args.paragraphs) for _ in range(args.pages)]
+    base_url = 'http://example.com/'
+    crawler = WebCrawler(['example.com'])
+
+    print(f"{args.pages} pages, {sum(map(len, pages)) / args.pages / 1024:.1f} KiB average")
+    baseline = measure('BeautifulSoup (html.parser)',
+                       lambda html: soup_extract(crawler, html, base_url), pages)
+
+    stdlib = HTMLExtractor(use_lxml=False)
+    elapsed = measure('streaming (html.parser)',
+                      lambda html: stream_extract(crawler, stdlib, html, base_url), pages)
+    print(f"{'':<28} {baseline / elapsed:8.2f}x faster")
+
+    if etree is not None:
+        fast = HTMLExtractor(use_lxml=True)
+        elapsed = measure('streaming (lxml)',
+                          lambda html: stream_extract(crawler, fast, html, base_url), pages)
+        print(f"{'':<28} {baseline / elapsed:8.2f}x faster")
+    else:
+        print("lxml not installed, skipping the lxml fast path")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""
+Benchmark crawling, indexing and searching a synthetic corpus
+
+Serves N generated HTML pages from local HTTP servers, crawls them with
+WebCrawler.crawl_urls, indexes them with SearchIndexer.index_pages into a
+fresh database and replays generated queries against /api/search. Results
+are printed and can be written as JSON to compare commits.
+
+Usage:
+    python benchmarks/bench_search.py [--sizes 200,1000] [--queries 300]
+        [--output results.json] [--compare baseline.json] [--segments]
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import logging
+import math
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from flask import Flask
+from src.models.page import db, upgrade_schema
+from src.storage import init_storage
+from src.routes import search as search_routes
+from src.crawler import WebCrawler
+from src.extractor import etree
+
+WORDS = ('search engine crawler index python flask query ranking page content '
+         'domain link title meta keyword mesin pencari halaman data membaca '
+         'menulis pencarian berita teknologi database server network cache').split()
+
+# Rarer words so that queries have a realistic spread of document frequencies
+RARE_WORDS = [f'{word}{number}' for word in WORDS[:10] for number in range(50)]
+
+def generate_page(seed: int, number: int, pages: int, paragraphs: int) -> bytes:
+    """Build page `number` of the corpus (deterministic for a seed)"""
+    rng = random.Random(seed * 1000003 + number)
+
+    def sentence(length):
+        return ' '.join(
+            rng.choice(RARE_WORDS) if rng.random() < 0.1 else rng.choice(WORDS)
+            for _ in range(length)
+        )
+
+    body = []
+    for _ in range(paragraphs):
+        target = rng.randrange(pages)
+        body.append(f'<p>{sentence(40)} <a href="/page/{target}">{sentence(3)}</a></p>')
+
+    return f'''<!DOCTYPE html>
+<html><head>
+<meta charset="utf-8">
+<title>{sentence(6)}</title>
+<meta name="description" content="{sentence(20)}">
+<meta name="keywords" content="{', '.join(rng.sample(WORDS, 5))}">
+</head><body>
+<nav>{''.join(f'<a href="/page/{rng.randrange(pages)}">{sentence(2)}</a>' for _ in range(10))}</nav>
+<main>{''.join(body)}</main>
+<script>var tracking = "{sentence(5)}";</script>
+</body></html>'''.encode('utf-8')
+
+def start_servers(count: int, seed: int, pages: int, paragraphs: int):
+    """Start local HTTP servers that serve the corpus under /page/<number>"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            try:
+                number = int(self.path.rsplit('/', 1)[-1])
+            except ValueError:
+                number = -1
+            if not 0 <= number < pages:
+                self.send_error(404)
+                return
+            body = generate_page(seed, number, pages, paragraphs)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    servers = []
+    for _ in range(count):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    return servers
+
+def generate_queries(rng: random.Random, count: int):
+    """Mix of single words, conjunctions, phrases and prefixes"""
+    queries = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.5:
+            queries.append(rng.choice(WORDS + RARE_WORDS))
+        elif kind < 0.75:
+            queries.append(f'{rng.choice(WORDS)} {rng.choice(RARE_WORDS)}')
+        elif kind < 0.9:
+            queries.append(f'"{rng.choice(WORDS)} {rng.choice(WORDS)}"')
+        else:
+            queries.append(rng.choice(WORDS)[:3] + '*')
+    return queries
+
+def percentile(values, percent: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+def create_app(directory: str, segments: bool) -> Flask:
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Every query must hit the index, not the response cache
+    app.config['SEARCH_CACHE_SIZE'] = 1
+    app.config['CRAWL_JOB_WORKERS'] = 1
+    if segments:
+        app.config['SEARCH_SEGMENT_DIR'] = os.path.join(directory, 'segments')
+    app.register_blueprint(search_routes.search_bp, url_prefix='/api')
+    init_storage(app)
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+        search_routes.init_search_routes(app)
+    return app
+
+def run_size(size: int, args) -> dict:
+    servers = start_servers(args.hosts, args.seed, size, args.paragraphs)
+    hosts = [f'127.0.0.1:{server.server_address[1]}' for server in servers]
+    urls = [f'http://{hosts[number % len(hosts)]}/page/{number}' for number in range(size)]
+
+    try:
+        crawler = WebCrawler(hosts, delay=0, max_workers=len(hosts), host_pool_size=2)
+        start = time.perf_counter()
+        pages = crawler.crawl_urls(urls)
+        crawl_seconds = time.perf_counter() - start
+        crawler.close()
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(directory, args.segments)
+        indexer = search_routes.indexer
+
+        start = time.perf_counter()
+        indexed = indexer.index_pages(pages)
+        index_seconds = time.perf_counter() - start
+
+        client = app.test_client()
+        rng = random.Random(args.seed)
+        for query in generate_queries(rng, 10):
+            client.get('/api/search', query_string={'q': query})
+
+        latencies = []
+        results = 0
+        for query in generate_queries(rng, args.queries):
+            start = time.perf_counter()
+            response = client.get('/api/search', query_string={'q': query, 'limit': 10})
+            latencies.append((time.perf_counter() - start) * 1000)
+            results += response.get_json().get('total', 0)
+
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+    return {
+        'size': size,
+        'crawl': {
+            'pages': len(pages),
+            'seconds': round(crawl_seconds, 4),
+            'pages_per_second': round(len(pages) / crawl_seconds, 2) if crawl_seconds else None
+        },
+        'index': {
+            'docs': indexed,
+            'seconds': round(index_seconds, 4),
+            'docs_per_second': round(indexed / index_seconds, 2) if index_seconds else None
+        },
+        'search': {
+            'queries': len(latencies),
+            'avg_results': round(results / len(latencies), 2) if latencies else 0,
+            'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+            'p50_ms': round(percentile(latencies, 50), 3) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99), 3) if latencies else None
+        }
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# (section, metric, True if higher is better)
+COMPARED_METRICS = (
+    ('crawl', 'pages_per_second', True),
+    ('index', 'docs_per_second', True),
+    ('search', 'p50_ms', False),
+    ('search', 'p99_ms', False)
+)
+
+def compare(baseline: dict, report: dict) -> None:
+    """Print the change of every metric against a previous report"""
+    previous = {result['size']: result for result in baseline['results']}
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('created_at')})")
+    for result in report['results']:
+        old = previous.get(result['size'])
+        if not old:
+            continue
+        for section, metric, higher_is_better in COMPARED_METRICS:
+            before, after = old[section][metric], result[section][metric]
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            better = change > 0 if higher_is_better else change < 0
+            print(f"{result['size']:>8} {section + '.' + metric:<24} {before:>10.2f} -> {after:>10.2f} "
+                  f"{change:+7.1f}% {'better' if better else 'worse'}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='200,1000', help='Comma separated corpus sizes')
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--paragraphs', type=int, default=20)
+    parser.add_argument('--hosts', type=int, default=4, help='Local servers the corpus is spread over')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--segments', action='store_true', help='Search memory-mapped segments')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Previous JSON results to compare with')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'lxml': etree is not None,
+        'options': vars(args),
+        'results': []
+    }
+
+    print(f"{'size':>8} {'crawl pages/s':>14} {'index docs/s':>13} {'search p50':>11} {'search p99':>11}")
+    for size in (int(size) for size in args.sizes.split(',') if size.strip()):
+        result = run_size(size, args)
+        report['results'].append(result)
+        print(f"{size:>8} {result['crawl']['pages_per_second']:>14.1f} "
+              f"{result['index']['docs_per_second']:>13.1f} "
+              f"{result['search']['p50_ms']:>9.2f}ms {result['search']['p99_ms']:>9.2f}ms")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as handle:
+            compare(json.load(handle), report)
+
+if __name__ == '__main__':
+    main()
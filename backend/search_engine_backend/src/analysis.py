@@ -0,0 +1,453 @@
+from typing import List, Dict, Iterable, Optional, Sequence, Tuple, Union
+import re
+import unicodedata
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+# Longer runs are almost always base64, hashes or minified junk
+MAX_TOKEN_LENGTH = 100
+
+# Filters applied after tokenization and lowercasing, in order
+DEFAULT_FILTERS = ('normalize', 'stopwords', 'stem')
+
+# Languages whose stopwords are removed and whose stemmers are available
+DEFAULT_LANGUAGES = ('en', 'id')
+
+# Distinct (token, language) pairs whose analyzed form is remembered
+TERM_CACHE_SIZE = 200000
+
+STOPWORDS = {
+    'en': frozenset('''
+        a an and are as at be been but by can could did do does for from had has
+        have he her his how i if in into is it its may more most my no not of on
+        or our she should so than that the their them then there these they this
+        those to too was we were what when where which who why will with would
+        you your
+    '''.split()),
+    'id': frozenset('''
+        ada adalah agar akan aku anda atau bagi bahwa baik banyak belum bisa
+        dalam dan dapat dari dengan di dia harus hanya hingga ia ini itu jadi
+        jika juga kami kamu karena ke kita lagi lain lebih maka masih memang
+        mereka mungkin namun oleh pada para saat saja sama sangat saya sebagai
+        sebelum sedang sehingga sejak selain seperti serta setelah sudah supaya
+        tanpa telah tentang tersebut tetapi tidak untuk yaitu yakni yang
+    '''.split())
+}
+
+VOWELS = frozenset('aeiou')
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Split text into lowercase word tokens
+
+    Args:
+        text: Raw text (may be None)
+
+    Returns:
+        List of tokens in document order
+    """
+    if not text:
+        return []
+    return [token for token in TOKEN_PATTERN.findall(text.lower())
+            if len(token) <= MAX_TOKEN_LENGTH]
+
+def tokenize_with_offsets(text: Optional[str]) -> List[Tuple[str, int]]:
+    """
+    Split text into lowercase word tokens and remember where they start
+
+    Tokens are lowercased one by one so offsets point into the original
+    text; apart from the few characters whose lowercase form is longer,
+    the tokens match tokenize().
+
+    Args:
+        text: Raw text (may be None)
+
+    Returns:
+        List of (token, character offset) pairs in document order
+    """
+    if not text:
+        return []
+    return [(match.group().lower(), match.start()) for match in TOKEN_PATTERN.finditer(text)
+            if match.end() - match.start() <= MAX_TOKEN_LENGTH]
+
+class EnglishStemmer:
+    """
+    Light English stemmer
+
+    Implements the plural, -ed/-ing and final -e steps of the Porter
+    algorithm, which conflate the common inflections ("crawling", "crawled",
+    "crawls") while keeping stems close to real words.
+    """
+
+    def stem(self, word: str) -> str:
+        if len(word) <= 2 or not word.isalpha() or not word.isascii():
+            return word
+        word = self._plural(word)
+        word = self._past_and_progressive(word)
+        return self._final_e(word)
+
+    def _plural(self, word: str) -> str:
+        if word.endswith('sses'):
+            return word[:-2]
+        if word.endswith('ies'):
+            return word[:-3] + ('y' if len(word) > 4 else 'ie')
+        if word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+            return word[:-1]
+        return word
+
+    def _past_and_progressive(self, word: str) -> str:
+        if word.endswith('eed'):
+            return word[:-1] if self._measure(word[:-3]) > 0 else word
+        for suffix in ('ing', 'ed'):
+            stem = word[:-len(suffix)]
+            if word.endswith(suffix) and self._has_vowel(stem):
+                if stem.endswith(('at', 'bl', 'iz')):
+                    return stem + 'e'
+                if len(stem) > 1 and stem[-1] == stem[-2] and stem[-1] not in 'lsz' \
+                        and self._is_consonant(stem, len(stem) - 1):
+                    return stem[:-1]
+                if self._measure(stem) == 1 and self._ends_cvc(stem):
+                    return stem + 'e'
+                return stem
+        return word
+
+    def _final_e(self, word: str) -> str:
+        if word.endswith('e'):
+            stem = word[:-1]
+            measure = self._measure(stem)
+            if measure > 1 or (measure == 1 and not self._ends_cvc(stem)):
+                return stem
+        return word
+
+    def _is_consonant(self, word: str, index: int) -> bool:
+        letter = word[index]
+        if letter in VOWELS:
+            return False
+        if letter == 'y':
+            return index == 0 or not self._is_consonant(word, index - 1)
+        return True
+
+    def _measure(self, word: str) -> int:
+        """Number of vowel-consonant sequences"""
+        measure = 0
+        previous_vowel = False
+        for index in range(len(word)):
+            vowel = not self._is_consonant(word, index)
+            if previous_vowel and not vowel:
+                measure += 1
+            previous_vowel = vowel
+        return measure
+
+    def _has_vowel(self, word: str) -> bool:
+        return any(not self._is_consonant(word, index) for index in range(len(word)))
+
+    def _ends_cvc(self, word: str) -> bool:
+        return (
+            len(word) >= 3
+            and self._is_consonant(word, len(word) - 3)
+            and not self._is_consonant(word, len(word) - 2)
+            and self._is_consonant(word, len(word) - 1)
+            and word[-1] not in 'wxy'
+        )
+
+class IndonesianStemmer:
+    """
+    Dictionary-free Indonesian stemmer
+
+    Strips affixes in the order of the Nazief-Adriani algorithm: particles
+    (-lah, -kah, -pun), possessive pronouns (-ku, -mu, -nya),
+    derivational suffixes (-kan, -an, -i) and up to two derivational
+    prefixes (di-, ke-, ter-, ber-, meN-, peN-, per-) with the usual
+    recoding of nasalized initials ("menulis" -> "tulis", "memukul" ->
+    "pukul"). Without a root dictionary ambiguous words are resolved the
+    same way every time, which is all matching needs since documents and
+    queries share the stemmer.
+    """
+
+    PARTICLES = ('lah', 'kah', 'pun')
+    POSSESSIVES = ('nya', 'ku', 'mu')
+
+    # Shortest stem an affix may be stripped down to
+    MIN_STEM_LENGTH = 4
+
+    def stem(self, word: str) -> str:
+        if len(word) <= self.MIN_STEM_LENGTH or not word.isalpha():
+            return word
+
+        word = self._strip_suffix(word, self.PARTICLES)
+        word = self._strip_suffix(word, self.POSSESSIVES)
+        stemmed = self._strip_suffix(word, ('kan', 'an'))
+        confix = stemmed != word and word.endswith('an')
+        word = stemmed
+
+        stripped = False
+        for _ in range(2):
+            stemmed = self._strip_prefix(word, allow_ke=confix and not stripped)
+            if stemmed == word:
+                break
+            word = stemmed
+            stripped = True
+
+        # Only trust a final -i when the word also had a prefix ("menandai")
+        if stripped:
+            word = self._strip_suffix(word, ('i',))
+        return word
+
+    def _strip_suffix(self, word: str, suffixes: Sequence[str]) -> str:
+        for suffix in suffixes:
+            if word.endswith(suffix) and len(word) - len(suffix) >= self.MIN_STEM_LENGTH:
+                return word[:-len(suffix)]
+        return word
+
+    def _strip_prefix(self, word: str, allow_ke: bool) -> str:
+        stem = self._prefix_stem(word, allow_ke)
+        return stem if len(stem) >= self.MIN_STEM_LENGTH else word
+
+    def _prefix_stem(self, word: str, allow_ke: bool) -> str:
+        if word.startswith('di') or (allow_ke and word.startswith('ke')):
+            return word[2:]
+        if word.startswith(('ter', 'ber', 'per')):
+            return word[3:]
+        if word.startswith(('be', 'pe')) and word[3:5] == 'er' and word[2] not in 'aeioumnlrwy':
+            # bekerja, pekerja -> kerja
+            return word[2:]
+        if not word.startswith(('me', 'pe')) or len(word) < 4:
+            return word
+
+        rest = word[2:]
+        if rest.startswith('ng'):
+            return rest[2:]
+        if rest.startswith('ny') and len(rest) > 2 and rest[2] in VOWELS:
+            return 's' + rest[2:]
+        if rest[0] == 'm':
+            if rest[1] in VOWELS:
+                return 'p' + rest[1:]
+            return rest[1:] if rest[1] in 'bfpv' else word
+        if rest[0] == 'n':
+            if rest[1] in VOWELS:
+                return 't' + rest[1:]
+            return rest[1:] if rest[1] in 'cdjsz' else word
+        if rest[0] in 'lrwy':
+            return rest
+        return word
+
+STEMMERS = {
+    'en': EnglishStemmer(),
+    'id': IndonesianStemmer()
+}
+
+class TokenFilter:
+    """
+    Step of an analyzer chain
+
+    A filter maps a lowercased token to its analyzed form, or to None to
+    drop it. Custom filters can be passed to Analyzer next to the built-in
+    names; `name` identifies the filter in the analyzer signature.
+    """
+
+    name = 'filter'
+
+    def __call__(self, token: str, language: str) -> Optional[str]:
+        return token
+
+class NormalizeFilter(TokenFilter):
+    """Unicode compatibility normalization and accent folding ("café" -> "cafe")"""
+
+    name = 'normalize'
+
+    def __call__(self, token: str, language: str) -> Optional[str]:
+        if token.isascii():
+            return token
+        decomposed = unicodedata.normalize('NFKD', token)
+        return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+class StopwordFilter(TokenFilter):
+    """Drop stopwords of every configured language (content mixes languages)"""
+
+    name = 'stopwords'
+
+    def __init__(self, languages: Iterable[str]):
+        self.stopwords = frozenset().union(*(STOPWORDS.get(language, ()) for language in languages))
+
+    def __call__(self, token: str, language: str) -> Optional[str]:
+        return None if token in self.stopwords else token
+
+class StemFilter(TokenFilter):
+    """Reduce a token to its stem with the stemmer of the document language"""
+
+    name = 'stem'
+
+    def __call__(self, token: str, language: str) -> Optional[str]:
+        stemmer = STEMMERS.get(language)
+        return stemmer.stem(token) if stemmer else token
+
+class Analyzer:
+    def __init__(self, filters: Sequence[Union[str, TokenFilter]] = DEFAULT_FILTERS,
+                 languages: Sequence[str] = DEFAULT_LANGUAGES,
+                 default_language: str = 'en'):
+        """
+        Initialize text analyzer
+
+        Text is split into lowercase word tokens and every token runs
+        through the filter chain. The same analyzer is used for pages and
+        queries, so both sides produce the same terms.
+
+        A page is analyzed in its own language, detected once per page from
+        its stopwords. A query is too short to detect reliably, so each
+        query word is analyzed in every language and matches any of the
+        resulting terms.
+
+        Analyzed forms are kept in a term dictionary keyed by token and
+        language, so each distinct word is normalized and stemmed once
+        rather than at every occurrence.
+
+        Args:
+            filters: Filter names ('normalize', 'stopwords', 'stem') or
+                TokenFilter instances, applied in order
+            languages: Languages to recognize ('en', 'id')
+            default_language: Language of pages without recognizable stopwords
+        """
+        self.languages = tuple(languages) or (default_language,)
+        self.default_language = default_language
+        self.filters = [self._create_filter(name) for name in filters]
+        self._terms = {}
+
+    def _create_filter(self, name: Union[str, TokenFilter]) -> TokenFilter:
+        if isinstance(name, TokenFilter):
+            return name
+        if name == 'normalize':
+            return NormalizeFilter()
+        if name == 'stopwords':
+            return StopwordFilter(self.languages)
+        if name == 'stem':
+            return StemFilter()
+        raise ValueError(f"Unknown analyzer filter: {name}")
+
+    @property
+    def signature(self) -> str:
+        """Identifies the analysis; an index built with another signature must be rebuilt"""
+        filters = ','.join(token_filter.name for token_filter in self.filters)
+        return f"{filters};{','.join(self.languages)};{self.default_language}"
+
+    def __getstate__(self) -> Dict:
+        # Parse workers receive the analyzer without its cache
+        state = self.__dict__.copy()
+        state['_terms'] = {}
+        return state
+
+    def detect_language(self, tokens: Iterable[str]) -> str:
+        """
+        Guess the language of a page from its stopwords
+
+        Args:
+            tokens: Lowercase tokens of the page
+
+        Returns:
+            The configured language with the most stopword occurrences
+        """
+        tokens = list(tokens)
+        counts = {
+            language: sum(map(STOPWORDS.get(language, frozenset()).__contains__, tokens))
+            for language in self.languages
+        }
+        best = max(counts, key=counts.get)
+        return best if counts[best] > counts.get(self.default_language, 0) else self.default_language
+
+    def term(self, token: str, language: str) -> Optional[str]:
+        """
+        Analyze one lowercase token
+
+        Args:
+            token: Token from tokenize()
+            language: Language of the text the token comes from
+
+        Returns:
+            Index term or None if the token is dropped
+        """
+        key = (token, language)
+        try:
+            return self._terms[key]
+        except KeyError:
+            pass
+
+        term = token
+        for token_filter in self.filters:
+            term = token_filter(term, language)
+            if not term:
+                term = None
+                break
+
+        if len(self._terms) >= TERM_CACHE_SIZE:
+            self._terms.clear()
+        self._terms[key] = term
+        return term
+
+    def analyze(self, tokens: Sequence[str], language: str) -> List[Tuple[int, str]]:
+        """
+        Analyze the tokens of one field
+
+        Positions keep counting dropped tokens, so "war and peace" still
+        only matches the phrase query "war and peace" and not "war peace".
+
+        Args:
+            tokens: Tokens in document order
+            language: Language of the page
+
+        Returns:
+            (position, term) pairs of the tokens that were kept
+        """
+        analyzed = []
+        for position, token in enumerate(tokens):
+            term = self.term(token, language)
+            if term:
+                analyzed.append((position, term))
+        return analyzed
+
+    def normalize(self, token: str) -> str:
+        """
+        Apply only the normalization filters to a token
+
+        Used for prefix queries, which are matched against the stored terms
+        and must not be stemmed or dropped.
+        """
+        for token_filter in self.filters:
+            if isinstance(token_filter, NormalizeFilter):
+                token = token_filter(token, self.default_language)
+        return token
+
+    def query_terms(self, token: str) -> Tuple[str, ...]:
+        """
+        Analyze a query token in every language
+
+        Args:
+            token: Lowercase query token
+
+        Returns:
+            Distinct terms the token may be indexed as (empty for stopwords)
+        """
+        terms = []
+        for language in self.languages:
+            term = self.term(token, language)
+            if term and term not in terms:
+                terms.append(term)
+        return tuple(terms)
+
+def create_analyzer(config) -> Analyzer:
+    """
+    Build the analyzer described by the application config
+
+    Args:
+        config: Mapping with optional SEARCH_ANALYZER_FILTERS,
+            SEARCH_LANGUAGES and SEARCH_DEFAULT_LANGUAGE keys
+
+    Returns:
+        Analyzer instance
+    """
+    return Analyzer(
+        filters=config.get('SEARCH_ANALYZER_FILTERS', DEFAULT_FILTERS),
+        languages=config.get('SEARCH_LANGUAGES', DEFAULT_LANGUAGES),
+        default_language=config.get('SEARCH_DEFAULT_LANGUAGE', 'en')
+    )
+
+# Analyzer used when none is passed explicitly
+DEFAULT_ANALYZER = Analyzer()
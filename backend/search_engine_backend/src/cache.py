@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import threading
+import time
+
+class QueryCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        """
+        Initialize in-process LRU cache for search responses
+
+        Every entry remembers the index generation it was computed for, so a
+        write to the index invalidates all cached results at once without
+        walking the cache.
+
+        Args:
+            max_entries: Maximum number of cached responses (least recently
+                used entries are evicted first)
+            ttl: Seconds after which an entry expires (0 disables expiry)
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(query: str, limit: int) -> tuple:
+        """
+        Whitespace insensitive cache key
+
+        Case is kept: AND, OR and NOT are only operators in upper case, so
+        "rust OR flask" and "rust or flask" are different queries.
+        """
+        return (' '.join(query.split()), limit)
+
+    def get(self, key: Hashable, generation: int) -> Optional[Any]:
+        """
+        Get a cached value
+
+        Args:
+            key: Cache key
+            generation: Current index generation
+
+        Returns:
+            Cached value or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_generation, expires_at, value = entry
+                if entry_generation == generation and (not expires_at or expires_at > time.monotonic()):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, generation: int, value: Any) -> None:
+        """Store a value computed for the given index generation"""
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0
+        with self._lock:
+            self._entries[key] = (generation, expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for /api/stats"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -1,194 +1,490 @@
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse, urlunparse
+from requests.adapters import HTTPAdapter
+from src.extractor import HTMLExtractor
+from src.domains import DomainMatcher
+from src.urls import canonicalize_url, canonicalize_parts
+from src.robots import RobotsCache, RobotsPolicy
+from src.sitemaps import parse_sitemap
+from src.metrics import stage, counter
+from urllib.parse import urljoin, urlparse, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import threading
+import hashlib
+import gzip
 import time
 import logging
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Callable, Iterable, Iterator, Tuple, Union
+from datetime import datetime
 import re
 
+USER_AGENT = 'SimpleSearchEngine/1.0 (+http://localhost:5000)'
+
+FETCHES_HELP = 'Pages requested by the crawler, by outcome'
+FETCHED = counter('sse_crawl_fetches_total', FETCHES_HELP, outcome='fetched')
+FETCH_NOT_MODIFIED = counter('sse_crawl_fetches_total', FETCHES_HELP, outcome='not_modified')
+FETCH_FAILED = counter('sse_crawl_fetches_total', FETCHES_HELP, outcome='failed')
+FETCH_DISALLOWED = counter('sse_crawl_fetches_total', FETCHES_HELP, outcome='disallowed')
+
+# Sitemap files read per sitemap URL, including the children of sitemap indexes
+MAX_SITEMAP_FILES = 50
+
 class WebCrawler:
-    def __init__(self, allowed_domains: List[str], delay: float = 1.0):
+    def __init__(self, allowed_domains: Union[List[str], DomainMatcher], delay: float = 1.0,
+                 max_workers: int = 8, host_pool_size: int = 2,
+                 use_lxml: Optional[bool] = None,
+                 query_params: Optional[Iterable[str]] = None,
+                 robots: Optional[RobotsCache] = None, max_delay: float = 30.0):
         """
         Initialize web crawler
         
         Args:
-            allowed_domains: List of domains that are allowed to be crawled
-            delay: Delay between requests in seconds
+            allowed_domains: Domains that are allowed to be crawled (list or compiled matcher)
+            delay: Minimum delay between two requests to the same host in
+                seconds, unless robots.txt of the host sets a Crawl-delay
+            max_workers: Maximum number of hosts fetched concurrently
+            host_pool_size: Maximum number of concurrent requests (and
+                keep-alive connections) per host
+            use_lxml: Parse with lxml (None uses it when installed)
+            query_params: Query parameters kept in canonical URLs (None keeps
+                all but tracking parameters)
+            robots: Cache of robots.txt policies to obey (None ignores robots.txt)
+            max_delay: Upper bound for a Crawl-delay from robots.txt
         """
-        self.allowed_domains = [domain.lower() for domain in allowed_domains]
+        if not isinstance(allowed_domains, DomainMatcher):
+            allowed_domains = DomainMatcher(allowed_domains)
+        self.domain_matcher = allowed_domains
+        self.allowed_domains = allowed_domains.domains
         self.delay = delay
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'SimpleSearchEngine/1.0 (+http://localhost:5000)'
-        })
+        self.max_workers = max(1, max_workers)
+        self.host_pool_size = max(1, host_pool_size)
+        self.extractor = HTMLExtractor(use_lxml)
+        self.query_params = frozenset(query_params) if query_params is not None else None
+        self.robots = robots
+        self.max_delay = max_delay
+        
+        # Every host gets its own session, so the connection pool of a host is
+        # only shared by the (at most host_pool_size) threads fetching from it
+        self._sessions = {}
+        self._next_request_at = {}
+        self._lock = threading.Lock()
+        self.session = self._create_session()
         
         # Setup logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
     
+    def _create_session(self) -> requests.Session:
+        """Create a session with a bounded keep-alive pool"""
+        session = requests.Session()
+        session.headers.update({
+            'User-Agent': USER_AGENT
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.host_pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+    
+    def get_session(self, host: str) -> requests.Session:
+        """Get the session dedicated to a host"""
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = self._create_session()
+                self._sessions[host] = session
+            return session
+    
+    def wait_for_host(self, host: str, delay: Optional[float] = None) -> None:
+        """
+        Block until the politeness delay for a host has passed
+        
+        Slots are reserved under a lock, so concurrent callers for the same
+        host are spaced `delay` seconds apart while other hosts are not
+        affected at all.
+        
+        Args:
+            host: Host about to be requested
+            delay: Delay for this host (defaults to the crawler's delay)
+        """
+        with self._lock:
+            now = time.monotonic()
+            ready_at = max(now, self._next_request_at.get(host, now))
+            self._next_request_at[host] = ready_at + (self.delay if delay is None else delay)
+        
+        if ready_at > now:
+            time.sleep(ready_at - now)
+    
+    def close(self) -> None:
+        """Close all open connections"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+        self.session.close()
+    
+    def robots_policy(self, url: str) -> Optional[RobotsPolicy]:
+        """robots.txt policy of the host of a URL (None when robots.txt is ignored)"""
+        if self.robots is None:
+            return None
+        parsed = urlsplit(url)
+        host = parsed.netloc.lower()
+        return self.robots.get(f'{parsed.scheme.lower()}://{host}', self.get_session(host))
+    
+    def host_delay(self, policy: Optional[RobotsPolicy]) -> float:
+        """Crawl-delay of a host if it sets one, the crawler's delay otherwise"""
+        if policy is None or policy.crawl_delay is None:
+            return self.delay
+        return min(policy.crawl_delay, self.max_delay)
+    
     def is_allowed_domain(self, url: str) -> bool:
         """Check if URL domain is in allowed domains list"""
-        try:
-            domain = urlparse(url).netloc.lower()
-            return any(domain == allowed or domain.endswith('.' + allowed) 
-                      for allowed in self.allowed_domains)
-        except:
-            return False
+        return self.domain_matcher.matches(url)
     
     def clean_url(self, url: str) -> str:
-        """Clean URL by removing fragments and unnecessary parameters"""
-        parsed = urlparse(url)
-        # Remove fragment
-        cleaned = urlunparse((
-            parsed.scheme, parsed.netloc, parsed.path,
-            parsed.params, parsed.query, ''
-        ))
-        return cleaned
-    
-    def extract_text_content(self, soup: BeautifulSoup) -> str:
-        """Extract clean text content from HTML"""
-        # Remove script and style elements
-        for script in soup(["script", "style", "nav", "footer", "header"]):
-            script.decompose()
-        
-        # Get text and clean it
-        text = soup.get_text()
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = ' '.join(chunk for chunk in chunks if chunk)
-        
-        return text
-    
-    def extract_metadata(self, soup: BeautifulSoup) -> Dict[str, str]:
-        """Extract metadata from HTML"""
-        metadata = {
-            'title': '',
-            'description': '',
-            'keywords': ''
-        }
-        
-        # Extract title
-        title_tag = soup.find('title')
-        if title_tag:
-            metadata['title'] = title_tag.get_text().strip()
+        """Canonical form of a URL: no fragment, tracking parameters or default port, sorted query"""
+        return canonicalize_url(url, self.query_params)
+    
+    def resolve_links(self, hrefs: Iterable[str], base_url: str) -> List[str]:
+        """
+        Turn raw href values into allowed absolute URLs
         
-        # Extract meta description
-        desc_tag = soup.find('meta', attrs={'name': 'description'})
-        if desc_tag:
-            metadata['description'] = desc_tag.get('content', '').strip()
+        Args:
+            hrefs: href attribute values in document order
+            base_url: URL of the page, used to resolve relative links
+            
+        Returns:
+            Cleaned, de-duplicated URLs in document order
+        """
+        seen = set()
+        links = []
         
-        # Extract meta keywords
-        keywords_tag = soup.find('meta', attrs={'name': 'keywords'})
-        if keywords_tag:
-            metadata['keywords'] = keywords_tag.get('content', '').strip()
+        for href in hrefs:
+            try:
+                parsed = urlsplit(urljoin(base_url, href))
+            except ValueError:
+                continue
+            # Check the host before building the cleaned URL; one parse per link
+            if parsed.scheme not in ('http', 'https') or not self.domain_matcher.matches_host(parsed.netloc):
+                continue
+            
+            cleaned_url = canonicalize_parts(parsed, self.query_params)
+            if cleaned_url not in seen:
+                seen.add(cleaned_url)
+                links.append(cleaned_url)
         
-        return metadata
+        return links
     
-    def crawl_page(self, url: str) -> Optional[Dict]:
+    def crawl_page(self, url: str, extract_links: bool = False,
+                   validators: Optional[Dict] = None) -> Optional[Dict]:
         """
         Crawl a single page and extract its content
         
+        When validators from a previous crawl are given the request is made
+        conditional (If-None-Match / If-Modified-Since). A 304 response or a
+        body with the same digest is reported as not modified without
+        parsing the page.
+        
+        Args:
+            url: URL to crawl
+            extract_links: Also return the allowed links of the page under
+                'links', taken from the same parse as the content
+            validators: Optional dict with 'etag', 'last_modified' and
+                'content_hash' of the stored copy
+        
+        Returns:
+            Dictionary with page data, a {'url', 'domain', 'not_modified': True}
+            marker for unchanged pages, or None if failed
+        """
+        fetched = self.fetch_page(url, validators)
+        if not fetched or fetched.get('not_modified'):
+            return fetched
+        return self.parse_page(fetched, extract_links)
+    
+    def fetch_page(self, url: str, validators: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Download a page without parsing it (see crawl_page)
+        
         Returns:
-            Dictionary with page data or None if failed
+            Dictionary with url, domain, body, content_type and the HTTP
+            validators, a not-modified marker, or None if failed
         """
         if not self.is_allowed_domain(url):
             self.logger.warning(f"Domain not allowed: {url}")
             return None
         
         try:
-            self.logger.info(f"Crawling: {url}")
+            parsed = urlsplit(url)
+            domain = parsed.netloc.lower()
+            path = parsed.path or '/'
+            if parsed.query:
+                path += '?' + parsed.query
+            policy = self.robots_policy(url)
+            if policy and not policy.allows(path):
+                self.logger.debug("Disallowed by robots.txt: %s", url)
+                FETCH_DISALLOWED.inc()
+                return None
+            self.wait_for_host(domain, self.host_delay(policy))
+            # Per-page lines are debug only; lazy formatting keeps them free when disabled
+            self.logger.debug("Crawling: %s", url)
+            
+            headers = {}
+            if validators:
+                if validators.get('etag'):
+                    headers['If-None-Match'] = validators['etag']
+                if validators.get('last_modified'):
+                    headers['If-Modified-Since'] = validators['last_modified']
             
-            response = self.session.get(url, timeout=10)
+            with stage('fetch'):
+                response = self.get_session(domain).get(url, timeout=10, headers=headers)
+            if response.status_code == 304:
+                return self.not_modified(url, domain)
             response.raise_for_status()
             
             # Check if content is HTML
             content_type = response.headers.get('content-type', '').lower()
             if 'text/html' not in content_type:
                 self.logger.warning(f"Not HTML content: {url}")
+                FETCH_FAILED.inc()
                 return None
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            content_hash = hashlib.sha256(response.content).hexdigest()
+            if validators and validators.get('content_hash') == content_hash:
+                return self.not_modified(url, domain)
             
-            # Extract content and metadata
-            content = self.extract_text_content(soup)
-            metadata = self.extract_metadata(soup)
+            FETCHED.inc()
+            return {
+                'url': url,
+                'domain': domain,
+                'body': response.content,
+                'content_type': content_type,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'content_hash': content_hash
+            }
             
-            # Get domain
-            domain = urlparse(url).netloc.lower()
+        except requests.RequestException as e:
+            self.logger.error(f"Request failed for {url}: {str(e)}")
+            FETCH_FAILED.inc()
+            return None
+        except Exception as e:
+            self.logger.error(f"Error crawling {url}: {str(e)}")
+            FETCH_FAILED.inc()
+            return None
+    
+    def parse_page(self, fetched: Dict, extract_links: bool = False) -> Optional[Dict]:
+        """
+        Extract page data from a downloaded page (see crawl_page)
+        
+        Args:
+            fetched: Result of fetch_page
+            extract_links: Include the allowed links of the page under 'links'
+        
+        Returns:
+            Dictionary with page data or None if the page cannot be parsed;
+            'url' is the canonical URL of the page, 'requested_url' the
+            (cleaned) URL that was fetched
+        """
+        url = fetched['url']
+        try:
+            # Single streaming pass for metadata, links and visible text
+            with stage('parse'):
+                extracted = self.extractor.extract(fetched['body'], fetched['content_type'])
+            
+            requested_url = self.clean_url(url)
+            # rel=canonical names the URL the page is stored under when it
+            # points to an allowed domain
+            canonical_urls = []
+            if extracted['canonical']:
+                canonical_urls = self.resolve_links([extracted['canonical']], url)
             
             page_data = {
-                'url': self.clean_url(url),
-                'title': metadata['title'],
-                'content': content,
-                'description': metadata['description'],
-                'keywords': metadata['keywords'],
-                'domain': domain
+                'url': canonical_urls[0] if canonical_urls else requested_url,
+                'requested_url': requested_url,
+                'title': extracted['title'],
+                'content': extracted['content'],
+                'description': extracted['description'],
+                'keywords': extracted['keywords'],
+                'domain': fetched['domain'],
+                'etag': fetched['etag'],
+                'last_modified': fetched['last_modified'],
+                'content_hash': fetched['content_hash']
             }
-            
-            # Add delay between requests
-            time.sleep(self.delay)
+            if extract_links:
+                page_data['links'] = self.resolve_links(extracted['links'], url)
             
             return page_data
             
-        except requests.RequestException as e:
-            self.logger.error(f"Request failed for {url}: {str(e)}")
-            return None
         except Exception as e:
-            self.logger.error(f"Error crawling {url}: {str(e)}")
+            self.logger.error(f"Error parsing {url}: {str(e)}")
             return None
     
-    def crawl_urls(self, urls: List[str]) -> List[Dict]:
+    def not_modified(self, url: str, domain: str) -> Dict:
+        """Marker returned for pages that did not change since the last crawl"""
+        self.logger.debug("Not modified: %s", url)
+        FETCH_NOT_MODIFIED.inc()
+        return {
+            'url': self.clean_url(url),
+            'domain': domain,
+            'not_modified': True
+        }
+    
+    def crawl_urls(self, urls: List[str],
+                   should_stop: Optional[Callable[[], bool]] = None,
+                   extract_links: bool = False,
+                   validators: Optional[Dict[str, Dict]] = None) -> List[Dict]:
         """
         Crawl multiple URLs
         
+        URLs are grouped by host. Hosts are crawled in parallel (at most
+        `max_workers` at a time) and up to `host_pool_size` requests to one
+        host are in flight at once. wait_for_host still spaces the start of
+        every request to a host `delay` seconds apart, so slow responses
+        overlap without making the crawler less polite.
+        
         Args:
             urls: List of URLs to crawl
+            should_stop: Optional callable checked before every fetch; when it
+                returns True the remaining URLs are skipped
+            extract_links: Include the links of every page (see crawl_page)
+            validators: Optional mapping of URL to the validators of its stored copy
             
         Returns:
-            List of successfully crawled page data
+            List of successfully crawled page data and not-modified markers
+            (in input order)
+        """
+        validators = validators or {}
+        results = [None] * len(urls)
+        
+        def crawl(index, url):
+            results[index] = self.crawl_page(url, extract_links, validators.get(url))
+        
+        self.for_each_by_host(urls, crawl, should_stop)
+        return [page_data for page_data in results if page_data]
+    
+    def for_each_by_host(self, urls: List[str], handle: Callable[[int, str], None],
+                         should_stop: Optional[Callable[[], bool]] = None) -> None:
+        """
+        Call handle(index, url) for every URL with the host scheduling of crawl_urls
+        
+        Args:
+            urls: List of URLs
+            handle: Called from worker threads, at most host_pool_size at a
+                time for one host
+            should_stop: Optional callable checked before every URL
         """
-        results = []
+        by_host = OrderedDict()
+        for index, url in enumerate(urls):
+            host = urlparse(url).netloc.lower()
+            by_host.setdefault(host, []).append((index, url))
+        
+        def handle_item(item):
+            if should_stop and should_stop():
+                return
+            handle(*item)
         
-        for url in urls:
-            page_data = self.crawl_page(url)
-            if page_data:
-                results.append(page_data)
+        def crawl_host(host_urls):
+            lanes = min(self.host_pool_size, len(host_urls))
+            if lanes == 1:
+                for item in host_urls:
+                    handle_item(item)
+                return
+            with ThreadPoolExecutor(max_workers=lanes, thread_name_prefix='crawler-host') as executor:
+                list(executor.map(handle_item, host_urls))
         
-        return results
+        workers = min(self.max_workers, len(by_host)) or 1
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='crawler') as executor:
+            # list() re-raises unexpected errors from the workers
+            list(executor.map(crawl_host, by_host.values()))
+    
+    def find_sitemaps(self, url: str) -> List[str]:
+        """
+        Sitemaps of the host of a URL
+        
+        Returns:
+            Sitemap URLs listed in robots.txt, or /sitemap.xml of the host
+        """
+        policy = self.robots_policy(url)
+        if policy and policy.sitemaps:
+            return list(policy.sitemaps)
+        parsed = urlsplit(url)
+        return [f'{parsed.scheme.lower()}://{parsed.netloc.lower()}/sitemap.xml']
+    
+    def iter_sitemap(self, url: str) -> Iterator[Tuple[str, Optional[datetime]]]:
+        """
+        Stream the pages listed in a sitemap
+        
+        Sitemap indexes are followed (at most MAX_SITEMAP_FILES files per
+        call). Files are parsed while they download, gzip compressed files
+        included, and only pages on allowed domains are returned.
+        
+        Args:
+            url: URL of a sitemap or sitemap index
+            
+        Yields:
+            (canonical page URL, lastmod as naive UTC datetime or None)
+        """
+        pending = [url]
+        seen = set()
+        while pending and len(seen) < MAX_SITEMAP_FILES:
+            sitemap_url = pending.pop(0)
+            if sitemap_url in seen or not self.is_allowed_domain(sitemap_url):
+                continue
+            seen.add(sitemap_url)
+            
+            try:
+                host = urlsplit(sitemap_url).netloc.lower()
+                self.wait_for_host(host, self.host_delay(self.robots_policy(sitemap_url)))
+                with self.get_session(host).get(sitemap_url, timeout=10, stream=True) as response:
+                    response.raise_for_status()
+                    # Undo Content-Encoding; .gz sitemap files are gzip themselves
+                    response.raw.decode_content = True
+                    stream = response.raw
+                    if urlsplit(sitemap_url).path.endswith('.gz'):
+                        stream = gzip.GzipFile(fileobj=stream)
+                    
+                    for kind, loc, lastmod in parse_sitemap(stream):
+                        if kind == 'sitemap':
+                            pending.append(loc)
+                            continue
+                        for page_url in self.resolve_links([loc], sitemap_url):
+                            yield page_url, lastmod
+            except Exception as e:
+                self.logger.error(f"Error reading sitemap {sitemap_url}: {str(e)}")
     
     def discover_links(self, url: str, max_depth: int = 1) -> List[str]:
         """
-        Discover links from a page (basic implementation)
+        Discover links breadth-first starting from a page
+        
+        Every page is fetched and parsed once. Depth 1 returns the links of
+        the start page, depth 2 also the links of those pages, and so on.
         
         Args:
             url: Starting URL
-            max_depth: Maximum depth to crawl (not implemented yet)
+            max_depth: Maximum link distance from the starting URL
             
         Returns:
-            List of discovered URLs
+            List of discovered URLs (closest first, without the start URL)
         """
         if not self.is_allowed_domain(url):
             return []
         
-        try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            links = []
-            
-            for link in soup.find_all('a', href=True):
-                href = link['href']
-                full_url = urljoin(url, href)
-                
-                if self.is_allowed_domain(full_url):
-                    cleaned_url = self.clean_url(full_url)
-                    if cleaned_url not in links:
-                        links.append(cleaned_url)
-            
-            return links
+        start_url = self.clean_url(url)
+        seen = {start_url}
+        discovered = []
+        level = [start_url]
+        
+        for _ in range(max_depth):
+            next_level = []
+            for page_data in self.crawl_urls(level, extract_links=True):
+                for link in page_data.get('links', []):
+                    if link not in seen:
+                        seen.add(link)
+                        next_level.append(link)
             
-        except Exception as e:
-            self.logger.error(f"Error discovering links from {url}: {str(e)}")
-            return []
-
+            discovered.extend(next_level)
+            level = next_level
+            if not level:
+                break
+        
+        return discovered
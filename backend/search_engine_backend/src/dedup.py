@@ -0,0 +1,195 @@
+from src.models.index import PageFingerprint
+from src.models.page import Page, db
+from src.analysis import tokenize
+from collections import defaultdict
+from typing import List, Dict, Iterable, Optional, Tuple
+import hashlib
+
+# Words per shingle hashed into the SimHash
+SHINGLE_SIZE = 3
+
+# The 64-bit SimHash is split into this many 16-bit bands. Two hashes that
+# differ in at most BANDS - 1 bits agree on at least one band, so looking up
+# pages by band finds every near-duplicate without comparing all pages
+BANDS = 4
+BAND_BITS = 64 // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+# One bytes.translate() table per bit of a byte: maps every byte value to
+# 1 if that bit is set and to 0 otherwise
+BIT_TABLES = [bytes(value >> bit & 1 for value in range(256)) for bit in range(8)]
+
+# Keep IN (...) lists well below SQLite's bound parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+def simhash(text: str, shingle_size: int = SHINGLE_SIZE) -> Optional[int]:
+    """
+    64-bit SimHash of the word shingles of a text
+
+    Every bit is the majority vote of that bit over the hashes of all
+    shingles, so texts that share most shingles get hashes that differ in
+    only a few bits. The hashes are laid out as one byte string; the votes
+    for a bit are counted by mapping that bit of every hash to a 0/1 byte
+    with bytes.translate() and counting the ones, so no Python code runs
+    per shingle apart from hashing it.
+
+    Args:
+        text: Text to fingerprint
+        shingle_size: Words per shingle
+
+    Returns:
+        Unsigned 64-bit fingerprint, None for text without words
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+
+    if len(tokens) < shingle_size:
+        shingles = [' '.join(tokens)]
+    else:
+        shingles = map(' '.join, zip(*(tokens[offset:] for offset in range(shingle_size))))
+
+    digests = b''.join([
+        hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest() for shingle in shingles
+    ])
+    half = len(digests) / 16
+    fingerprint = 0
+    for byte_index in range(8):
+        column = digests[byte_index::8]
+        for bit, table in enumerate(BIT_TABLES):
+            if column.translate(table).count(1) > half:
+                fingerprint |= 1 << (byte_index * 8 + bit)
+    return fingerprint
+
+def hamming_distance(first: int, second: int) -> int:
+    return bin(first ^ second).count('1')
+
+def bands(fingerprint: int) -> List[int]:
+    """16-bit slices of a fingerprint, lowest first"""
+    return [fingerprint >> (band * BAND_BITS) & BAND_MASK for band in range(BANDS)]
+
+def _to_signed(fingerprint: int) -> int:
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+class NearDuplicateDetector:
+    def __init__(self, max_distance: int = BANDS - 1):
+        """
+        Initialize near-duplicate detection of page bodies
+
+        Fingerprints of stored pages live in the `page_fingerprints` table
+        with one indexed column per band (locality sensitive hashing):
+        candidates are found with index lookups on the bands of a new page
+        and only they are compared bit by bit. Methods must be called
+        inside an app context and leave committing to the caller.
+
+        Args:
+            max_distance: Largest Hamming distance between the SimHashes of
+                two pages treated as duplicates (at most BANDS - 1)
+        """
+        self.max_distance = max(0, min(max_distance, BANDS - 1))
+
+    def find_duplicates(self, fingerprints: Dict[str, Optional[int]],
+                        stored: Iterable[str] = ()) -> Dict[str, str]:
+        """
+        Find pages that are near-duplicates of stored pages or of each other
+
+        Args:
+            fingerprints: URL to fingerprint of the pages about to be
+                written, in write order (None never matches)
+            stored: URLs among them that already have a row; they are never
+                reported themselves, but later pages may duplicate them
+
+        Returns:
+            Mapping of duplicate URL to the URL of the page it duplicates
+            (an active stored page or an earlier page of the same call)
+        """
+        stored = set(stored)
+        new_fingerprints = {
+            url: fingerprint for url, fingerprint in fingerprints.items()
+            if fingerprint is not None and url not in stored
+        }
+        if not new_fingerprints:
+            return {}
+
+        candidates = self._load_candidates(new_fingerprints.values())
+        duplicates = {}
+        # Band value -> (url, fingerprint) of the pages kept so far
+        kept = defaultdict(list)
+        for url, fingerprint in fingerprints.items():
+            if fingerprint is None:
+                continue
+            keys = list(enumerate(bands(fingerprint)))
+            if url not in stored:
+                original = self._closest(fingerprint, keys, candidates, url)
+                if original is None:
+                    original = self._closest(fingerprint, keys, kept, url)
+                if original is not None:
+                    duplicates[url] = original
+                    continue
+            for key in keys:
+                kept[key].append((url, fingerprint))
+        return duplicates
+
+    def _closest(self, fingerprint: int, keys: List[Tuple[int, int]],
+                 candidates: Dict[Tuple[int, int], List[Tuple[str, int]]], url: str) -> Optional[str]:
+        best = None
+        best_distance = self.max_distance + 1
+        for key in keys:
+            for candidate_url, candidate in candidates.get(key, ()):
+                if candidate_url == url:
+                    continue
+                distance = hamming_distance(fingerprint, candidate)
+                if distance < best_distance:
+                    best, best_distance = candidate_url, distance
+        return best
+
+    def _load_candidates(self, fingerprints: Iterable[int]) -> Dict[Tuple[int, int], List[Tuple[str, int]]]:
+        """Stored active pages sharing a band with any of the fingerprints"""
+        values = [set() for _ in range(BANDS)]
+        for fingerprint in fingerprints:
+            for band, value in enumerate(bands(fingerprint)):
+                values[band].add(value)
+
+        rows = {}
+        for band, band_values in enumerate(values):
+            column = getattr(PageFingerprint, f'band_{band}')
+            band_values = list(band_values)
+            for start in range(0, len(band_values), LOOKUP_CHUNK_SIZE):
+                for url, signed in db.session.execute(
+                    db.select(Page.url, PageFingerprint.simhash)
+                    .join(Page, Page.id == PageFingerprint.page_id)
+                    .where(column.in_(band_values[start:start + LOOKUP_CHUNK_SIZE]),
+                           Page.is_active == True)
+                ):
+                    rows[url] = _to_unsigned(signed)
+
+        candidates = defaultdict(list)
+        for url, fingerprint in rows.items():
+            for key in enumerate(bands(fingerprint)):
+                candidates[key].append((url, fingerprint))
+        return candidates
+
+    def store(self, fingerprints: Dict[int, Optional[int]]) -> None:
+        """
+        Replace the fingerprints of written pages
+
+        Args:
+            fingerprints: Page id to fingerprint (None removes it)
+        """
+        page_ids = list(fingerprints)
+        for start in range(0, len(page_ids), LOOKUP_CHUNK_SIZE):
+            db.session.execute(db.delete(PageFingerprint).where(
+                PageFingerprint.page_id.in_(page_ids[start:start + LOOKUP_CHUNK_SIZE])
+            ))
+        rows = [
+            dict(
+                {f'band_{band}': value for band, value in enumerate(bands(fingerprint))},
+                page_id=page_id, simhash=_to_signed(fingerprint)
+            )
+            for page_id, fingerprint in fingerprints.items() if fingerprint is not None
+        ]
+        if rows:
+            db.session.execute(db.insert(PageFingerprint), rows)
@@ -0,0 +1,48 @@
+from typing import Iterable
+from urllib.parse import urlsplit
+
+class DomainMatcher:
+    def __init__(self, domains: Iterable[str]):
+        """
+        Initialize compiled allowed-domain matcher
+
+        A host matches when it is an allowed domain or a subdomain of one.
+        Instead of comparing the host with every allowed domain, the host is
+        walked from the left label by label and each suffix is looked up in
+        a hash set, so a check costs one lookup per label no matter how many
+        domains are allowed.
+
+        Args:
+            domains: Allowed domains (e.g. 'example.com')
+        """
+        self.domains = sorted({domain.strip().lower() for domain in domains if domain and domain.strip()})
+        self._domains = frozenset(self.domains)
+
+    def __len__(self) -> int:
+        return len(self.domains)
+
+    def matches_host(self, host: str) -> bool:
+        """
+        Check if a host (netloc) is allowed
+
+        Args:
+            host: Network location as it appears in a URL
+
+        Returns:
+            True if the host or one of its parent domains is allowed
+        """
+        host = host.lower()
+        while True:
+            if host in self._domains:
+                return True
+            dot = host.find('.')
+            if dot < 0:
+                return False
+            host = host[dot + 1:]
+
+    def matches(self, url: str) -> bool:
+        """Check if the domain of a URL is allowed"""
+        try:
+            return self.matches_host(urlsplit(url).netloc)
+        except ValueError:
+            return False
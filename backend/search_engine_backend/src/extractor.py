@@ -0,0 +1,168 @@
+from html.parser import HTMLParser
+from typing import Dict, Optional, Union
+import codecs
+import re
+
+try:
+    from lxml import etree
+except ImportError:  # lxml is optional, html.parser is always available
+    etree = None
+
+# Elements whose text is not part of the visible page content
+SKIPPED_TAGS = frozenset(['script', 'style', 'nav', 'footer', 'header', 'noscript', 'template'])
+
+CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+def detect_encoding(body: bytes, content_type: str = '') -> str:
+    """
+    Pick the character encoding of an HTML document
+
+    The charset of the Content-Type header wins, then a <meta charset> in
+    the first kilobyte; UTF-8 otherwise. requests falls back to ISO-8859-1
+    for text/html without charset, which garbles most modern pages.
+    """
+    candidates = []
+    match = re.search(r'charset=["\']?([\w-]+)', content_type or '', re.IGNORECASE)
+    if match:
+        candidates.append(match.group(1))
+
+    match = CHARSET_PATTERN.search(body[:1024])
+    if match:
+        candidates.append(match.group(1).decode('ascii'))
+
+    for encoding in candidates:
+        try:
+            return codecs.lookup(encoding).name
+        except LookupError:
+            continue
+
+    return 'utf-8'
+
+class _ExtractionTarget:
+    """
+    Collects everything the crawler needs while the document streams by
+
+    Implements the lxml parser target interface (start/end/data/close);
+    the html.parser fallback forwards its callbacks to the same methods.
+    """
+
+    def __init__(self):
+        self.skip_depth = 0
+        self.in_title = False
+        self.title_parts = []
+        self.text_parts = []
+        self.meta = {}
+        self.links = []
+        self.canonical = ''
+
+    def start(self, tag: str, attrib: Dict[str, Optional[str]]) -> None:
+        tag = tag.lower()
+        # Element boundaries separate words; a parser may also split one
+        # text node into several data() calls, which must not
+        self.text_parts.append(' ')
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+        elif tag == 'title':
+            self.in_title = True
+        elif tag == 'meta':
+            name = (attrib.get('name') or '').lower()
+            if name in ('description', 'keywords') and name not in self.meta:
+                self.meta[name] = (attrib.get('content') or '').strip()
+        elif tag == 'a':
+            href = attrib.get('href')
+            if href:
+                self.links.append(href)
+        elif tag == 'link' and not self.canonical:
+            if 'canonical' in (attrib.get('rel') or '').lower().split():
+                self.canonical = (attrib.get('href') or '').strip()
+
+    def end(self, tag: str) -> None:
+        tag = tag.lower()
+        self.text_parts.append(' ')
+        if tag in SKIPPED_TAGS:
+            if self.skip_depth:
+                self.skip_depth -= 1
+        elif tag == 'title':
+            self.in_title = False
+
+    def data(self, text: str) -> None:
+        if self.skip_depth:
+            return
+        if self.in_title:
+            self.title_parts.append(text)
+        self.text_parts.append(text)
+
+    def close(self) -> Dict:
+        return {
+            'title': ' '.join(''.join(self.title_parts).split()),
+            'description': self.meta.get('description', ''),
+            'keywords': self.meta.get('keywords', ''),
+            'content': ' '.join(''.join(self.text_parts).split()),
+            'links': self.links,
+            'canonical': self.canonical
+        }
+
+class _StdlibParser(HTMLParser):
+    def __init__(self, target: _ExtractionTarget):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+        # Self-closing skipped tags (e.g. <nav/>) must not leave skip mode on
+        if tag in SKIPPED_TAGS:
+            self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+class HTMLExtractor:
+    def __init__(self, use_lxml: Optional[bool] = None):
+        """
+        Initialize single-pass HTML extractor
+
+        Title, meta description/keywords, link targets and visible text are
+        collected in one streaming traversal without building a tree.
+
+        Args:
+            use_lxml: Use the lxml (libxml2) parser; None picks it when installed
+        """
+        if use_lxml and etree is None:
+            raise ImportError("lxml is not installed")
+        self.use_lxml = etree is not None if use_lxml is None else use_lxml
+
+    def extract(self, html: Union[bytes, str], content_type: str = '') -> Dict:
+        """
+        Extract page data from an HTML document
+
+        Args:
+            html: Raw response body or decoded text
+            content_type: Content-Type header, used to pick the encoding
+
+        Returns:
+            Dictionary with title, description, keywords, content, links
+            (raw href values in document order) and canonical (raw href of
+            <link rel="canonical">, empty if there is none)
+        """
+        if isinstance(html, bytes):
+            html = html.decode(detect_encoding(html, content_type), errors='replace')
+
+        target = _ExtractionTarget()
+        if not html.strip():
+            return target.close()
+
+        if self.use_lxml:
+            parser = etree.HTMLParser(target=target, no_network=True)
+            parser.feed(html)
+            return parser.close()
+
+        parser = _StdlibParser(target)
+        parser.feed(html)
+        parser.close()
+        return target.close()
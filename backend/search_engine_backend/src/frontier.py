@@ -0,0 +1,92 @@
+from src.models.job import FrontierEntry
+from src.models.page import db
+from typing import List, Optional, Tuple
+import hashlib
+import logging
+
+def url_hash(url: str) -> str:
+    """64-bit hex digest used for the seen-set"""
+    return hashlib.blake2b(url.encode('utf-8'), digest_size=8).hexdigest()
+
+class CrawlFrontier:
+    def __init__(self, job_id: int, max_pages: Optional[int] = None):
+        """
+        Initialize persistent breadth-first frontier of a crawl job
+
+        The queue lives in the `crawl_frontier` table so a job picks up where
+        it stopped after a restart; the seen-set is a set of URL hashes that
+        is reloaded from the same table. Methods must be called inside an
+        app context and leave committing to the caller.
+
+        Args:
+            job_id: Id of the crawl job
+            max_pages: Maximum number of URLs ever enqueued (None for no limit)
+        """
+        self.job_id = job_id
+        self.max_pages = max_pages
+        self.seen = set()
+        self.logger = logging.getLogger(__name__)
+
+    def load(self) -> None:
+        """Load the seen-set of the job"""
+        self.seen = set(db.session.execute(
+            db.select(FrontierEntry.url_hash).where(FrontierEntry.job_id == self.job_id)
+        ).scalars())
+
+    def is_full(self) -> bool:
+        """Whether max_pages URLs were enqueued"""
+        return self.max_pages is not None and len(self.seen) >= self.max_pages
+
+    def add(self, urls: List[str], depth: int) -> int:
+        """
+        Enqueue URLs that have not been seen before
+
+        Args:
+            urls: Cleaned URLs
+            depth: Link distance from the seeds
+
+        Returns:
+            Number of URLs enqueued
+        """
+        rows = []
+        for url in urls:
+            if self.is_full():
+                break
+            digest = url_hash(url)
+            if digest in self.seen:
+                continue
+            self.seen.add(digest)
+            rows.append({
+                'job_id': self.job_id,
+                'url': url,
+                'url_hash': digest,
+                'depth': depth,
+                'status': 'pending'
+            })
+
+        if rows:
+            db.session.execute(db.insert(FrontierEntry), rows)
+        return len(rows)
+
+    def next_batch(self, size: int) -> List[Tuple[int, str, int]]:
+        """
+        Get the next pending entries in breadth-first order
+
+        Returns:
+            List of (entry_id, url, depth)
+        """
+        return [tuple(row) for row in db.session.execute(
+            db.select(FrontierEntry.id, FrontierEntry.url, FrontierEntry.depth)
+            .where(FrontierEntry.job_id == self.job_id, FrontierEntry.status == 'pending')
+            .order_by(FrontierEntry.id)
+            .limit(size)
+        )]
+
+    def mark(self, entry_ids: List[int], status: str) -> None:
+        """Set the status of processed entries"""
+        if entry_ids:
+            db.session.execute(
+                db.update(FrontierEntry)
+                .where(FrontierEntry.id.in_(entry_ids))
+                .values(status=status)
+            )
@@ -1,9 +1,36 @@
-from src.models.page import Page, AllowedDomain, db
-from src.crawler import WebCrawler
-from typing import List, Dict
+from src.models.page import Page, PageContent, AllowedDomain, DomainStatistics, SUMMARY_LENGTH, db
+from src.crawler import WebCrawler, USER_AGENT
+from src.robots import RobotsCache
+from src.domains import DomainMatcher
+from src.inverted_index import INDEXED_FIELDS
+from src.segments import SegmentIndex
+from src.analysis import create_analyzer
+from src.ranking import BM25Ranker
+from src.pipeline import CrawlPipeline
+from src.snippets import SnippetGenerator
+from src.suggest import Suggester
+from src.dedup import NearDuplicateDetector, simhash
+from src.urls import canonicalize_url
+from src.storage import get_backend
+from src.statistics import (
+    get_counters, set_counters, increment_rows, INDEX_TERMS, INDEX_POSTINGS,
+    CRAWL_PAGES_FETCHED, CRAWL_PAGES_INDEXED, CRAWL_MILLISECONDS
+)
+from src.models.index import IndexTerm, Posting, FieldStatistics, PageFingerprint
+from src.models.stats import StatCounter
+from src.query import parse_query
+from src.metrics import stage, counter
+from typing import List, Dict, Optional, Tuple, Union
+from datetime import datetime
+from collections import defaultdict
 import logging
+import time
 from urllib.parse import urlparse
 
+PAGES_INDEXED = counter('sse_index_pages_total', 'Pages written to the index (new or changed)')
+SEARCHES = counter('sse_searches_total', 'Queries evaluated against the index')
+DUPLICATES = counter('sse_index_duplicates_total', 'New pages skipped as near-duplicates of stored pages')
+
 class SearchIndexer:
     def __init__(self, app):
         """
@@ -13,7 +40,59 @@ class SearchIndexer:
             app: Flask application instance
         """
         self.app = app
+        self.analyzer = create_analyzer(app.config)
+        segments = None
+        if app.config.get('SEARCH_SEGMENT_DIR'):
+            segments = SegmentIndex(
+                app.config['SEARCH_SEGMENT_DIR'], INDEXED_FIELDS,
+                max_segments=app.config.get('SEARCH_SEGMENT_MAX', 8)
+            )
+        self.storage = get_backend(app)
+        self.page_store = self.storage.pages
+        self.inverted_index = self.storage.create_index_store(BM25Ranker(
+            field_weights=app.config.get('SEARCH_FIELD_WEIGHTS'),
+            k1=app.config.get('SEARCH_BM25_K1', 1.2),
+            b=app.config.get('SEARCH_BM25_B', 0.75)
+        ), self.analyzer, segments)
+        self.snippets = SnippetGenerator(app.config.get('SEARCH_SNIPPET_LENGTH', 300), self.analyzer)
+        # Compiled on first use, rebuilt when the allowed domains change
+        self._domain_matcher = None
+        self.suggester = Suggester(
+            max_terms=app.config.get('SUGGEST_MAX_TERMS', 50000),
+            max_queries=app.config.get('SUGGEST_MAX_QUERIES', 5000)
+        )
+        self._suggestions_generation = None
+        self._suggestions_loaded_at = 0.0
+        # Shared by all crawlers so robots.txt is fetched once per host and TTL
+        self.robots = None
+        if app.config.get('CRAWLER_RESPECT_ROBOTS', True):
+            self.robots = RobotsCache(USER_AGENT, ttl=app.config.get('ROBOTS_CACHE_TTL', 86400))
+        self.deduplicator = None
+        if app.config.get('DEDUP_ENABLED', True):
+            self.deduplicator = NearDuplicateDetector(app.config.get('DEDUP_MAX_DISTANCE', 3))
         self.logger = logging.getLogger(__name__)
+
+    def ensure_index(self) -> None:
+        """
+        Build the inverted index from stored pages if it has never been
+        built, was built with a different analyzer configuration or the
+        store answering queries (index segments, PostgreSQL search
+        vectors) was enabled after pages were indexed
+        """
+        try:
+            with self.app.app_context():
+                self.inverted_index.create_schema()
+                if self.inverted_index.uses_current_analyzer() and not self.inverted_index.query_store_outdated():
+                    return
+                if Page.query.filter_by(is_active=True).first():
+                    self.logger.info("Inverted index is missing or outdated, rebuilding from stored pages")
+                    self.inverted_index.rebuild()
+                else:
+                    self.inverted_index.record_analyzer()
+                    db.session.commit()
+        except Exception as e:
+            self.logger.error(f"Error building inverted index: {str(e)}")
+            db.session.rollback()
     
     def add_allowed_domain(self, domain: str) -> bool:
         """
@@ -32,6 +111,7 @@ class SearchIndexer:
                     if not existing.is_active:
                         existing.is_active = True
                         db.session.commit()
+                        self.refresh_domain_matcher()
                         self.logger.info(f"Reactivated domain: {domain}")
                         return True
                     else:
@@ -41,6 +121,7 @@ class SearchIndexer:
                 new_domain = AllowedDomain(domain=domain.lower())
                 db.session.add(new_domain)
                 db.session.commit()
+                self.refresh_domain_matcher()
                 self.logger.info(f"Added new allowed domain: {domain}")
                 return True
                 
@@ -52,35 +133,78 @@ class SearchIndexer:
         """Get list of active allowed domains"""
         try:
             with self.app.app_context():
-                domains = AllowedDomain.query.filter_by(is_active=True).all()
-                return [domain.domain for domain in domains]
+                return self.page_store.active_domains()
         except Exception as e:
             self.logger.error(f"Error getting allowed domains: {str(e)}")
             return []
     
+    def get_domain_matcher(self) -> DomainMatcher:
+        """
+        Get the compiled matcher of the active allowed domains
+        
+        The matcher is built once and shared by every crawler created by
+        this indexer; add_allowed_domain() replaces it when the set changes.
+        """
+        matcher = self._domain_matcher
+        if matcher is None:
+            matcher = DomainMatcher(self.get_allowed_domains())
+            # An empty set is not kept so a failed read is retried
+            if len(matcher):
+                self._domain_matcher = matcher
+        return matcher
+    
+    def refresh_domain_matcher(self) -> None:
+        """Rebuild the allowed-domain matcher from the database"""
+        self._domain_matcher = DomainMatcher(self.get_allowed_domains())
+    
     def index_page(self, page_data: Dict) -> bool:
         """
         Index a single page
         
+        Pages reported as not modified by the crawler, or whose content hash
+        matches the stored copy, are left untouched. New URLs whose body is a
+        near-duplicate of a stored page are skipped.
+        
         Args:
             page_data: Dictionary containing page data
             
         Returns:
-            True if indexed successfully
+            True if indexed successfully (or already up to date or a duplicate)
         """
+        if page_data.get('not_modified'):
+            return True
+        
         try:
-            with self.app.app_context():
-                # Check if page already exists
-                existing_page = Page.query.filter_by(url=page_data['url']).first()
+            with self.app.app_context(), stage('index_write'):
+                # Check if page already exists; the ORM object is only
+                # loaded when the page is actually rewritten
+                state = self.page_store.state(page_data['url'])
+                
+                if state and self._is_unchanged(state[1], state[2], page_data):
+                    self.logger.debug("Unchanged page: %s", page_data['url'])
+                    return True
                 
-                if existing_page:
+                fingerprint = self._fingerprint(page_data)
+                stored_urls = [page_data['url']] if state else []
+                if self._find_duplicates({page_data['url']: fingerprint}, stored_urls):
+                    return True
+                
+                if state:
+                    existing_page = db.session.get(Page, state[0])
+                    if not existing_page.is_active:
+                        self._update_domain_counts({existing_page.domain: 1})
                     # Update existing page
                     existing_page.title = page_data.get('title', '')
                     existing_page.content = page_data.get('content', '')
                     existing_page.description = page_data.get('description', '')
                     existing_page.keywords = page_data.get('keywords', '')
                     existing_page.is_active = True
-                    self.logger.info(f"Updated existing page: {page_data['url']}")
+                    existing_page.etag = page_data.get('etag')
+                    existing_page.last_modified = page_data.get('last_modified')
+                    existing_page.content_hash = page_data.get('content_hash')
+                    existing_page.requested_url = self._requested_url(page_data)
+                    page = existing_page
+                    self.logger.debug("Updated existing page: %s", page_data['url'])
                 else:
                     # Create new page
                     new_page = Page(
@@ -89,38 +213,468 @@ class SearchIndexer:
                         content=page_data.get('content', ''),
                         description=page_data.get('description', ''),
                         keywords=page_data.get('keywords', ''),
-                        domain=page_data['domain']
+                        domain=page_data['domain'],
+                        etag=page_data.get('etag'),
+                        last_modified=page_data.get('last_modified'),
+                        content_hash=page_data.get('content_hash'),
+                        requested_url=self._requested_url(page_data)
                     )
                     db.session.add(new_page)
-                    self.logger.info(f"Added new page: {page_data['url']}")
+                    # Flush to get the page id for its postings
+                    db.session.flush()
+                    self._update_domain_counts({new_page.domain: 1})
+                    page = new_page
+                    self.logger.debug("Added new page: %s", page_data['url'])
                 
+                added_terms = self.inverted_index.index_document(page)
+                if self.deduplicator:
+                    self.deduplicator.store({page.id: fingerprint})
                 db.session.commit()
+                self.inverted_index.flush_segment()
+                self.suggester.add_terms(added_terms)
+                PAGES_INDEXED.inc()
                 return True
                 
         except Exception as e:
             self.logger.error(f"Error indexing page {page_data.get('url', 'unknown')}: {str(e)}")
             db.session.rollback()
+            self.inverted_index.discard_segment()
             return False
     
-    def index_pages(self, pages_data: List[Dict]) -> int:
+    def index_pages(self, pages_data: List[Dict], batch_size: Optional[int] = None) -> int:
         """
         Index multiple pages
         
+        Pages are written in batches: existing URLs are looked up with one
+        query per batch, inserts and updates go out as executemany
+        statements and every batch is committed once. If a batch fails it is
+        retried page by page so one bad record does not drop its neighbours.
+        
         Args:
             pages_data: List of page data dictionaries
+            batch_size: Pages per transaction (defaults to INDEX_BATCH_SIZE)
             
         Returns:
             Number of successfully indexed pages
         """
+        batch_size = batch_size or self.app.config.get('INDEX_BATCH_SIZE', 500)
         success_count = 0
         
-        for page_data in pages_data:
-            if self.index_page(page_data):
-                success_count += 1
+        for start in range(0, len(pages_data), batch_size):
+            batch = pages_data[start:start + batch_size]
+            try:
+                with self.app.app_context(), stage('index_write'):
+                    written_count, skipped_count = self._index_batch(batch)
+                    db.session.commit()
+                    self.inverted_index.flush_segment()
+                success_count += written_count + skipped_count
+                PAGES_INDEXED.inc(written_count)
+            except Exception as e:
+                self.logger.error(f"Error indexing batch of {len(batch)} pages, retrying one by one: {str(e)}")
+                with self.app.app_context():
+                    db.session.rollback()
+                self.inverted_index.discard_segment()
+                for page_data in batch:
+                    if self.index_page(page_data):
+                        success_count += 1
         
         self.logger.info(f"Successfully indexed {success_count}/{len(pages_data)} pages")
         return success_count
     
+    def deactivate_pages(self, urls: List[str]) -> int:
+        """
+        Take pages out of the search results and the statistics
+        
+        The rows are kept, so a later crawl of the same URL reactivates the
+        page. Postings and the active page counters of the domains are
+        updated in the same transaction as the pages.
+        
+        Args:
+            urls: URLs of the pages to deactivate
+            
+        Returns:
+            Number of pages that were active
+        """
+        try:
+            with self.app.app_context():
+                rows = []
+                for start in range(0, len(urls), 500):
+                    rows += db.session.execute(
+                        db.select(Page.id, Page.domain)
+                        .where(Page.url.in_(urls[start:start + 500]), Page.is_active == True)
+                    ).all()
+                if not rows:
+                    return 0
+                
+                page_ids = [page_id for page_id, _ in rows]
+                db.session.execute(db.update(Page), [
+                    {'id': page_id, 'is_active': False} for page_id in page_ids
+                ])
+                self.inverted_index.remove_documents(page_ids)
+                domain_deltas = defaultdict(int)
+                for _, domain in rows:
+                    domain_deltas[domain] -= 1
+                self._update_domain_counts(domain_deltas)
+                db.session.commit()
+            self.inverted_index.flush_segment()
+            self.logger.info(f"Deactivated {len(rows)} pages")
+            return len(rows)
+        except Exception as e:
+            self.logger.error(f"Error deactivating pages: {str(e)}")
+            db.session.rollback()
+            self.inverted_index.discard_segment()
+            return 0
+    
+    def _is_unchanged(self, stored_hash: Optional[str], is_active: bool, page_data: Dict) -> bool:
+        """Check whether crawled data matches an active stored page"""
+        content_hash = page_data.get('content_hash')
+        return bool(is_active and content_hash and content_hash == stored_hash)
+    
+    def _fingerprint(self, page_data: Dict) -> Optional[int]:
+        """SimHash of a page body (None when deduplication is off)"""
+        if not self.deduplicator:
+            return None
+        return simhash(page_data.get('content') or '')
+    
+    def _find_duplicates(self, fingerprints: Dict[str, Optional[int]], stored_urls) -> Dict[str, str]:
+        """Near-duplicates among pages about to be written (see NearDuplicateDetector)"""
+        if not self.deduplicator:
+            return {}
+        duplicates = self.deduplicator.find_duplicates(fingerprints, stored_urls)
+        for url, original in duplicates.items():
+            self.logger.debug("Skipped near-duplicate page: %s (of %s)", url, original)
+        DUPLICATES.inc(len(duplicates))
+        return duplicates
+    
+    def _index_batch(self, pages_data: List[Dict]) -> Tuple[int, int]:
+        """
+        Write one batch of pages and their postings (caller commits)
+        
+        Returns:
+            (written_count, skipped_count) where skipped pages were unchanged
+            or near-duplicates of other pages
+        """
+        # Last occurrence wins when a URL appears twice in the batch
+        by_url = {
+            page_data['url']: page_data for page_data in pages_data
+            if not page_data.get('not_modified')
+        }
+        unchanged_count = len(pages_data) - len(by_url)
+        if not by_url:
+            return 0, unchanged_count
+        
+        existing = self.page_store.states(by_url)
+        
+        # Skip pages whose body did not change since they were stored
+        for url in list(by_url):
+            if url in existing and self._is_unchanged(existing[url][1], existing[url][2], by_url[url]):
+                del by_url[url]
+                unchanged_count += 1
+        
+        fingerprints = {url: self._fingerprint(page_data) for url, page_data in by_url.items()}
+        duplicates = self._find_duplicates(fingerprints, existing)
+        for url in duplicates:
+            del by_url[url]
+        
+        urls = list(by_url)
+        existing_ids = {url: existing[url][0] for url in urls if url in existing}
+        
+        now = datetime.utcnow()
+        updates = []
+        inserts = []
+        # New and reactivated pages per domain
+        domain_deltas = defaultdict(int)
+        for url, page_data in by_url.items():
+            content = page_data.get('content') or ''
+            values = {
+                'title': page_data.get('title', ''),
+                'summary': content[:SUMMARY_LENGTH],
+                'content_length': len(content),
+                'description': page_data.get('description', ''),
+                'keywords': page_data.get('keywords', ''),
+                'is_active': True,
+                'last_updated': now,
+                'etag': page_data.get('etag'),
+                'last_modified': page_data.get('last_modified'),
+                'content_hash': page_data.get('content_hash'),
+                'requested_url': self._requested_url(page_data)
+            }
+            if url in existing_ids:
+                updates.append(dict(values, id=existing_ids[url]))
+                if not existing[url][2]:
+                    domain_deltas[existing[url][3]] += 1
+            else:
+                inserts.append(dict(values, url=url, domain=page_data['domain'], crawled_at=now))
+                domain_deltas[page_data['domain']] += 1
+        
+        if updates:
+            db.session.execute(db.update(Page), updates)
+        if inserts:
+            db.session.execute(db.insert(Page), inserts)
+            existing_ids.update(self.page_store.ids(row['url'] for row in inserts))
+        self._update_domain_counts(domain_deltas)
+        
+        if urls:
+            page_ids = [existing_ids[url] for url in urls]
+            for start in range(0, len(page_ids), 500):
+                db.session.execute(db.delete(PageContent).where(
+                    PageContent.page_id.in_(page_ids[start:start + 500])
+                ))
+            db.session.execute(db.insert(PageContent), [
+                {'page_id': existing_ids[url], 'content': by_url[url].get('content') or ''}
+                for url in urls
+            ])
+            added_terms = self.inverted_index.index_documents([
+                dict(by_url[url], id=existing_ids[url]) for url in urls
+            ])
+            if self.deduplicator:
+                self.deduplicator.store({existing_ids[url]: fingerprints[url] for url in urls})
+            # Applied before the caller commits; a rolled back batch only
+            # skews suggestion weights until the next reload
+            self.suggester.add_terms(added_terms)
+        
+        self.logger.info(
+            f"Indexed batch: {len(inserts)} new, {len(updates)} updated, {unchanged_count} unchanged, "
+            f"{len(duplicates)} duplicate pages"
+        )
+        return len(urls), unchanged_count + len(duplicates)
+    
+    def _update_domain_counts(self, deltas: Dict[str, int]) -> None:
+        """Apply changes to the active page counters of domains (caller commits)"""
+        increment_rows(DomainStatistics.__table__, 'domain', [
+            {'domain': domain, 'page_count': delta} for domain, delta in deltas.items() if delta
+        ])
+    
+    def ensure_statistics(self) -> None:
+        """Fill the counters behind get_stats for a database that predates them"""
+        try:
+            with self.app.app_context():
+                if not db.session.execute(db.select(DomainStatistics.domain).limit(1)).first():
+                    counts = db.session.execute(
+                        db.select(Page.domain, db.func.count(Page.id))
+                        .where(Page.is_active == True)
+                        .group_by(Page.domain)
+                    ).all()
+                    if counts:
+                        db.session.execute(db.insert(DomainStatistics), [
+                            {'domain': domain, 'page_count': count} for domain, count in counts
+                        ])
+                        self.logger.info(f"Initialized page counters for {len(counts)} domains")
+                
+                if not db.session.execute(
+                    db.select(StatCounter.name).where(StatCounter.name == INDEX_POSTINGS)
+                ).first():
+                    set_counters({
+                        INDEX_TERMS: db.session.execute(db.select(db.func.count(IndexTerm.id))).scalar(),
+                        INDEX_POSTINGS: db.session.execute(
+                            db.select(db.func.count()).select_from(Posting)
+                        ).scalar()
+                    })
+                db.session.commit()
+        except Exception as e:
+            self.logger.error(f"Error initializing statistics counters: {str(e)}")
+            db.session.rollback()
+    
+    def ensure_fingerprints(self, batch_size: int = 500) -> None:
+        """Fingerprint stored pages that were indexed before deduplication existed"""
+        if not self.deduplicator:
+            return
+        try:
+            with self.app.app_context():
+                last_id = 0
+                fingerprinted = 0
+                while True:
+                    rows = db.session.execute(
+                        db.select(Page.id, PageContent.content)
+                        .outerjoin(PageContent, PageContent.page_id == Page.id)
+                        .outerjoin(PageFingerprint, PageFingerprint.page_id == Page.id)
+                        .where(Page.id > last_id, Page.is_active == True,
+                               PageFingerprint.page_id.is_(None))
+                        .order_by(Page.id)
+                        .limit(batch_size)
+                    ).all()
+                    if not rows:
+                        break
+                    self.deduplicator.store({
+                        page_id: simhash(content or '') for page_id, content in rows
+                    })
+                    db.session.commit()
+                    last_id = rows[-1][0]
+                    fingerprinted += len(rows)
+                if fingerprinted:
+                    self.logger.info(f"Fingerprinted {fingerprinted} stored pages")
+        except Exception as e:
+            self.logger.error(f"Error fingerprinting stored pages: {str(e)}")
+            db.session.rollback()
+    
+    def count_pages(self, domain: Optional[str] = None) -> int:
+        """
+        Get the number of active pages from the maintained counters
+        
+        Args:
+            domain: Count only this domain (all domains if omitted)
+        """
+        with self.app.app_context():
+            statement = db.select(db.func.sum(DomainStatistics.page_count))
+            if domain:
+                statement = statement.where(DomainStatistics.domain == domain)
+            return db.session.execute(statement).scalar() or 0
+    
+    def list_pages(self, domain: Optional[str] = None, limit: int = 20,
+                   after: Optional[Tuple[str, int]] = None,
+                   offset: int = 0) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+        """
+        List active pages ordered by (domain, id) with keyset pagination
+        
+        Every page is read with an index range scan that starts right after
+        the last row of the previous page, so the cost does not grow with
+        the position in the listing.
+        
+        Args:
+            domain: Only list pages of this domain
+            limit: Maximum number of pages to return
+            after: (domain, id) of the last page already returned
+            offset: Rows to skip when `after` is not given (legacy, slow for deep pages)
+            
+        Returns:
+            (pages, next_key) where next_key is the key to pass as `after`
+            for the following page, or None after the last page
+        """
+        with self.app.app_context():
+            # One extra row tells whether another page follows
+            wanted = limit + 1
+            query = Page.query.filter(Page.is_active == True).order_by(Page.domain, Page.id)
+            if not after:
+                if domain:
+                    query = query.filter(Page.domain == domain)
+                pages = query.offset(offset).limit(wanted).all()
+            else:
+                after_domain, after_id = after
+                if domain and domain != after_domain:
+                    # Token of a listing of another domain
+                    return [], None
+                # Rest of the current domain first, then the following domains;
+                # both are seeks on ix_pages_active_domain_id
+                pages = query.filter(
+                    Page.domain == after_domain, Page.id > after_id
+                ).limit(wanted).all()
+                if len(pages) < wanted and not domain:
+                    pages += query.filter(Page.domain > after_domain).limit(wanted - len(pages)).all()
+            next_key = None
+            if len(pages) > limit:
+                pages = pages[:limit]
+                next_key = (pages[-1].domain, pages[-1].id)
+            
+            results = []
+            for page in pages:
+                page_dict = page.to_dict()
+                # Truncate content for listing
+                page_dict['content'] = page.content_preview(200)
+                results.append(page_dict)
+            return results, next_key
+    
+    @staticmethod
+    def _requested_url(page_data: Dict) -> Optional[str]:
+        """URL a page was fetched from, None when it is the canonical URL itself"""
+        requested_url = page_data.get('requested_url')
+        return requested_url if requested_url and requested_url != page_data['url'] else None
+    
+    def get_validators(self, urls: List[str]) -> Dict[str, Dict]:
+        """
+        Get the conditional request validators of stored pages
+        
+        Pages are stored under their canonical URL, so a URL is matched
+        against both the stored URL and the URL the page was fetched from.
+        
+        Args:
+            urls: URLs about to be crawled
+            
+        Returns:
+            Mapping of the given URLs to {'etag', 'last_modified', 'content_hash'}
+        """
+        validators = {}
+        try:
+            with self.app.app_context():
+                for start in range(0, len(urls), 500):
+                    chunk = urls[start:start + 500]
+                    wanted = set(chunk)
+                    for url, requested_url, etag, last_modified, content_hash in db.session.execute(
+                        db.select(Page.url, Page.requested_url, Page.etag,
+                                  Page.last_modified, Page.content_hash)
+                        .where(db.or_(Page.url.in_(chunk), Page.requested_url.in_(chunk)),
+                               Page.is_active == True)
+                    ):
+                        page_validators = {
+                            'etag': etag,
+                            'last_modified': last_modified,
+                            'content_hash': content_hash
+                        }
+                        for key in (url, requested_url):
+                            if key in wanted:
+                                validators[key] = page_validators
+        except Exception as e:
+            self.logger.error(f"Error getting validators: {str(e)}")
+        return validators
+    
+    def filter_changed(self, entries: List[Tuple[str, Optional[datetime]]]) -> List[str]:
+        """
+        Drop sitemap entries whose page did not change since it was stored
+        
+        Args:
+            entries: (url, lastmod) pairs; entries without lastmod are kept
+            
+        Returns:
+            URLs of new pages and of pages modified after their stored copy
+        """
+        updated = {}
+        try:
+            with self.app.app_context():
+                urls = [url for url, lastmod in entries if lastmod is not None]
+                for start in range(0, len(urls), 500):
+                    updated.update(db.session.execute(
+                        db.select(Page.url, Page.last_updated)
+                        .where(Page.url.in_(urls[start:start + 500]), Page.is_active == True)
+                    ).all())
+        except Exception as e:
+            self.logger.error(f"Error checking sitemap entries: {str(e)}")
+        
+        return [
+            url for url, lastmod in entries
+            if lastmod is None or url not in updated or updated[url] is None or lastmod > updated[url]
+        ]
+    
+    def create_crawler(self, allowed_domains: Optional[Union[List[str], DomainMatcher]] = None) -> WebCrawler:
+        """Create a crawler configured from the app config (shared domain matcher by default)"""
+        return WebCrawler(
+            allowed_domains if allowed_domains is not None else self.get_domain_matcher(),
+            delay=self.app.config.get('CRAWLER_DELAY', 1.0),
+            max_workers=self.app.config.get('CRAWLER_MAX_WORKERS', 8),
+            host_pool_size=self.app.config.get('CRAWLER_HOST_POOL_SIZE', 2),
+            query_params=self.app.config.get('CRAWLER_QUERY_PARAMS'),
+            robots=self.robots,
+            max_delay=self.app.config.get('CRAWLER_MAX_DELAY', 30.0)
+        )
+    
+    def canonical_url(self, url: str) -> str:
+        """Canonical form of a URL with the configured query parameter whitelist"""
+        return canonicalize_url(url, self.app.config.get('CRAWLER_QUERY_PARAMS'))
+    
+    def create_pipeline(self, crawler: WebCrawler) -> Optional[CrawlPipeline]:
+        """
+        Create a multi-process crawl pipeline if CRAWL_PARSE_PROCESSES is set
+        
+        Returns:
+            CrawlPipeline or None when pages are parsed on the crawler threads
+        """
+        processes = self.app.config.get('CRAWL_PARSE_PROCESSES', 0)
+        if not processes:
+            return None
+        return CrawlPipeline(
+            crawler, self,
+            processes=processes,
+            queue_size=self.app.config.get('CRAWL_PIPELINE_QUEUE_SIZE', 64)
+        )
+    
     def crawl_and_index(self, urls: List[str]) -> int:
         """
         Crawl URLs and index the content
@@ -131,77 +685,199 @@ class SearchIndexer:
         Returns:
             Number of successfully indexed pages
         """
-        allowed_domains = self.get_allowed_domains()
+        domain_matcher = self.get_domain_matcher()
         
-        if not allowed_domains:
+        if not len(domain_matcher):
             self.logger.warning("No allowed domains configured")
             return 0
         
-        crawler = WebCrawler(allowed_domains)
-        crawled_data = crawler.crawl_urls(urls)
+        crawler = self.create_crawler(domain_matcher)
+        pipeline = self.create_pipeline(crawler)
+        try:
+            cleaned_urls = [crawler.clean_url(url) for url in urls]
+            validators = self.get_validators(cleaned_urls)
+            if pipeline:
+                _, indexed_count = pipeline.run(cleaned_urls, validators=validators)
+                return indexed_count
+            crawled_data = crawler.crawl_urls(cleaned_urls, validators=validators)
+        finally:
+            if pipeline:
+                pipeline.close()
+            crawler.close()
         
         return self.index_pages(crawled_data)
     
+    def load_suggestions(self) -> None:
+        """
+        Load the most frequent indexed terms into the suggester
+        
+        Terms are stemmed, so the suggester gets their surface forms
+        ("database" rather than "databas"); terms stored without one fall
+        back to the term itself.
+        """
+        try:
+            with self.app.app_context():
+                generation = self.inverted_index.get_generation()
+                word = db.func.coalesce(IndexTerm.surface, IndexTerm.term)
+                doc_freq = db.func.sum(IndexTerm.doc_freq)
+                rows = db.session.execute(
+                    db.select(word, doc_freq)
+                    .where(IndexTerm.doc_freq > 0)
+                    .group_by(word)
+                    .order_by(doc_freq.desc())
+                    .limit(self.suggester.terms.max_entries)
+                ).all()
+            self.suggester.load_terms(rows)
+            self._suggestions_generation = generation
+            self._suggestions_loaded_at = time.monotonic()
+        except Exception as e:
+            self.logger.error(f"Error loading suggestions: {str(e)}")
+    
+    def suggest(self, text: str, limit: int = 8) -> List[Dict]:
+        """
+        Get typeahead suggestions for partially typed input
+        
+        Terms indexed by this process are added as they are written. The
+        term list is reloaded from the database at most every
+        SUGGEST_REFRESH_SECONDS when the index changed, which also picks up
+        removals and writes of other processes.
+        
+        Args:
+            text: Input typed so far
+            limit: Maximum number of suggestions
+            
+        Returns:
+            List of {'text', 'type', 'weight'} dictionaries
+        """
+        refresh_seconds = self.app.config.get('SUGGEST_REFRESH_SECONDS', 300)
+        if self._suggestions_generation is None:
+            self.load_suggestions()
+        elif time.monotonic() - self._suggestions_loaded_at > refresh_seconds:
+            if self.get_index_generation() != self._suggestions_generation:
+                self.load_suggestions()
+            else:
+                self._suggestions_loaded_at = time.monotonic()
+        return self.suggester.suggest(text, limit)
+    
+    def get_index_generation(self) -> int:
+        """Get the index generation, which changes whenever the index is written"""
+        try:
+            with self.app.app_context():
+                return self.inverted_index.get_generation()
+        except Exception as e:
+            self.logger.error(f"Error getting index generation: {str(e)}")
+            return -1
+    
     def search_pages(self, query: str, limit: int = 10) -> List[Dict]:
         """
         Search for pages matching the query
         
         Args:
-            query: Search query
+            query: Search query (terms, AND/OR/NOT, "phrases", prefix*)
             limit: Maximum number of results to return
             
         Returns:
-            List of matching page dictionaries
+            List of matching page dictionaries ordered by BM25 score, with a
+            query-aware snippet and the ranges of the highlighted terms
         """
         try:
             with self.app.app_context():
-                # Simple text search in title, content, and description
-                search_term = f"%{query}%"
-                
-                pages = Page.query.filter(
-                    db.and_(
-                        Page.is_active == True,
-                        db.or_(
-                            Page.title.ilike(search_term),
-                            Page.content.ilike(search_term),
-                            Page.description.ilike(search_term),
-                            Page.keywords.ilike(search_term)
-                        )
-                    )
-                ).limit(limit).all()
+                SEARCHES.inc()
+                with stage('query_parse'):
+                    tree = parse_query(query, self.analyzer)
+                ranked, matched_terms = self.inverted_index.execute(tree, limit)
+                if not ranked:
+                    self.logger.debug("Found 0 results for query: %s", query)
+                    return []
+                
+                scores = dict(ranked)
+                page_ids = [page_id for page_id, _ in ranked]
+                
+                with stage('snippets'):
+                    pages_by_id = {
+                        page.id: page for page in Page.query.filter(
+                            Page.id.in_(page_ids),
+                            Page.is_active == True
+                        ).all()
+                    }
+                    pages = [pages_by_id[page_id] for page_id in page_ids if page_id in pages_by_id]
+                    
+                    snippets = self.snippets.generate(matched_terms, pages)
                 
                 results = []
                 for page in pages:
+                    # to_dict() uses the stored summary, the body is never loaded
                     page_dict = page.to_dict()
-                    # Truncate content for search results
-                    if page_dict['content'] and len(page_dict['content']) > 300:
-                        page_dict['content'] = page_dict['content'][:300] + '...'
+                    page_dict['score'] = round(scores[page.id], 4)
+                    page_dict.update(snippets[page.id])
                     results.append(page_dict)
                 
-                self.logger.info(f"Found {len(results)} results for query: {query}")
+                self.logger.debug("Found %d results for query: %s", len(results), query)
                 return results
                 
         except Exception as e:
             self.logger.error(f"Error searching for query '{query}': {str(e)}")
             return []
     
+    def _segment_stats(self) -> Optional[Dict]:
+        """Size of the segment store (None when queries use the tables)"""
+        segments = self.inverted_index.segments
+        if segments is None:
+            return None
+        open_segments = segments.segments()
+        return {
+            'count': len(open_segments),
+            'documents': sum(len(segment) - len(segment.deleted) for segment in open_segments),
+            'deleted_documents': sum(len(segment.deleted) for segment in open_segments)
+        }
+    
     def get_stats(self) -> Dict:
-        """Get indexing statistics"""
+        """
+        Get indexing statistics
+        
+        Everything is read from counters maintained by the indexer and the
+        crawl jobs, so the cost depends on the number of domains rather than
+        on the number of pages.
+        """
         try:
             with self.app.app_context():
-                total_pages = Page.query.filter_by(is_active=True).count()
-                total_domains = AllowedDomain.query.filter_by(is_active=True).count()
-                
-                # Get pages per domain
-                domain_stats = db.session.query(
-                    Page.domain,
-                    db.func.count(Page.id).label('count')
-                ).filter_by(is_active=True).group_by(Page.domain).all()
+                domain_stats = db.session.execute(
+                    db.select(DomainStatistics.domain, DomainStatistics.page_count)
+                    .where(DomainStatistics.page_count > 0)
+                ).all()
+                total_domains = db.session.execute(
+                    db.select(db.func.count(AllowedDomain.id)).where(AllowedDomain.is_active == True)
+                ).scalar()
+                total_tokens = db.session.execute(
+                    db.select(db.func.sum(FieldStatistics.total_length))
+                ).scalar() or 0
+                counters = get_counters([
+                    INDEX_TERMS, INDEX_POSTINGS,
+                    CRAWL_PAGES_FETCHED, CRAWL_PAGES_INDEXED, CRAWL_MILLISECONDS
+                ])
+                crawl_seconds = counters[CRAWL_MILLISECONDS] / 1000
+                pages_per_second = None
+                if crawl_seconds:
+                    pages_per_second = round(counters[CRAWL_PAGES_FETCHED] / crawl_seconds, 2)
                 
                 return {
-                    'total_pages': total_pages,
+                    'total_pages': sum(count for _, count in domain_stats),
                     'total_domains': total_domains,
-                    'pages_per_domain': {domain: count for domain, count in domain_stats}
+                    'pages_per_domain': {domain: count for domain, count in domain_stats},
+                    'index': {
+                        'terms': counters[INDEX_TERMS],
+                        'postings': counters[INDEX_POSTINGS],
+                        'tokens': total_tokens,
+                        'generation': self.inverted_index.get_generation(),
+                        'segments': self._segment_stats()
+                    },
+                    'crawl': {
+                        'pages_fetched': counters[CRAWL_PAGES_FETCHED],
+                        'pages_indexed': counters[CRAWL_PAGES_INDEXED],
+                        'crawl_seconds': round(crawl_seconds, 3),
+                        'pages_per_second': pages_per_second
+                    },
+                    'storage': self.storage.info()
                 }
                 
         except Exception as e:
@@ -211,4 +887,3 @@ class SearchIndexer:
                 'total_domains': 0,
                 'pages_per_domain': {}
             }
-
@@ -0,0 +1,829 @@
+from src.models.index import IndexTerm, Posting, DocumentLength, FieldStatistics, IndexMetadata
+from src.models.page import Page, db
+from src.analysis import Analyzer, DEFAULT_ANALYZER, TOKEN_PATTERN, tokenize, tokenize_with_offsets
+from src.query import parse_query, Term, Prefix, Phrase, And, Or, Not
+from src.ranking import BM25Ranker
+from src.segments import SegmentIndex
+from src.metrics import stage
+from src.statistics import (
+    increment_counters, increment_rows, conflict_insert, set_counters, INDEX_TERMS, INDEX_POSTINGS
+)
+from typing import List, Dict, Iterable, Optional, Set, Tuple
+from collections import defaultdict
+import logging
+import threading
+import zlib
+
+# Page fields that are tokenized into the index
+INDEXED_FIELDS = ('title', 'description', 'keywords', 'content')
+
+# Field whose postings also keep character offsets for result snippets
+SNIPPET_FIELD = 'content'
+
+# Keep IN (...) lists well below SQLite's bound parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+# Most frequent terms a trailing-wildcard prefix expands to
+MAX_PREFIX_EXPANSIONS = 50
+
+# Seek postings of individual candidate pages instead of scanning a term's
+# postings when the candidates are this many times fewer
+SEEK_RATIO = 8
+
+# Core INSERTs of the bulk write path. ORM bulk inserts spend more time
+# collecting parameters than the database spends storing the rows.
+INSERT_POSTINGS = Posting.__table__.insert()
+INSERT_DOCUMENT_LENGTHS = DocumentLength.__table__.insert()
+
+def _chunks(items: List, size: int = LOOKUP_CHUNK_SIZE) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def build_postings(page, analyzer: Analyzer = DEFAULT_ANALYZER) -> Dict[Tuple[str, str], Tuple[List[int], List[int]]]:
+    """
+    Analyze the indexed fields of a page
+
+    The language of the page is detected once from all of its fields and
+    every field is analyzed in that language.
+
+    Args:
+        page: Page instance or dictionary with page fields
+        analyzer: Analyzer producing the index terms
+
+    Returns:
+        Mapping of (term, field) to (token positions, character offsets)
+        inside that field; offsets are only recorded for SNIPPET_FIELD
+    """
+    fields = {}
+    for field in INDEXED_FIELDS:
+        if isinstance(page, dict):
+            text = page.get(field)
+        else:
+            text = getattr(page, field)
+        if field == SNIPPET_FIELD:
+            tokens = tokenize_with_offsets(text)
+            fields[field] = ([token for token, _ in tokens], [offset for _, offset in tokens])
+        else:
+            fields[field] = (tokenize(text), None)
+
+    language = analyzer.detect_language(
+        token for tokens, _ in fields.values() for token in tokens
+    )
+
+    postings = defaultdict(lambda: ([], []))
+    for field, (tokens, offsets) in fields.items():
+        for position, term in analyzer.analyze(tokens, language):
+            positions, term_offsets = postings[(term, field)]
+            positions.append(position)
+            if offsets is not None:
+                term_offsets.append(offsets[position])
+    return postings
+
+class InvertedIndex:
+    def __init__(self, ranker: Optional[BM25Ranker] = None, analyzer: Optional[Analyzer] = None,
+                 segments: Optional[SegmentIndex] = None):
+        """
+        Initialize inverted index
+
+        The index lives in the `index_terms`, `postings`, `document_lengths`
+        and `field_statistics` tables of the application database; its size
+        is tracked in `stat_counters`. All methods must be called inside an
+        app context; writers leave committing to the caller so that a page
+        row and its postings land in the same transaction.
+
+        With a SegmentIndex, queries read postings from memory-mapped
+        segment files instead. The tables remain the index of record (and
+        the source of snippets and suggestions); every write is buffered
+        per thread and becomes a new segment once the caller has committed
+        and called flush_segment().
+
+        Args:
+            ranker: Scorer for search results (BM25F with default weights if omitted)
+            analyzer: Analyzer for pages and queries (DEFAULT_ANALYZER if omitted)
+            segments: Segment store answering queries (None to query the tables)
+        """
+        self.ranker = ranker or BM25Ranker()
+        self.analyzer = analyzer or DEFAULT_ANALYZER
+        self.segments = segments
+        # Documents and deletions of the current transaction, per thread
+        self._pending = threading.local()
+        self.logger = logging.getLogger(__name__)
+
+    def build_postings(self, page) -> Dict[Tuple[str, str], Tuple[List[int], List[int]]]:
+        """
+        Analyze the indexed fields of a page
+
+        Postings precomputed by a parse worker (the 'postings' key of a page
+        dictionary) are used as they are.
+
+        Args:
+            page: Page instance or dictionary with page fields
+
+        Returns:
+            Mapping of (term, field) to (token positions, character offsets)
+        """
+        if isinstance(page, dict) and page.get('postings') is not None:
+            return page['postings']
+        return build_postings(page, self.analyzer)
+
+    def get_term_ids(self, terms: Iterable[str], create: bool = False) -> Dict[str, int]:
+        """
+        Resolve terms to their ids
+
+        Args:
+            terms: Terms to look up
+            create: Insert terms that are not in the dictionary yet
+
+        Returns:
+            Mapping of term to id for every known term
+        """
+        terms = set(terms)
+        known = self._lookup_terms(terms)
+        if create:
+            missing = sorted(terms.difference(known))
+            if missing:
+                known.update(self._add_terms(missing, {}))
+        return {term: term_id for term, (term_id, _) in known.items()}
+
+    def _lookup_terms(self, terms: Iterable[str]) -> Dict[str, Tuple[int, str]]:
+        """Map known terms to (term_id, surface form)"""
+        known = {}
+        for chunk in _chunks(list(terms)):
+            for term, term_id, surface in db.session.execute(
+                db.select(IndexTerm.term, IndexTerm.id, IndexTerm.surface).where(IndexTerm.term.in_(chunk))
+            ):
+                known[term] = (term_id, surface or term)
+        return known
+
+    def _add_terms(self, terms: List[str], surfaces: Dict[str, str]) -> Dict[str, Tuple[int, str]]:
+        """
+        Insert new terms with their surface forms and return their ids
+
+        Terms are inserted in the given (sorted) order. Another process may
+        add some of the same terms meanwhile: those rows are skipped, only
+        rows actually inserted are counted, and all ids are read back.
+        """
+        inserted = db.session.execute(
+            conflict_insert(IndexTerm.__table__)
+            .on_conflict_do_nothing(index_elements=['term'])
+            .returning(IndexTerm.__table__.c.id),
+            [{'term': term, 'doc_freq': 0, 'surface': surfaces.get(term)} for term in terms]
+        ).all()
+        increment_counters({INDEX_TERMS: len(inserted)})
+        return self._lookup_terms(terms)
+
+    def _surface_forms(self, pages: List, doc_postings: List, terms: Set[str]) -> Dict[str, str]:
+        """
+        Pick the word suggestions show for new terms
+
+        Terms are stemmed ("engin"), so each one keeps the original token it
+        occurs as most often in the batch that adds it ("engine"); ties go
+        to the shorter word. Tokens are read back through the positions and
+        character offsets of the postings, only for the given terms.
+        """
+        counts = defaultdict(lambda: defaultdict(int))
+        for page, (_, postings) in zip(pages, doc_postings):
+            field_tokens = {}
+            for (term, field), (positions, offsets) in postings.items():
+                if term not in terms:
+                    continue
+                text = page.get(field) if isinstance(page, dict) else getattr(page, field)
+                if offsets:
+                    words = [TOKEN_PATTERN.match(text, offset).group().lower() for offset in offsets]
+                else:
+                    if field not in field_tokens:
+                        field_tokens[field] = tokenize(text)
+                    words = [field_tokens[field][position] for position in positions]
+                for word in words:
+                    counts[term][word] += 1
+        return {
+            term: min(words, key=lambda word: (-words[word], len(word), word))
+            for term, words in counts.items()
+        }
+
+    def index_document(self, page) -> Dict[str, int]:
+        """
+        Replace the postings of a page with postings for its current content
+
+        Args:
+            page: Persisted Page instance (must have an id)
+
+        Returns:
+            Mapping of the surface form of every added term (see
+            _surface_forms) to the number of pages it was added to
+        """
+        return self.index_documents([page])
+
+    def index_documents(self, pages: List) -> Dict[str, int]:
+        """
+        Replace the postings of several pages in bulk
+
+        The term dictionary is resolved once for the whole batch and all
+        rows are written with executemany statements.
+
+        Args:
+            pages: Persisted Page instances or dictionaries with an 'id' key
+
+        Returns:
+            Mapping of the surface form of every added term (see
+            _surface_forms) to the number of pages it was added to
+        """
+        page_ids = [self._page_id(page) for page in pages]
+        # Also bumps the index generation
+        self.remove_documents(page_ids)
+
+        field_deltas = {field: [0, 0] for field in INDEXED_FIELDS}
+        length_rows = []
+        doc_postings = []
+        for page_id, page in zip(page_ids, pages):
+            postings = self.build_postings(page)
+            lengths = {field: 0 for field in INDEXED_FIELDS}
+            for (_, field), (positions, _) in postings.items():
+                lengths[field] += len(positions)
+            for field, length in lengths.items():
+                length_rows.append({'page_id': page_id, 'field': field, 'length': length})
+                field_deltas[field][0] += 1
+                field_deltas[field][1] += length
+            doc_postings.append((page_id, postings))
+            if self.segments is not None:
+                self._pending_segment()[0].append((
+                    page_id,
+                    {key: positions for key, (positions, _) in postings.items()},
+                    lengths
+                ))
+
+        if not length_rows:
+            return {}
+
+        self._write_documents(doc_postings)
+        db.session.execute(INSERT_DOCUMENT_LENGTHS, length_rows)
+        self._update_field_statistics(field_deltas)
+
+        terms = {term for _, postings in doc_postings for term, _ in postings}
+        known = self._lookup_terms(terms)
+        missing = terms.difference(known)
+        if missing:
+            known.update(self._add_terms(
+                sorted(missing), self._surface_forms(pages, doc_postings, missing)
+            ))
+        term_ids = {term: term_id for term, (term_id, _) in known.items()}
+
+        posting_rows = []
+        doc_freq_deltas = defaultdict(int)
+        added_terms = defaultdict(int)
+        for page_id, postings in doc_postings:
+            for (term, field), (positions, offsets) in postings.items():
+                posting_rows.append({
+                    'term_id': term_ids[term],
+                    'page_id': page_id,
+                    'field': field,
+                    'term_freq': len(positions),
+                    'positions': ' '.join(str(position) for position in positions),
+                    'offsets': ' '.join(str(offset) for offset in offsets) if offsets else None
+                })
+            for term in {term for term, _ in postings}:
+                doc_freq_deltas[term_ids[term]] += 1
+                added_terms[known[term][1]] += 1
+
+        if posting_rows:
+            db.session.execute(INSERT_POSTINGS, posting_rows)
+            increment_counters({INDEX_POSTINGS: len(posting_rows)})
+        self._update_doc_freqs(doc_freq_deltas)
+        return added_terms
+
+    def _write_documents(self, documents: List[Tuple[int, Dict]]) -> None:
+        """
+        Hook for index stores that answer queries from their own copy of
+        the documents (the tables need nothing more)
+
+        Args:
+            documents: (page_id, postings) of the pages being indexed
+        """
+
+    def remove_document(self, page_id: int) -> None:
+        """
+        Drop all postings of a page and update document frequencies
+
+        Args:
+            page_id: Id of the page to remove
+        """
+        self.remove_documents([page_id])
+
+    def remove_documents(self, page_ids: List[int]) -> None:
+        """
+        Drop all postings of several pages and update document frequencies
+
+        Args:
+            page_ids: Ids of the pages to remove
+        """
+        if page_ids:
+            self.bump_generation()
+            if self.segments is not None:
+                self._pending_segment()[1].update(page_ids)
+
+        for chunk in _chunks(list(page_ids)):
+            field_deltas = {}
+            for field, doc_count, total_length in db.session.execute(
+                db.select(
+                    DocumentLength.field,
+                    db.func.count(DocumentLength.page_id),
+                    db.func.sum(DocumentLength.length)
+                )
+                .where(DocumentLength.page_id.in_(chunk))
+                .group_by(DocumentLength.field)
+            ):
+                field_deltas[field] = [-doc_count, -(total_length or 0)]
+
+            doc_freq_deltas = {
+                term_id: -doc_count
+                for term_id, doc_count in db.session.execute(
+                    db.select(Posting.term_id, db.func.count(db.distinct(Posting.page_id)))
+                    .where(Posting.page_id.in_(chunk))
+                    .group_by(Posting.term_id)
+                )
+            }
+
+            if field_deltas:
+                db.session.execute(db.delete(DocumentLength).where(DocumentLength.page_id.in_(chunk)))
+                self._update_field_statistics(field_deltas)
+            if doc_freq_deltas:
+                removed = db.session.execute(
+                    db.delete(Posting).where(Posting.page_id.in_(chunk))
+                ).rowcount
+                increment_counters({INDEX_POSTINGS: -removed})
+                self._update_doc_freqs(doc_freq_deltas)
+
+    def _pending_segment(self) -> Tuple[List, Set[int]]:
+        if not hasattr(self._pending, 'documents'):
+            self._pending.documents = []
+            self._pending.deleted = set()
+        return self._pending.documents, self._pending.deleted
+
+    def flush_segment(self) -> None:
+        """
+        Write the documents indexed by this thread since the last flush as
+        a new segment (call after committing)
+        """
+        if self.segments is None:
+            return
+        documents, deleted = self._pending_segment()
+        self.discard_segment()
+        if not documents and not deleted:
+            return
+        try:
+            self.segments.commit(documents, deleted)
+        except Exception as e:
+            # The tables are committed; rebuild() brings the segments back in sync
+            self.logger.error(f"Error writing index segment for {len(documents)} pages: {str(e)}")
+
+    def discard_segment(self) -> None:
+        """Forget buffered segment writes (call after a rollback)"""
+        self._pending.documents = []
+        self._pending.deleted = set()
+
+    def create_schema(self) -> None:
+        """Create storage beyond the application tables (none here)"""
+
+    def query_store_outdated(self) -> bool:
+        """Check whether the store answering queries lacks the indexed pages"""
+        return self.segments_outdated()
+
+    def segments_outdated(self) -> bool:
+        """Check whether segments are enabled but hold none of the indexed pages"""
+        if self.segments is None:
+            return False
+        has_documents = db.session.execute(db.select(DocumentLength.page_id).limit(1)).first()
+        return has_documents is not None and self.segments.doc_count() == 0
+
+    def bump_generation(self) -> None:
+        """Mark the index as changed so cached search results are discarded"""
+        increment_rows(IndexMetadata.__table__, 'key', [{'key': 'generation', 'value': 1}])
+
+    def analyzer_checksum(self) -> int:
+        """Checksum of the analyzer signature, stored with the index"""
+        return zlib.crc32(self.analyzer.signature.encode('utf-8'))
+
+    def record_analyzer(self) -> None:
+        """Remember which analyzer built the index"""
+        db.session.execute(db.delete(IndexMetadata).where(IndexMetadata.key == 'analyzer'))
+        db.session.execute(db.insert(IndexMetadata).values(
+            key='analyzer', value=self.analyzer_checksum()
+        ))
+
+    def uses_current_analyzer(self) -> bool:
+        """Check whether the index was built with the configured analyzer"""
+        value = db.session.execute(
+            db.select(IndexMetadata.value).where(IndexMetadata.key == 'analyzer')
+        ).scalar()
+        return value == self.analyzer_checksum()
+
+    def get_generation(self) -> int:
+        """Current index generation (changes on every index write)"""
+        value = db.session.execute(
+            db.select(IndexMetadata.value).where(IndexMetadata.key == 'generation')
+        ).scalar()
+        return value or 0
+
+    def _page_id(self, page) -> int:
+        return page['id'] if isinstance(page, dict) else page.id
+
+    def _update_doc_freqs(self, deltas: Dict[int, int]) -> None:
+        """
+        Apply document frequency changes with one executemany statement
+
+        Rows are updated in term id order so concurrent writers lock them
+        in the same order and cannot deadlock.
+        """
+        if not deltas:
+            return
+        # Core table statement: the ORM would treat a parameter list as a bulk
+        # update by primary key and refuse the relative increment
+        table = IndexTerm.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.id == db.bindparam('term_id'))
+            .values(doc_freq=table.c.doc_freq + db.bindparam('delta')),
+            [{'term_id': term_id, 'delta': deltas[term_id]} for term_id in sorted(deltas)]
+        )
+
+    def _update_field_statistics(self, deltas: Dict[str, List[int]]) -> None:
+        """Apply (doc_count, total_length) changes to the collection totals"""
+        increment_rows(FieldStatistics.__table__, 'field', [
+            {'field': field, 'doc_count': doc_delta, 'total_length': length_delta}
+            for field, (doc_delta, length_delta) in deltas.items() if doc_delta or length_delta
+        ])
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[int, float]]:
+        """
+        Find and rank pages matching a query
+
+        Args:
+            query: Search query (see QueryParser for the syntax)
+            limit: Maximum number of results to return
+
+        Returns:
+            (page_id, score) pairs, best matches first
+        """
+        return self.execute(parse_query(query, self.analyzer), limit)[0]
+
+    def execute(self, tree, limit: int = 10) -> Tuple[List[Tuple[int, float]], Set[str]]:
+        """
+        Evaluate a parsed query
+
+        Only the postings of the query terms are read. Conjunctions start
+        with their rarest operand and hand the surviving candidates to the
+        next one; when the candidates are much fewer than the postings of a
+        term, the postings are read with primary key seeks for just those
+        pages instead of scanning the whole list (the database equivalent of
+        following skip pointers). Phrases are verified with the stored token
+        positions of the candidate pages only.
+
+        Args:
+            tree: Root node from parse_query()
+            limit: Maximum number of results to return
+
+        Returns:
+            ((page_id, score) pairs best first, matched query terms for highlighting)
+        """
+        if tree is None:
+            return [], set()
+
+        with stage('postings_scan'):
+            terms, expansions = self._resolve_terms(tree)
+            matches = self._evaluate(self._expand_prefixes(tree, expansions), None, terms)
+        if not matches:
+            return [], set()
+
+        matched_term_ids = set()
+        for page_terms in matches.values():
+            matched_term_ids.update(page_terms)
+        doc_freqs = {
+            term_id: doc_freq for term_id, doc_freq in terms.values()
+            if term_id in matched_term_ids
+        }
+        highlight_terms = {
+            term for term, (term_id, _) in terms.items() if term_id in matched_term_ids
+        }
+        with stage('ranking'):
+            ranked = self.ranker.top_k(self._score(matches, doc_freqs), limit)
+        return ranked, highlight_terms
+
+    def _resolve_terms(self, tree) -> Tuple[Dict[str, Tuple[int, int]], Dict[str, List[str]]]:
+        """
+        Look up every term of a query
+
+        Returns:
+            (terms, expansions) where terms maps every known term, including
+            prefix expansions, to (term_id, doc_freq) and expansions maps
+            each prefix to its most frequent matching terms
+        """
+        words = set()
+        prefixes = set()
+        self._collect(tree, words, prefixes)
+
+        if self.segments is not None:
+            # Segment postings are keyed by the term itself
+            terms = self.segments.lookup(words)
+            expansions = {}
+            for prefix in prefixes:
+                rows = self.segments.expand_prefix(prefix, MAX_PREFIX_EXPANSIONS)
+                terms.update({term: (term, doc_freq) for term, doc_freq in rows})
+                expansions[prefix] = [term for term, _ in rows]
+            return terms, expansions
+
+        terms = {}
+        for chunk in _chunks(list(words)):
+            for term_id, term, doc_freq in db.session.execute(
+                db.select(IndexTerm.id, IndexTerm.term, IndexTerm.doc_freq)
+                .where(IndexTerm.term.in_(chunk))
+            ):
+                terms[term] = (term_id, doc_freq)
+
+        expansions = {}
+        for prefix in prefixes:
+            # Range scan on the unique term index; LIKE would not use it
+            rows = db.session.execute(
+                db.select(IndexTerm.id, IndexTerm.term, IndexTerm.doc_freq)
+                .where(IndexTerm.term >= prefix, IndexTerm.term < prefix + '\U0010ffff',
+                       IndexTerm.doc_freq > 0)
+                .order_by(IndexTerm.doc_freq.desc())
+                .limit(MAX_PREFIX_EXPANSIONS)
+            ).all()
+            for term_id, term, doc_freq in rows:
+                terms[term] = (term_id, doc_freq)
+            expansions[prefix] = [term for _, term, _ in rows]
+        return terms, expansions
+
+    def _expand_prefixes(self, node, expansions: Dict[str, List[str]]):
+        """Replace prefix nodes by a disjunction of their expansions"""
+        if isinstance(node, Prefix):
+            return Or([Term(term) for term in expansions.get(node.prefix, [])])
+        if isinstance(node, And):
+            return And([self._expand_prefixes(child, expansions) for child in node.children])
+        if isinstance(node, Or):
+            return Or([self._expand_prefixes(child, expansions) for child in node.children])
+        if isinstance(node, Not):
+            return Not(self._expand_prefixes(node.child, expansions))
+        return node
+
+    def _collect(self, node, words: Set[str], prefixes: Set[str]) -> None:
+        if isinstance(node, Term):
+            words.add(node.term)
+        elif isinstance(node, Phrase):
+            for slot in node.terms:
+                words.update(slot)
+        elif isinstance(node, Prefix):
+            prefixes.add(node.prefix)
+        elif isinstance(node, (And, Or)):
+            for child in node.children:
+                self._collect(child, words, prefixes)
+        elif isinstance(node, Not):
+            self._collect(node.child, words, prefixes)
+
+    def _estimate(self, node, terms: Dict) -> int:
+        """Upper bound of the pages a node can match, used to order conjunctions"""
+        if isinstance(node, Term):
+            return terms[node.term][1] if node.term in terms else 0
+        if isinstance(node, Phrase):
+            return min(
+                sum(terms[term][1] for term in slot if term in terms) for slot in node.terms
+            )
+        if isinstance(node, And):
+            return min(self._estimate(child, terms) for child in node.children)
+        if isinstance(node, Or):
+            return sum(self._estimate(child, terms) for child in node.children)
+        return 0
+
+    def _evaluate(self, node, within: Optional[Set[int]], terms: Dict) -> Dict[int, Dict[int, Dict[str, int]]]:
+        """
+        Find the pages matching a node
+
+        Args:
+            node: Query tree node
+            within: Only these pages can match (None for the whole collection)
+            terms: Result of _resolve_terms()
+
+        Returns:
+            page_id -> term_id -> field -> term frequency of the matched terms
+        """
+        if isinstance(node, Term):
+            if node.term not in terms:
+                return {}
+            term_id, doc_freq = terms[node.term]
+            return {
+                page_id: {term_id: fields}
+                for page_id, fields in self._load_postings(term_id, doc_freq, within).items()
+            }
+
+        if isinstance(node, Phrase):
+            matches = self._evaluate(
+                And([Or([Term(term) for term in slot]) for slot in node.terms]), within, terms
+            )
+            if not matches:
+                return {}
+            slots = [{terms[term][0] for term in slot if term in terms} for slot in node.terms]
+            return self._filter_phrase(matches, list(zip(node.positions, slots)))
+
+        if isinstance(node, Or):
+            matches = {}
+            for child in node.children:
+                for page_id, page_terms in self._evaluate(child, within, terms).items():
+                    matches.setdefault(page_id, {}).update(page_terms)
+            return matches
+
+        if isinstance(node, Not):
+            # Only meaningful relative to a candidate set
+            if within is None:
+                return {}
+            excluded = self._evaluate(node.child, within, terms)
+            return {page_id: {} for page_id in within if page_id not in excluded}
+
+        if isinstance(node, And):
+            positives = [child for child in node.children if not isinstance(child, Not)]
+            negatives = [child for child in node.children if isinstance(child, Not)]
+            positives.sort(key=lambda child: self._estimate(child, terms))
+
+            if positives:
+                matches = None
+                for child in positives:
+                    child_matches = self._evaluate(
+                        child, set(matches) if matches is not None else within, terms
+                    )
+                    if matches is None:
+                        matches = child_matches
+                    else:
+                        matches = {
+                            page_id: {**matches[page_id], **page_terms}
+                            for page_id, page_terms in child_matches.items() if page_id in matches
+                        }
+                    if not matches:
+                        return {}
+            elif within is not None:
+                matches = {page_id: {} for page_id in within}
+            else:
+                # A query made only of exclusions would match the whole collection
+                return {}
+
+            for child in negatives:
+                excluded = self._evaluate(child.child, set(matches), terms)
+                matches = {
+                    page_id: page_terms for page_id, page_terms in matches.items()
+                    if page_id not in excluded
+                }
+            return matches
+
+        return {}
+
+    def _load_postings(self, term_id: int, doc_freq: int,
+                       within: Optional[Set[int]]) -> Dict[int, Dict[str, int]]:
+        """Read page_id -> field -> term frequency for one term"""
+        if self.segments is not None:
+            return self.segments.postings(term_id, within)
+
+        postings = defaultdict(dict)
+        if within is not None and len(within) * SEEK_RATIO < doc_freq:
+            for chunk in _chunks(sorted(within)):
+                for page_id, field, term_freq in db.session.execute(
+                    db.select(Posting.page_id, Posting.field, Posting.term_freq)
+                    .where(Posting.term_id == term_id, Posting.page_id.in_(chunk))
+                ):
+                    postings[page_id][field] = term_freq
+            return postings
+
+        for page_id, field, term_freq in db.session.execute(
+            db.select(Posting.page_id, Posting.field, Posting.term_freq)
+            .where(Posting.term_id == term_id)
+        ):
+            if within is None or page_id in within:
+                postings[page_id][field] = term_freq
+        return postings
+
+    def _filter_phrase(self, matches: Dict[int, Dict],
+                       slots: List[Tuple[int, Set[int]]]) -> Dict[int, Dict]:
+        """
+        Keep pages where the phrase occurs in one field
+
+        Args:
+            matches: Pages containing every word of the phrase
+            slots: (relative position, ids of the terms the word may be) per word
+        """
+        term_ids = set().union(*(slot_ids for _, slot_ids in slots))
+        positions = self._load_positions(term_ids, set(matches))
+
+        phrase_pages = set()
+        for (page_id, field), field_positions in positions.items():
+            if page_id in phrase_pages:
+                continue
+            slot_positions = [
+                (offset, set().union(*(field_positions.get(term_id, ()) for term_id in slot_ids)))
+                for offset, slot_ids in slots
+            ]
+            if any(
+                all(start + offset in candidates for offset, candidates in slot_positions)
+                for start in slot_positions[0][1]
+            ):
+                phrase_pages.add(page_id)
+
+        return {page_id: matches[page_id] for page_id in phrase_pages}
+
+    def _load_positions(self, term_ids: Set, page_ids: Set[int]) -> Dict[Tuple[int, str], Dict]:
+        """Read (page_id, field) -> term_id -> positions"""
+        if self.segments is not None:
+            return self.segments.positions(term_ids, page_ids)
+
+        positions = defaultdict(dict)
+        for chunk in _chunks(list(page_ids)):
+            for page_id, field, term_id, term_positions in db.session.execute(
+                db.select(Posting.page_id, Posting.field, Posting.term_id, Posting.positions)
+                .where(Posting.term_id.in_(term_ids), Posting.page_id.in_(chunk))
+            ):
+                positions[(page_id, field)][term_id] = {
+                    int(position) for position in term_positions.split()
+                }
+        return positions
+
+    def _score(self, candidates: Dict[int, Dict[int, Dict[str, int]]],
+               doc_freqs: Dict[int, int]) -> Iterable[Tuple[int, float]]:
+        """Yield BM25F scores for candidate pages"""
+        statistics = self._load_field_statistics()
+        doc_count = max((count for _, count, _ in statistics), default=0)
+        avg_lengths = {
+            field: total / count
+            for field, count, total in statistics if count > 0
+        }
+        idfs = {
+            term_id: self.ranker.idf(doc_freq, doc_count)
+            for term_id, doc_freq in doc_freqs.items()
+        }
+
+        field_lengths = self._load_document_lengths(list(candidates))
+
+        for page_id, term_fields in candidates.items():
+            score = 0.0
+            for term_id, fields in term_fields.items():
+                score += self.ranker.term_score(
+                    idfs[term_id], fields, field_lengths.get(page_id, {}), avg_lengths
+                )
+            yield page_id, score
+
+    def _load_field_statistics(self) -> List[Tuple[str, int, int]]:
+        """(field, doc_count, total_length) of the collection"""
+        if self.segments is not None:
+            return self.segments.field_statistics()
+        return db.session.execute(
+            db.select(FieldStatistics.field, FieldStatistics.doc_count, FieldStatistics.total_length)
+        ).all()
+
+    def _load_document_lengths(self, page_ids: List[int]) -> Dict[int, Dict[str, int]]:
+        """page_id -> field -> length"""
+        if self.segments is not None:
+            return self.segments.document_lengths(page_ids)
+
+        field_lengths = defaultdict(dict)
+        for chunk in _chunks(page_ids):
+            for page_id, field, length in db.session.execute(
+                db.select(DocumentLength.page_id, DocumentLength.field, DocumentLength.length)
+                .where(DocumentLength.page_id.in_(chunk))
+            ):
+                field_lengths[page_id][field] = length
+        return field_lengths
+
+    def rebuild(self, batch_size: int = 500) -> int:
+        """
+        Rebuild the index from every active page
+
+        Args:
+            batch_size: Number of pages indexed per commit
+
+        Returns:
+            Number of pages indexed
+        """
+        db.session.execute(db.delete(Posting))
+        db.session.execute(db.delete(IndexTerm))
+        db.session.execute(db.delete(DocumentLength))
+        db.session.execute(db.delete(FieldStatistics))
+        set_counters({INDEX_TERMS: 0, INDEX_POSTINGS: 0})
+        self.record_analyzer()
+        self.bump_generation()
+        db.session.commit()
+        if self.segments is not None:
+            self.discard_segment()
+            self.segments.clear()
+
+        page_ids = db.session.execute(
+            db.select(Page.id).where(Page.is_active == True)
+        ).scalars().all()
+
+        for chunk in _chunks(list(page_ids), batch_size):
+            self.index_documents(
+                Page.query.options(db.selectinload(Page.body)).filter(Page.id.in_(chunk)).all()
+            )
+            db.session.commit()
+            self.flush_segment()
+
+        self.logger.info(f"Rebuilt inverted index for {len(page_ids)} pages")
+        return len(page_ids)
+
+    def is_empty(self) -> bool:
+        """Check whether the term dictionary has any entries"""
+        return db.session.execute(db.select(IndexTerm.id).limit(1)).first() is None
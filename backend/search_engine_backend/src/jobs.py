@@ -0,0 +1,421 @@
+from src.models.job import CrawlJob
+from src.models.page import db
+from src.frontier import CrawlFrontier
+from src.statistics import (
+    increment_counters, CRAWL_PAGES_FETCHED, CRAWL_PAGES_INDEXED, CRAWL_MILLISECONDS
+)
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Callable
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+
+# Statuses after which a job never changes again
+FINISHED_STATUSES = ('completed', 'cancelled', 'failed')
+
+# Seconds without a heartbeat after which a running job is considered
+# abandoned by its process; leases are renewed three times per period
+DEFAULT_LEASE_SECONDS = 120
+
+# Sitemap entries checked against stored pages and enqueued at once
+SITEMAP_BATCH_SIZE = 500
+
+class CrawlJobQueue:
+    def __init__(self, indexer, workers: int = 2, chunk_size: int = 50,
+                 lease_seconds: int = DEFAULT_LEASE_SECONDS):
+        """
+        Initialize crawl job queue
+
+        Jobs and their breadth-first frontier are stored in the database so
+        progress can be read from any request and unfinished jobs resume
+        after a restart. Jobs are executed by a small pool of background
+        threads so a long crawl never holds a request worker.
+
+        A running job is leased to the process running it: the job row
+        holds the owner and a heartbeat that a background thread renews.
+        Several processes can share the database; a process only takes over
+        running jobs whose lease has expired.
+
+        Args:
+            indexer: SearchIndexer used to crawl and index
+            workers: Number of jobs processed at the same time
+            chunk_size: Frontier entries crawled between progress updates
+            lease_seconds: Heartbeat age after which a running job is resumed
+        """
+        self.indexer = indexer
+        self.app = indexer.app
+        self.workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+        self.lease_seconds = max(1, lease_seconds)
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._queue = queue.Queue()
+        self._threads = []
+        self._cancel_events = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def start(self) -> None:
+        """Start the background workers (idempotent)"""
+        with self._lock:
+            if self._threads:
+                return
+
+            self._resume_unfinished_jobs()
+            for number in range(self.workers):
+                thread = threading.Thread(
+                    target=self._worker, name=f'crawl-job-{number}', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._heartbeat, name='crawl-job-lease', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _resume_unfinished_jobs(self) -> None:
+        """
+        Queue the jobs no live process is running
+
+        Queued jobs are claimed atomically, so every process may queue
+        them. Running jobs are only taken back when their lease expired,
+        which means the process running them stopped.
+        """
+        self.reclaim_expired_leases()
+        try:
+            with self.app.app_context():
+                queued = db.session.execute(
+                    db.select(CrawlJob.id).where(CrawlJob.status == 'queued').order_by(CrawlJob.id)
+                ).scalars().all()
+                for job_id in queued:
+                    self._queue.put(job_id)
+        except Exception as e:
+            self.logger.error(f"Error resuming crawl jobs: {str(e)}")
+            db.session.rollback()
+
+    def _heartbeat(self) -> None:
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            self.renew_leases()
+            for job_id in self.reclaim_expired_leases():
+                self._queue.put(job_id)
+
+    def reclaim_expired_leases(self) -> List[int]:
+        """
+        Reset the running jobs whose lease has expired to queued
+
+        Called on startup and from the heartbeat, so the jobs of a process
+        that died are picked up by the remaining processes without a
+        restart. Only the process whose UPDATE reset a job gets its id
+        back, and claims are atomic, so a reclaimed job runs once.
+
+        Returns:
+            Ids of the reclaimed jobs
+        """
+        try:
+            with self.app.app_context():
+                expired = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+                reclaimed = db.session.execute(
+                    db.update(CrawlJob)
+                    .where(CrawlJob.status == 'running',
+                           db.or_(CrawlJob.updated_at == None, CrawlJob.updated_at < expired))
+                    .values(status='queued', owner=None)
+                    .returning(CrawlJob.id)
+                ).scalars().all()
+                db.session.commit()
+        except Exception as e:
+            self.logger.error(f"Error reclaiming crawl jobs: {str(e)}")
+            db.session.rollback()
+            return []
+
+        reclaimed = sorted(reclaimed)
+        if reclaimed:
+            self.logger.info(f"Resuming {len(reclaimed)} crawl jobs with an expired lease")
+        return reclaimed
+
+    def renew_leases(self) -> int:
+        """
+        Refresh the heartbeat of the jobs this process is running
+
+        Returns:
+            Number of leases renewed
+        """
+        try:
+            with self.app.app_context():
+                renewed = db.session.execute(
+                    db.update(CrawlJob)
+                    .where(CrawlJob.owner == self.owner, CrawlJob.status == 'running')
+                    .values(updated_at=datetime.utcnow())
+                ).rowcount
+                db.session.commit()
+                return renewed
+        except Exception as e:
+            self.logger.error(f"Error renewing crawl job leases: {str(e)}")
+            db.session.rollback()
+            return 0
+
+    def submit(self, urls: List[str], max_depth: int = 0,
+               max_pages: Optional[int] = None,
+               sitemaps: Optional[List[str]] = None,
+               discover_sitemaps: bool = False) -> Dict:
+        """
+        Enqueue a crawl job
+
+        Args:
+            urls: Seed URLs to crawl and index
+            max_depth: How many links away from the seeds to follow (0 = seeds only)
+            max_pages: Maximum number of pages the job may crawl (None for no limit)
+            sitemaps: Sitemap URLs whose new or changed pages are crawled too
+            discover_sitemaps: Also read the sitemaps of the seed hosts
+
+        Returns:
+            Dictionary describing the queued job
+        """
+        with self.app.app_context():
+            job = CrawlJob(
+                urls=json.dumps(urls),
+                total_urls=len(urls),
+                max_depth=max_depth,
+                max_pages=max_pages,
+                sitemaps=json.dumps(sitemaps) if sitemaps else None,
+                discover_sitemaps=discover_sitemaps
+            )
+            db.session.add(job)
+            db.session.flush()
+
+            frontier = CrawlFrontier(job.id, max_pages)
+            job.discovered_count = frontier.add([self.indexer.canonical_url(url) for url in urls], 0)
+            db.session.commit()
+            job_dict = job.to_dict()
+
+        self.start()
+        self._queue.put(job_dict['id'])
+        self.logger.info(f"Queued crawl job {job_dict['id']} with {len(urls)} URLs")
+        return job_dict
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        """Get a job by id"""
+        with self.app.app_context():
+            job = db.session.get(CrawlJob, job_id)
+            return job.to_dict() if job else None
+
+    def list_jobs(self, limit: int = 20) -> List[Dict]:
+        """Get the most recent jobs, newest first"""
+        with self.app.app_context():
+            jobs = CrawlJob.query.order_by(CrawlJob.id.desc()).limit(limit).all()
+            return [job.to_dict() for job in jobs]
+
+    def cancel(self, job_id: int) -> Optional[Dict]:
+        """
+        Cancel a job
+
+        Queued jobs are cancelled immediately. Running jobs in this process
+        stop before their next fetch, jobs running in another process stop
+        after the chunk they are currently crawling.
+
+        Args:
+            job_id: Id of the job
+
+        Returns:
+            Dictionary describing the job or None if it does not exist
+        """
+        with self.app.app_context():
+            job = db.session.get(CrawlJob, job_id)
+            if not job:
+                return None
+
+            if job.status == 'queued':
+                job.status = 'cancelled'
+                job.finished_at = datetime.utcnow()
+            elif job.status == 'running':
+                job.cancel_requested = True
+                # Wake up the worker if the job runs in this process
+                event = self._cancel_events.get(job_id)
+                if event:
+                    event.set()
+            db.session.commit()
+            return job.to_dict()
+
+    def _worker(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run(job_id)
+            except Exception as e:
+                self.logger.error(f"Crawl job {job_id} failed: {str(e)}")
+                self._finish(job_id, 'failed', str(e))
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id: int) -> None:
+        with self.app.app_context():
+            # Claim the job atomically so it never runs twice
+            claimed = db.session.execute(
+                db.update(CrawlJob)
+                .where(CrawlJob.id == job_id, CrawlJob.status == 'queued')
+                .values(status='running', owner=self.owner, updated_at=datetime.utcnow())
+            ).rowcount
+            if not claimed:
+                db.session.rollback()
+                return
+
+            job = db.session.get(CrawlJob, job_id)
+            if not job.started_at:
+                job.started_at = datetime.utcnow()
+            db.session.commit()
+            max_depth = job.max_depth
+            frontier = CrawlFrontier(job_id, job.max_pages)
+            frontier.load()
+            sitemaps = []
+            sitemap_hosts = []
+            if not job.sitemaps_done:
+                sitemaps = job.get_sitemaps()
+                if job.discover_sitemaps:
+                    sitemap_hosts = job.get_urls()
+
+        domain_matcher = self.indexer.get_domain_matcher()
+        if not len(domain_matcher):
+            self._finish(job_id, 'failed', 'No allowed domains configured')
+            return
+
+        cancelled = threading.Event()
+        # Set when another process took the job over after our lease expired
+        lost = False
+        self._cancel_events[job_id] = cancelled
+        crawler = self.indexer.create_crawler(domain_matcher)
+        pipeline = self.indexer.create_pipeline(crawler)
+        try:
+            if sitemaps or sitemap_hosts:
+                for url in sitemap_hosts:
+                    sitemaps += [sitemap for sitemap in crawler.find_sitemaps(url) if sitemap not in sitemaps]
+                self._ingest_sitemaps(job_id, frontier, crawler, sitemaps, cancelled.is_set)
+            while not cancelled.is_set():
+                with self.app.app_context():
+                    batch = frontier.next_batch(self.chunk_size)
+                if not batch:
+                    break
+
+                chunk_started = time.monotonic()
+                batch_urls = [url for _, url, _ in batch]
+                crawl_options = {
+                    'should_stop': cancelled.is_set,
+                    'extract_links': max_depth > 0,
+                    'validators': self.indexer.get_validators(batch_urls)
+                }
+                if pipeline:
+                    crawled_data, indexed_count = pipeline.run(batch_urls, **crawl_options)
+                else:
+                    crawled_data = crawler.crawl_urls(batch_urls, **crawl_options)
+                    indexed_count = self.indexer.index_pages(crawled_data)
+                # Keyed by the fetched URL; rel=canonical may store the page under another
+                crawled_by_url = {
+                    page_data.get('requested_url', page_data['url']): page_data
+                    for page_data in crawled_data
+                }
+
+                with self.app.app_context():
+                    done_ids = []
+                    failed_ids = []
+                    discovered = 0
+                    for entry_id, url, depth in batch:
+                        page_data = crawled_by_url.get(url)
+                        if page_data:
+                            done_ids.append(entry_id)
+                            if depth < max_depth:
+                                discovered += frontier.add(page_data.get('links', []), depth + 1)
+                        elif not cancelled.is_set():
+                            # Entries skipped because of a cancel stay pending
+                            failed_ids.append(entry_id)
+                    frontier.mark(done_ids, 'done')
+                    frontier.mark(failed_ids, 'failed')
+
+                    job = db.session.get(CrawlJob, job_id)
+                    if job.owner != self.owner:
+                        db.session.rollback()
+                        self.logger.warning(f"Crawl job {job_id} lost its lease to {job.owner}")
+                        lost = True
+                        break
+                    job.fetched_count += len(crawled_data)
+                    job.indexed_count += indexed_count
+                    job.unchanged_count += sum(
+                        1 for page_data in crawled_data if page_data.get('not_modified')
+                    )
+                    job.failed_count += len(failed_ids) + len(crawled_data) - indexed_count
+                    job.discovered_count += discovered
+                    increment_counters({
+                        CRAWL_PAGES_FETCHED: len(crawled_data),
+                        CRAWL_PAGES_INDEXED: indexed_count,
+                        CRAWL_MILLISECONDS: int((time.monotonic() - chunk_started) * 1000)
+                    })
+                    db.session.commit()
+                    if job.cancel_requested:
+                        cancelled.set()
+        finally:
+            self._cancel_events.pop(job_id, None)
+            if pipeline:
+                pipeline.close()
+            crawler.close()
+
+        if not lost:
+            self._finish(job_id, 'cancelled' if cancelled.is_set() else 'completed')
+
+    def _ingest_sitemaps(self, job_id: int, frontier: CrawlFrontier, crawler,
+                         sitemaps: List[str], should_stop: Callable[[], bool]) -> None:
+        """
+        Add the pages listed in sitemaps to the frontier of a job
+
+        Entries are streamed from the sitemaps and enqueued in batches, so
+        crawling starts with a bounded amount of memory whatever the size
+        of the sitemaps. Pages whose stored copy is newer than their
+        <lastmod> are skipped.
+
+        Args:
+            job_id: Id of the job
+            frontier: Frontier of the job
+            crawler: Crawler used to download the sitemaps
+            sitemaps: Sitemap URLs
+            should_stop: Callable checked between entries
+        """
+        entries = (entry for sitemap in sitemaps for entry in crawler.iter_sitemap(sitemap))
+        batch = []
+
+        def enqueue():
+            changed = self.indexer.filter_changed(batch)
+            with self.app.app_context():
+                added = frontier.add(changed, 0)
+                job = db.session.get(CrawlJob, job_id)
+                job.discovered_count += added
+                job.sitemap_unchanged_count += len(batch) - len(changed)
+                db.session.commit()
+            batch.clear()
+
+        for entry in entries:
+            if should_stop() or frontier.is_full():
+                break
+            batch.append(entry)
+            if len(batch) >= SITEMAP_BATCH_SIZE:
+                enqueue()
+        if batch:
+            enqueue()
+
+        with self.app.app_context():
+            job = db.session.get(CrawlJob, job_id)
+            job.sitemaps_done = not should_stop()
+            db.session.commit()
+        self.logger.info(f"Crawl job {job_id} read {len(sitemaps)} sitemaps")
+
+    def _finish(self, job_id: int, status: str, error: Optional[str] = None) -> None:
+        with self.app.app_context():
+            job = db.session.get(CrawlJob, job_id)
+            if not job or job.status in FINISHED_STATUSES or job.owner not in (None, self.owner):
+                return
+            job.status = status
+            job.error = error
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            self.logger.info(
+                f"Crawl job {job_id} {status}: {job.indexed_count}/{job.total_urls} pages indexed"
+            )
@@ -0,0 +1,217 @@
+from typing import List, Dict, Tuple
+import bisect
+import contextvars
+import threading
+import time
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+# Histogram holding the duration of every instrumented stage
+STAGE_METRIC = 'sse_stage_duration_seconds'
+
+# Profile of the current request, set by Profile while it is active
+_active_profile = contextvars.ContextVar('sse_profile', default=None)
+
+class Counter:
+    def __init__(self):
+        """Monotonic counter"""
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        return [f'{name}{labels} {self.value}']
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Fixed-bucket histogram
+
+        An observation is one binary search and three additions under a
+        lock; nothing is allocated, so it is cheap enough for per-page and
+        per-query stages.
+
+        Args:
+            buckets: Sorted bucket upper bounds
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+
+        # Bucket label goes last, after the metric's own labels
+        prefix = labels[:-1] + ',' if labels else '{'
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (None,), counts):
+            cumulative += bucket_count
+            le = '+Inf' if bound is None else repr(bound)
+            lines.append(f'{name}_bucket{prefix}le="{le}"}} {cumulative}')
+        lines.append(f'{name}_sum{labels} {total!r}')
+        lines.append(f'{name}_count{labels} {count}')
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        In-process collection of counters and histograms
+
+        Metrics are created on first use and identified by name plus
+        labels. render() writes them in the Prometheus text exposition
+        format. Values are per process and start at zero on restart.
+        """
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str, kind: str, help_text: str, labels: Dict[str, str], factory):
+        key = tuple(sorted(labels.items()))
+        family = self._families.get(name)
+        if family is None or key not in family['metrics']:
+            with self._lock:
+                family = self._families.setdefault(
+                    name, {'kind': kind, 'help': help_text, 'metrics': {}}
+                )
+                if family['kind'] != kind:
+                    raise ValueError(f'Metric {name} is a {family["kind"]}, not a {kind}')
+                family['metrics'].setdefault(key, factory())
+        return family['metrics'][key]
+
+    def counter(self, name: str, help_text: str, **labels: str) -> Counter:
+        """Get or create a counter"""
+        return self._get(name, 'counter', help_text, labels, Counter)
+
+    def histogram(self, name: str, help_text: str, **labels: str) -> Histogram:
+        """Get or create a histogram with the default buckets"""
+        return self._get(name, 'histogram', help_text, labels, Histogram)
+
+    def render(self) -> str:
+        """
+        Format all metrics for a Prometheus scrape
+
+        Returns:
+            Text exposition format (version 0.0.4)
+        """
+        with self._lock:
+            families = [
+                (name, family['kind'], family['help'], list(family['metrics'].items()))
+                for name, family in sorted(self._families.items())
+            ]
+
+        lines = []
+        for name, kind, help_text, metrics in families:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for key, metric in sorted(metrics, key=lambda item: item[0]):
+                labels = ','.join(f'{label}="{_escape(value)}"' for label, value in key)
+                lines.extend(metric.samples(name, f'{{{labels}}}' if labels else ''))
+        return '\n'.join(lines) + '\n'
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Registry shared by the whole process
+REGISTRY = MetricsRegistry()
+
+class Profile:
+    def __init__(self):
+        """
+        Stage breakdown of a single request
+
+        While a profile is active (used as a context manager) every stage
+        timed in the same thread or context is also added to it.
+        """
+        self.stages = {}
+        self._token = None
+
+    def __enter__(self) -> 'Profile':
+        self._token = _active_profile.set(self)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        _active_profile.reset(self._token)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def to_dict(self) -> Dict[str, float]:
+        """Stage durations in milliseconds"""
+        return {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+
+    def server_timing(self) -> str:
+        """Value for a Server-Timing response header"""
+        return ', '.join(
+            f'{name};dur={milliseconds}' for name, milliseconds in self.to_dict().items()
+        )
+
+class StageTimer:
+    __slots__ = ('histogram', 'name', 'start')
+
+    def __init__(self, histogram: Histogram, name: str):
+        self.histogram = histogram
+        self.name = name
+
+    def __enter__(self) -> 'StageTimer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        elapsed = time.perf_counter() - self.start
+        self.histogram.observe(elapsed)
+        profile = _active_profile.get()
+        if profile is not None:
+            profile.add(self.name, elapsed)
+
+_stage_histograms = {}
+
+def _stage_histogram(name: str) -> Histogram:
+    histogram = _stage_histograms.get(name)
+    if histogram is None:
+        histogram = REGISTRY.histogram(
+            STAGE_METRIC, 'Time spent in crawl, index and search stages', stage=name
+        )
+        _stage_histograms[name] = histogram
+    return histogram
+
+def stage(name: str) -> StageTimer:
+    """
+    Time a block of code as a named stage
+
+    Usage:
+        with stage('query_parse'):
+            tree = parse_query(query)
+
+    Args:
+        name: Stage label (fetch, parse, index_write, query_parse,
+            postings_scan, ranking, snippets, serialization)
+    """
+    return StageTimer(_stage_histogram(name), name)
+
+def observe_stage(name: str, seconds: float) -> None:
+    """Record a stage duration measured elsewhere (e.g. in a worker process)"""
+    _stage_histogram(name).observe(seconds)
+    profile = _active_profile.get()
+    if profile is not None:
+        profile.add(name, seconds)
+
+def counter(name: str, help_text: str, **labels: str) -> Counter:
+    """Get or create a counter in the shared registry"""
+    return REGISTRY.counter(name, help_text, **labels)
@@ -0,0 +1,77 @@
+from src.models.page import db
+
+class IndexTerm(db.Model):
+    __tablename__ = 'index_terms'
+
+    id = db.Column(db.Integer, primary_key=True)
+    term = db.Column(db.String(100), unique=True, nullable=False)
+    doc_freq = db.Column(db.Integer, default=0, nullable=False)
+    # Word shown for the (stemmed) term in suggestions, e.g. "engine" for "engin"
+    surface = db.Column(db.String(100), nullable=True)
+
+    def __repr__(self):
+        return f'<IndexTerm {self.term}>'
+
+class Posting(db.Model):
+    __tablename__ = 'postings'
+
+    term_id = db.Column(db.Integer, db.ForeignKey('index_terms.id'), primary_key=True)
+    page_id = db.Column(db.Integer, db.ForeignKey('pages.id'), primary_key=True)
+    field = db.Column(db.String(20), primary_key=True)
+    term_freq = db.Column(db.Integer, nullable=False)
+    # Space separated token offsets inside the field
+    positions = db.Column(db.Text, nullable=False)
+    # Space separated character offsets (snippet field only)
+    offsets = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_postings_page_id', 'page_id'),
+    )
+
+    def __repr__(self):
+        return f'<Posting {self.term_id}:{self.page_id}:{self.field}>'
+
+class DocumentLength(db.Model):
+    __tablename__ = 'document_lengths'
+
+    page_id = db.Column(db.Integer, db.ForeignKey('pages.id'), primary_key=True)
+    field = db.Column(db.String(20), primary_key=True)
+    length = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<DocumentLength {self.page_id}:{self.field}={self.length}>'
+
+class FieldStatistics(db.Model):
+    __tablename__ = 'field_statistics'
+
+    field = db.Column(db.String(20), primary_key=True)
+    doc_count = db.Column(db.Integer, default=0, nullable=False)
+    total_length = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<FieldStatistics {self.field}>'
+
+class IndexMetadata(db.Model):
+    __tablename__ = 'index_metadata'
+
+    key = db.Column(db.String(50), primary_key=True)
+    # 64-bit: the analyzer checksum is an unsigned 32-bit CRC
+    value = db.Column(db.BigInteger, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<IndexMetadata {self.key}={self.value}>'
+
+class PageFingerprint(db.Model):
+    __tablename__ = 'page_fingerprints'
+
+    page_id = db.Column(db.Integer, db.ForeignKey('pages.id'), primary_key=True)
+    # 64-bit SimHash of the body, stored as a signed integer
+    simhash = db.Column(db.BigInteger, nullable=False)
+    # 16-bit slices of the SimHash; near-duplicates share at least one
+    band_0 = db.Column(db.Integer, nullable=False, index=True)
+    band_1 = db.Column(db.Integer, nullable=False, index=True)
+    band_2 = db.Column(db.Integer, nullable=False, index=True)
+    band_3 = db.Column(db.Integer, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<PageFingerprint {self.page_id}>'
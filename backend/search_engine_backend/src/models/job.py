@@ -0,0 +1,98 @@
+from src.models.page import db
+from datetime import datetime
+import json
+
+class CrawlJob(db.Model):
+    __tablename__ = 'crawl_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # queued, running, completed, cancelled, failed, interrupted
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    urls = db.Column(db.Text, nullable=False)
+    total_urls = db.Column(db.Integer, nullable=False, default=0)
+    max_depth = db.Column(db.Integer, nullable=False, default=0)
+    max_pages = db.Column(db.Integer, nullable=True)
+    # JSON list of sitemap URLs whose pages are added to the frontier
+    sitemaps = db.Column(db.Text, nullable=True)
+    # Also read the sitemaps of the seed hosts (robots.txt or /sitemap.xml)
+    discover_sitemaps = db.Column(db.Boolean, nullable=False, default=False)
+    sitemaps_done = db.Column(db.Boolean, nullable=False, default=False)
+    # Sitemap entries skipped because the stored copy is newer than lastmod
+    sitemap_unchanged_count = db.Column(db.Integer, nullable=False, default=0)
+    discovered_count = db.Column(db.Integer, nullable=False, default=0)
+    fetched_count = db.Column(db.Integer, nullable=False, default=0)
+    indexed_count = db.Column(db.Integer, nullable=False, default=0)
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    unchanged_count = db.Column(db.Integer, nullable=False, default=0)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    error = db.Column(db.Text, nullable=True)
+    # Lease of a running job: the process running it and its last heartbeat.
+    # Jobs whose heartbeat is older than the lease are resumed elsewhere
+    owner = db.Column(db.String(100), nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<CrawlJob {self.id} {self.status}>'
+
+    def get_urls(self):
+        return json.loads(self.urls)
+
+    def get_sitemaps(self):
+        return json.loads(self.sitemaps) if self.sitemaps else []
+
+    def to_dict(self):
+        elapsed = None
+        pages_per_second = None
+        if self.started_at:
+            end = self.finished_at or datetime.utcnow()
+            elapsed = (end - self.started_at).total_seconds()
+            if elapsed > 0:
+                pages_per_second = round(self.fetched_count / elapsed, 2)
+
+        return {
+            'id': self.id,
+            'status': self.status,
+            'total_urls': self.total_urls,
+            'max_depth': self.max_depth,
+            'max_pages': self.max_pages,
+            'discovered_count': self.discovered_count,
+            'fetched_count': self.fetched_count,
+            'indexed_count': self.indexed_count,
+            'failed_count': self.failed_count,
+            'unchanged_count': self.unchanged_count,
+            'sitemaps': self.get_sitemaps(),
+            'discover_sitemaps': self.discover_sitemaps,
+            'sitemap_unchanged_count': self.sitemap_unchanged_count,
+            'cancel_requested': self.cancel_requested,
+            'error': self.error,
+            'owner': self.owner,
+            'elapsed_seconds': round(elapsed, 2) if elapsed is not None else None,
+            'pages_per_second': pages_per_second,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class FrontierEntry(db.Model):
+    __tablename__ = 'crawl_frontier'
+
+    # Entries are appended in breadth-first order, so id order is crawl order
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('crawl_jobs.id'), nullable=False)
+    url = db.Column(db.String(500), nullable=False)
+    url_hash = db.Column(db.String(16), nullable=False)
+    depth = db.Column(db.Integer, nullable=False, default=0)
+    # pending, done, failed
+    status = db.Column(db.String(10), nullable=False, default='pending')
+
+    __table_args__ = (
+        db.UniqueConstraint('job_id', 'url_hash', name='uq_crawl_frontier_job_url'),
+        db.Index('ix_crawl_frontier_job_status', 'job_id', 'status', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<FrontierEntry {self.job_id}:{self.url}>'
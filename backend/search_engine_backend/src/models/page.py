@@ -3,29 +3,72 @@ from datetime import datetime
 
 db = SQLAlchemy()
 
+# Characters of the body kept on the page row for result lists
+SUMMARY_LENGTH = 300
+
 class Page(db.Model):
     __tablename__ = 'pages'
     
     id = db.Column(db.Integer, primary_key=True)
     url = db.Column(db.String(500), unique=True, nullable=False)
+    # URL the page was fetched from when it differs from its canonical url;
+    # the validators of the next crawl are looked up by it
+    requested_url = db.Column(db.String(500), nullable=True)
     title = db.Column(db.String(200), nullable=True)
-    content = db.Column(db.Text, nullable=True)
+    # Start of the body and its full length; the body itself is in page_contents
+    summary = db.Column(db.Text, nullable=True)
+    content_length = db.Column(db.Integer, default=0)
     description = db.Column(db.Text, nullable=True)
     keywords = db.Column(db.String(500), nullable=True)
     domain = db.Column(db.String(100), nullable=False)
     crawled_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    # HTTP validators and body digest used for conditional re-crawls
+    etag = db.Column(db.String(200), nullable=True)
+    last_modified = db.Column(db.String(100), nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True)
+    # Loaded only when the full body is accessed
+    body = db.relationship('PageContent', uselist=False, lazy='select',
+                           cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        # Keyset pagination of /api/pages walks (domain, id) of active pages
+        db.Index('ix_pages_active_domain_id', 'is_active', 'domain', 'id'),
+        db.Index('ix_pages_requested_url', 'requested_url'),
+    )
     
     def __repr__(self):
         return f'<Page {self.url}>'
     
+    @property
+    def content(self):
+        """Full page body (loads the page_contents row)"""
+        return self.body.content if self.body else ''
+    
+    @content.setter
+    def content(self, value):
+        value = value or ''
+        if self.body is None:
+            self.body = PageContent(content=value)
+        else:
+            self.body.content = value
+        self.summary = value[:SUMMARY_LENGTH]
+        self.content_length = len(value)
+    
+    def content_preview(self, length: int = SUMMARY_LENGTH) -> str:
+        """Start of the body, with '...' appended when it was cut"""
+        summary = (self.summary or '')[:length]
+        if (self.content_length or 0) > length:
+            return summary + '...'
+        return summary
+    
     def to_dict(self):
         return {
             'id': self.id,
             'url': self.url,
             'title': self.title,
-            'content': self.content,
+            'content': self.content_preview(),
             'description': self.description,
             'keywords': self.keywords,
             'domain': self.domain,
@@ -34,6 +77,25 @@ class Page(db.Model):
             'is_active': self.is_active
         }
 
+class PageContent(db.Model):
+    __tablename__ = 'page_contents'
+    
+    page_id = db.Column(db.Integer, db.ForeignKey('pages.id'), primary_key=True)
+    content = db.Column(db.Text, nullable=True)
+    
+    def __repr__(self):
+        return f'<PageContent {self.page_id}>'
+
+class DomainStatistics(db.Model):
+    __tablename__ = 'domain_statistics'
+    
+    domain = db.Column(db.String(100), primary_key=True)
+    # Active pages of the domain, maintained by the indexer
+    page_count = db.Column(db.Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f'<DomainStatistics {self.domain}={self.page_count}>'
+
 class AllowedDomain(db.Model):
     __tablename__ = 'allowed_domains'
     
@@ -53,3 +115,56 @@ class AllowedDomain(db.Model):
             'added_at': self.added_at.isoformat() if self.added_at else None
         }
 
+
+def upgrade_schema():
+    """
+    Add columns and indexes that were introduced after a table was first created
+    
+    db.create_all() only creates missing tables, so databases created by an
+    older version would otherwise fail on the new columns. Must be called
+    inside an app context after db.create_all().
+    """
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            statement = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+            if column.default is not None and column.default.is_scalar:
+                # Rendered by the dialect (booleans are 1/0 in SQLite, true/false in PostgreSQL)
+                value = db.literal(column.default.arg, column.type).compile(
+                    dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}
+                )
+                statement += f' DEFAULT {value}'
+            db.session.execute(db.text(statement))
+        
+        for index in table.indexes:
+            index.create(db.session.connection(), checkfirst=True)
+    
+    _move_page_contents(inspector)
+    db.session.commit()
+
+
+def _move_page_contents(inspector):
+    """Move bodies stored on page rows by older versions to page_contents"""
+    if not inspector.has_table('pages'):
+        return
+    if 'content' not in {column['name'] for column in inspector.get_columns('pages')}:
+        return
+    
+    db.session.execute(db.text(
+        'INSERT INTO page_contents (page_id, content) '
+        'SELECT id, content FROM pages WHERE content IS NOT NULL '
+        'AND id NOT IN (SELECT page_id FROM page_contents)'
+    ))
+    db.session.execute(db.text(
+        'UPDATE pages SET summary = substr(content, 1, :length), '
+        'content_length = length(content), content = NULL '
+        'WHERE content IS NOT NULL'
+    ), {'length': SUMMARY_LENGTH})
@@ -0,0 +1,10 @@
+from src.models.page import db
+
+class StatCounter(db.Model):
+    __tablename__ = 'stat_counters'
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<StatCounter {self.name}={self.value}>'
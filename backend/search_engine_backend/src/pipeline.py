@@ -0,0 +1,215 @@
+from src.crawler import WebCrawler
+from src.inverted_index import build_postings
+from src.analysis import Analyzer
+from src.metrics import observe_stage
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Callable, Tuple
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+
+# Marks the end of a stage's output
+_DONE = object()
+
+# Start methods of the parse workers, in order of preference. Forking the
+# app process would copy the locks held by its fetch threads and database
+# pool into the workers; these start clean interpreters instead.
+START_METHODS = ('forkserver', 'spawn')
+
+# Seconds the dispatcher waits for a free slot before checking for a stop
+STOP_POLL_SECONDS = 0.1
+
+# Per-process crawler and analyzer used by parse workers (created by _init_worker)
+_worker_crawler = None
+_worker_analyzer = None
+
+def _init_worker(allowed_domains: List[str], use_lxml: Optional[bool], analyzer: Analyzer,
+                 query_params: Optional[frozenset] = None) -> None:
+    global _worker_crawler, _worker_analyzer
+    _worker_crawler = WebCrawler(allowed_domains, use_lxml=use_lxml, query_params=query_params)
+    _worker_analyzer = analyzer
+
+def _parse_in_worker(fetched: Dict, extract_links: bool) -> Optional[Dict]:
+    """Extract and analyze one downloaded page inside a parse worker"""
+    start = time.perf_counter()
+    page_data = _worker_crawler.parse_page(fetched, extract_links)
+    if page_data:
+        # Metrics of the worker process are not scraped; the writer records it
+        page_data['parse_seconds'] = time.perf_counter() - start
+        page_data['postings'] = dict(build_postings(page_data, _worker_analyzer))
+    return page_data
+
+class CrawlPipeline:
+    def __init__(self, crawler: WebCrawler, indexer, processes: int = 2,
+                 queue_size: int = 64, batch_size: Optional[int] = None):
+        """
+        Initialize fetch -> parse -> index pipeline
+
+        Fetching runs on the crawler's threads, HTML extraction and
+        text analysis run in a process pool so they are not serialized by
+        the GIL, and the calling thread is the single writer that feeds
+        SearchIndexer in batches. Stages are connected by bounded queues:
+        fetchers block when parse workers fall behind and parse submission
+        blocks when the writer falls behind, so memory stays flat no matter
+        how many URLs are crawled.
+
+        Args:
+            crawler: Crawler used for fetching
+            indexer: SearchIndexer receiving the parsed pages
+            processes: Number of parse worker processes
+            queue_size: Maximum downloaded pages waiting for a parse worker
+            batch_size: Pages per index transaction (defaults to INDEX_BATCH_SIZE)
+        """
+        self.crawler = crawler
+        self.indexer = indexer
+        self.processes = max(1, processes)
+        self.queue_size = max(1, queue_size)
+        self.batch_size = batch_size or indexer.app.config.get('INDEX_BATCH_SIZE', 500)
+        self.logger = logging.getLogger(__name__)
+        self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            available = multiprocessing.get_all_start_methods()
+            method = next(method for method in START_METHODS if method in available)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context(method),
+                initializer=_init_worker,
+                initargs=(
+                    self.crawler.allowed_domains,
+                    self.crawler.extractor.use_lxml,
+                    self.indexer.inverted_index.analyzer,
+                    self.crawler.query_params
+                )
+            )
+        return self._executor
+
+    def close(self) -> None:
+        """Shut down the parse workers"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def run(self, urls: List[str], should_stop: Optional[Callable[[], bool]] = None,
+            extract_links: bool = False,
+            validators: Optional[Dict[str, Dict]] = None) -> Tuple[List[Dict], int]:
+        """
+        Crawl, parse and index URLs
+
+        Args:
+            urls: List of URLs to crawl
+            should_stop: Optional callable checked before every fetch
+            extract_links: Keep the links of every page in the summaries
+            validators: Optional mapping of URL to the validators of its stored copy
+
+        Returns:
+            (pages, indexed_count) where pages holds one summary per crawled
+            URL (url, requested_url, domain, not_modified and links; no content)
+
+        If the writer fails, fetching stops and the queues are drained so
+        the fetch and dispatch threads finish before the error is raised.
+        """
+        validators = validators or {}
+        executor = self._get_executor()
+        fetched_queue = queue.Queue(maxsize=self.queue_size)
+        parsed_queue = queue.Queue()
+        # Bounds pages that are being parsed or waiting for the writer
+        in_flight = threading.Semaphore(self.queue_size)
+        # Set when the writer failed; the other stages drop their work
+        stopped = threading.Event()
+
+        def stop_requested():
+            return stopped.is_set() or bool(should_stop and should_stop())
+
+        def fetch(index, url):
+            fetched = self.crawler.fetch_page(url, validators.get(url))
+            if fetched:
+                fetched_queue.put(fetched)
+
+        def fetch_all():
+            try:
+                self.crawler.for_each_by_host(urls, fetch, stop_requested)
+            except Exception as e:
+                self.logger.error(f"Fetch stage failed: {str(e)}")
+            finally:
+                fetched_queue.put(_DONE)
+
+        def dispatch():
+            # Futures are handed to the writer in submission order; it waits
+            # on each result, which keeps the end marker behind every page
+            while True:
+                fetched = fetched_queue.get()
+                if fetched is _DONE:
+                    break
+                while not stopped.is_set() and not in_flight.acquire(timeout=STOP_POLL_SECONDS):
+                    pass
+                if stopped.is_set():
+                    continue
+                if fetched.get('not_modified'):
+                    parsed_queue.put(fetched)
+                else:
+                    parsed_queue.put(executor.submit(_parse_in_worker, fetched, extract_links))
+            parsed_queue.put(_DONE)
+
+        fetcher = threading.Thread(target=fetch_all, name='pipeline-fetch', daemon=True)
+        dispatcher = threading.Thread(target=dispatch, name='pipeline-dispatch', daemon=True)
+        fetcher.start()
+        dispatcher.start()
+
+        pages = []
+        batch = []
+        indexed_count = 0
+        finished = False
+        try:
+            while True:
+                item = parsed_queue.get()
+                if item is _DONE:
+                    finished = True
+                    break
+
+                if isinstance(item, dict):
+                    page_data = item
+                else:
+                    try:
+                        page_data = item.result()
+                    except Exception as e:
+                        self.logger.error(f"Parse worker failed: {str(e)}")
+                        page_data = None
+                in_flight.release()
+                if not page_data:
+                    continue
+                if 'parse_seconds' in page_data:
+                    observe_stage('parse', page_data.pop('parse_seconds'))
+
+                batch.append(page_data)
+                pages.append({
+                    'url': page_data['url'],
+                    'requested_url': page_data.get('requested_url', page_data['url']),
+                    'domain': page_data['domain'],
+                    'not_modified': page_data.get('not_modified', False),
+                    'links': page_data.get('links', [])
+                })
+                if len(batch) >= self.batch_size:
+                    indexed_count += self.indexer.index_pages(batch, self.batch_size)
+                    batch = []
+
+            if batch:
+                indexed_count += self.indexer.index_pages(batch, self.batch_size)
+        except BaseException:
+            stopped.set()
+            # Take everything the dispatcher still hands over, up to its end
+            # marker, so neither thread stays blocked on a queue
+            while not finished:
+                item = parsed_queue.get()
+                if item is _DONE:
+                    break
+                if not isinstance(item, dict):
+                    item.cancel()
+            raise
+        finally:
+            fetcher.join()
+            dispatcher.join()
+        return pages, indexed_count
@@ -0,0 +1,260 @@
+from src.storage import StorageBackend
+from src.inverted_index import InvertedIndex, INDEXED_FIELDS, LOOKUP_CHUNK_SIZE
+from src.models.index import DocumentLength
+from src.models.page import db
+from src.segments import SegmentIndex
+from src.ranking import BM25Ranker
+from src.analysis import Analyzer
+from src.query import Term, Prefix, Phrase, And, Or, Not
+from src.metrics import stage
+from sqlalchemy import MetaData, Table, Column, Integer, Index, bindparam
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import URL
+from typing import List, Dict, Optional, Set, Tuple
+from collections import defaultdict
+
+# tsvector weight label of each field; ts_rank_cd weighs the labels with
+# the SEARCH_FIELD_WEIGHTS of the ranker
+FIELD_LABELS = {'title': 'A', 'description': 'B', 'keywords': 'C', 'content': 'D'}
+
+# Empty positions between fields so a phrase never spans two fields
+FIELD_GAP = 100
+
+# Largest position a tsvector stores; PostgreSQL clamps later positions to
+# it, so phrases deep inside very long bodies match less precisely
+MAX_POSITION = 16383
+
+# ts_rank_cd normalization flag: divide the rank by 1 + log(document length)
+RANK_NORMALIZATION = 1
+
+# Tables of this module only exist in PostgreSQL, so they are kept out of
+# db.metadata (db.create_all() also runs against SQLite)
+search_metadata = MetaData()
+
+page_search = Table(
+    'page_search', search_metadata,
+    Column('page_id', Integer, primary_key=True, autoincrement=False),
+    Column('document', postgresql.TSVECTOR, nullable=False),
+    Index('ix_page_search_document', 'document', postgresql_using='gin')
+)
+
+INSERT_DOCUMENTS = page_search.insert().values(
+    page_id=bindparam('id'), document=db.cast(bindparam('vector'), postgresql.TSVECTOR)
+)
+
+def _quote(term: str) -> str:
+    """Quote a lexeme for tsvector and tsquery input"""
+    return "'" + term.replace('\\', '\\\\').replace("'", "''") + "'"
+
+def build_vector(postings: Dict[Tuple[str, str], Tuple[List[int], List[int]]]) -> str:
+    """
+    tsvector input of a page's postings
+
+    Fields are laid out one after the other (in INDEXED_FIELDS order, so
+    the long body comes last) with FIELD_GAP positions between them, and
+    every position carries the weight label of its field.
+
+    Args:
+        postings: Result of InvertedIndex.build_postings()
+
+    Returns:
+        Text accepted by a ::tsvector cast ('' for a page without terms)
+    """
+    field_lengths = defaultdict(int)
+    for (_, field), (positions, _) in postings.items():
+        if positions:
+            field_lengths[field] = max(field_lengths[field], positions[-1] + 1)
+
+    starts = {}
+    start = 1
+    for field in INDEXED_FIELDS:
+        starts[field] = start
+        start += field_lengths[field] + FIELD_GAP
+
+    lexemes = defaultdict(list)
+    for (term, field), (positions, _) in postings.items():
+        label = FIELD_LABELS[field]
+        for position in positions:
+            lexemes[term].append(f'{min(starts[field] + position, MAX_POSITION)}{label}')
+    return ' '.join(f"{_quote(term)}:{','.join(positions)}" for term, positions in lexemes.items())
+
+def build_tsquery(node, scoped: bool = False) -> Optional[str]:
+    """
+    tsquery input for a parsed query
+
+    Follows InvertedIndex: exclusions only remove pages from the matches
+    of the other operands of a conjunction, so a query made only of
+    exclusions matches nothing.
+
+    Args:
+        node: Query tree node
+        scoped: Whether the node is evaluated against candidate pages
+
+    Returns:
+        Query text, None when the node can match nothing
+    """
+    if isinstance(node, Term):
+        return _quote(node.term)
+
+    if isinstance(node, Prefix):
+        return _quote(node.prefix) + ':*'
+
+    if isinstance(node, Phrase):
+        parts = []
+        previous = None
+        for position, slot in zip(node.positions, node.terms):
+            operand = ' | '.join(_quote(term) for term in slot)
+            if len(slot) > 1:
+                operand = f'({operand})'
+            if previous is not None:
+                parts.append(f'<{position - previous}>')
+            parts.append(operand)
+            previous = position
+        return f"({' '.join(parts)})"
+
+    if isinstance(node, Or):
+        parts = [part for part in (build_tsquery(child, scoped) for child in node.children) if part]
+        return f"({' | '.join(parts)})" if parts else None
+
+    if isinstance(node, Not):
+        if not scoped:
+            return None
+        child = build_tsquery(node.child, True)
+        return f'!{child}' if child else None
+
+    if isinstance(node, And):
+        positives = [child for child in node.children if not isinstance(child, Not)]
+        if not positives and not scoped:
+            return None
+        parts = []
+        for child in positives:
+            part = build_tsquery(child, True)
+            if part is None:
+                return None
+            parts.append(part)
+        for child in node.children:
+            if isinstance(child, Not):
+                part = build_tsquery(child, True)
+                if part:
+                    parts.append(part)
+        return f"({' & '.join(parts)})" if parts else None
+
+    return None
+
+class PostgresFullTextIndex(InvertedIndex):
+    def __init__(self, ranker: Optional[BM25Ranker] = None, analyzer: Optional[Analyzer] = None):
+        """
+        Inverted index answering queries with PostgreSQL full-text search
+
+        Every indexed page also gets a row in `page_search` holding its
+        analyzed terms as a tsvector, with field weights and positions,
+        under a GIN index. Queries become a tsquery (phrases use the <N>
+        distance operator, prefixes ':*') and are matched and ranked with
+        ts_rank_cd inside the database. Vectors and queries are cast from
+        text rather than built with to_tsvector(), so the terms of our own
+        analyzer are stored and matched unchanged. As with index segments, the index
+        tables stay the index of record for snippets, suggestions and
+        statistics.
+
+        Args:
+            ranker: Source of the field weights (defaults if omitted)
+            analyzer: Analyzer for pages and queries (DEFAULT_ANALYZER if omitted)
+        """
+        super().__init__(ranker, analyzer)
+        # ts_rank_cd takes the weights of labels D, C, B, A, each at most 1
+        weights = self.ranker.field_weights
+        largest = max(weights.get(field, 0.0) for field in FIELD_LABELS) or 1.0
+        by_label = {label: weights.get(field, 0.0) / largest for field, label in FIELD_LABELS.items()}
+        self.rank_weights = [by_label.get(label, 0.0) for label in 'DCBA']
+
+    def create_schema(self) -> None:
+        """Create the page_search table and its GIN index"""
+        page_search.create(db.engine, checkfirst=True)
+
+    def query_store_outdated(self) -> bool:
+        """Check whether pages are indexed but have no search vector"""
+        has_vectors = db.session.execute(db.select(page_search.c.page_id).limit(1)).first()
+        if has_vectors is not None:
+            return False
+        return db.session.execute(db.select(DocumentLength.page_id).limit(1)).first() is not None
+
+    def _write_documents(self, documents: List[Tuple[int, Dict]]) -> None:
+        rows = [
+            {'id': page_id, 'vector': build_vector(postings)} for page_id, postings in documents
+        ]
+        if rows:
+            db.session.execute(INSERT_DOCUMENTS, rows)
+
+    def remove_documents(self, page_ids: List[int]) -> None:
+        super().remove_documents(page_ids)
+        page_ids = list(page_ids)
+        for start in range(0, len(page_ids), LOOKUP_CHUNK_SIZE):
+            db.session.execute(page_search.delete().where(
+                page_search.c.page_id.in_(page_ids[start:start + LOOKUP_CHUNK_SIZE])
+            ))
+
+    def rebuild(self, batch_size: int = 500) -> int:
+        db.session.execute(page_search.delete())
+        return super().rebuild(batch_size)
+
+    def execute(self, tree, limit: int = 10) -> Tuple[List[Tuple[int, float]], Set[str]]:
+        """
+        Evaluate a parsed query with the GIN index
+
+        Returns:
+            ((page_id, score) pairs best first, query terms known to the
+            index, including prefix expansions, for highlighting)
+        """
+        if tree is None:
+            return [], set()
+        text = build_tsquery(tree)
+        if text is None:
+            return [], set()
+
+        with stage('postings_scan'):
+            query = db.cast(text, postgresql.TSQUERY)
+            score = db.func.ts_rank_cd(
+                db.cast(self.rank_weights, postgresql.ARRAY(postgresql.REAL)),
+                page_search.c.document, query, RANK_NORMALIZATION
+            ).label('score')
+            ranked = [
+                (page_id, float(rank)) for page_id, rank in db.session.execute(
+                    db.select(page_search.c.page_id, score)
+                    .where(page_search.c.document.bool_op('@@')(query))
+                    .order_by(score.desc(), page_search.c.page_id)
+                    .limit(limit)
+                )
+            ]
+        if not ranked:
+            return [], set()
+
+        terms, _ = self._resolve_terms(tree)
+        return ranked, set(terms)
+
+class PostgresBackend(StorageBackend):
+    """
+    PostgreSQL database shared by any number of app processes
+
+    Pages and index tables use the same models as SQLite; queries are
+    answered by PostgresFullTextIndex. Index segments are local files and
+    are not used with this backend.
+    """
+
+    name = 'postgresql'
+
+    def engine_options(self, url: URL, options: Dict) -> Dict:
+        options = super().engine_options(url, options)
+        # The server or a proxy may close idle connections
+        options.setdefault('pool_pre_ping', True)
+        return options
+
+    def create_index_store(self, ranker: BM25Ranker, analyzer: Analyzer,
+                           segments: Optional[SegmentIndex] = None) -> InvertedIndex:
+        if segments is not None:
+            self.logger.warning("SEARCH_SEGMENT_DIR is ignored with the PostgreSQL backend")
+        return PostgresFullTextIndex(ranker, analyzer)
+
+    def info(self) -> Dict:
+        info = super().info()
+        info['server_version'] = db.session.execute(db.text('SHOW server_version')).scalar()
+        return info
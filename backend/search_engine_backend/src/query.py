@@ -0,0 +1,193 @@
+from src.analysis import Analyzer, DEFAULT_ANALYZER, tokenize
+from typing import List, Optional, Tuple
+import re
+
+QUERY_TOKEN_PATTERN = re.compile(r'"[^"]*"?|\(|\)|[^\s()"]+')
+
+class Term:
+    def __init__(self, term: str):
+        self.term = term
+
+    def __repr__(self):
+        return f'Term({self.term!r})'
+
+class Prefix:
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+
+    def __repr__(self):
+        return f'Prefix({self.prefix!r})'
+
+class Phrase:
+    def __init__(self, terms: List[Tuple[str, ...]], positions: List[int]):
+        # Every slot lists the terms the word may be indexed as
+        self.terms = terms
+        # Position of each slot relative to the first (gaps are stopwords)
+        self.positions = positions
+
+    def __repr__(self):
+        return f'Phrase({self.terms!r}, {self.positions!r})'
+
+class And:
+    def __init__(self, children: List):
+        self.children = children
+
+    def __repr__(self):
+        return f'And({self.children!r})'
+
+class Or:
+    def __init__(self, children: List):
+        self.children = children
+
+    def __repr__(self):
+        return f'Or({self.children!r})'
+
+class Not:
+    def __init__(self, child):
+        self.child = child
+
+    def __repr__(self):
+        return f'Not({self.child!r})'
+
+class QueryParser:
+    """
+    Parse search queries into a tree of Term, Prefix, Phrase, And, Or and Not
+
+    Syntax:
+        python flask            both words (AND is implied)
+        python OR ruby          either word
+        python NOT django       exclusion, also written as -django
+        "web crawler"           exact phrase
+        craw*                   words starting with a prefix
+        (python OR ruby) web    grouping
+
+    Operators are only recognized in upper case, so "and", "or" and "not"
+    stay ordinary words.
+
+    Words go through the same analyzer as indexed pages. A word whose
+    analysis differs between languages matches any of its terms, and
+    stopwords are dropped (inside phrases they still take up a position).
+
+    The parser never fails: unbalanced parentheses, dangling operators and
+    empty phrases are ignored, so any input produces a (possibly empty)
+    query.
+    """
+
+    def __init__(self, analyzer: Optional[Analyzer] = None):
+        self.analyzer = analyzer or DEFAULT_ANALYZER
+
+    def parse(self, query: str):
+        """
+        Parse a query string
+
+        Args:
+            query: Raw query as typed by the user
+
+        Returns:
+            Root node of the query tree or None if the query has no terms
+        """
+        self.tokens = QUERY_TOKEN_PATTERN.findall(query or '')
+        self.index = 0
+        nodes = []
+        while self.index < len(self.tokens):
+            node = self._parse_or()
+            if node is not None:
+                nodes.append(node)
+            elif self.index < len(self.tokens):
+                # Stray ')' or operator without operands
+                self.index += 1
+        return self._combine(And, nodes)
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.index] if self.index < len(self.tokens) else None
+
+    def _parse_or(self):
+        children = [self._parse_and()]
+        while self._peek() == 'OR':
+            self.index += 1
+            children.append(self._parse_and())
+        return self._combine(Or, [child for child in children if child is not None])
+
+    def _parse_and(self):
+        children = []
+        while True:
+            token = self._peek()
+            if token is None or token in ('OR', ')'):
+                break
+            if token == 'AND':
+                self.index += 1
+                continue
+            node = self._parse_unary()
+            if node is not None:
+                children.append(node)
+        return self._combine(And, children)
+
+    def _parse_unary(self):
+        token = self._peek()
+        if token is None or token in ('OR', ')'):
+            return None
+        if token == 'NOT':
+            self.index += 1
+            child = self._parse_unary()
+            return Not(child) if child is not None else None
+        if token.startswith('-') and len(token) > 1:
+            self.tokens[self.index] = token[1:]
+            child = self._parse_unary()
+            return Not(child) if child is not None else None
+        return self._parse_primary()
+
+    def _parse_primary(self):
+        token = self._peek()
+        self.index += 1
+        if token == '(':
+            node = self._parse_or()
+            if self._peek() == ')':
+                self.index += 1
+            return node
+        if token.startswith('"'):
+            return self._phrase(tokenize(token.strip('"')))
+        return self._parse_word(token)
+
+    def _parse_word(self, word: str):
+        tokens = tokenize(word)
+        if not tokens:
+            return None
+        if word.endswith('*'):
+            leaves = [self._phrase(tokens[:-1]), self._prefix(tokens[-1])]
+            return self._combine(And, [leaf for leaf in leaves if leaf is not None])
+        # A word the tokenizer splits (e.g. "e-mail") must match as a phrase
+        return self._phrase(tokens)
+
+    def _prefix(self, token: str):
+        # Indexed terms are stemmed, so "engines*" also has to expand the
+        # stem "engin"; the normalized form alone still covers partial
+        # words such as "craw*" that the stemmer leaves alone
+        prefixes = [self.analyzer.normalize(token)]
+        for term in self.analyzer.query_terms(token):
+            if term not in prefixes:
+                prefixes.append(term)
+        return self._combine(Or, [Prefix(prefix) for prefix in prefixes])
+
+    def _phrase(self, tokens: List[str]):
+        slots = [
+            (position, self.analyzer.query_terms(token))
+            for position, token in enumerate(tokens)
+        ]
+        slots = [(position, terms) for position, terms in slots if terms]
+        if not slots:
+            return None
+        if len(slots) == 1:
+            return self._combine(Or, [Term(term) for term in slots[0][1]])
+        first = slots[0][0]
+        return Phrase([terms for _, terms in slots], [position - first for position, _ in slots])
+
+    def _combine(self, node_type, children: List):
+        if not children:
+            return None
+        if len(children) == 1:
+            return children[0]
+        return node_type(children)
+
+def parse_query(query: str, analyzer: Optional[Analyzer] = None):
+    """Parse a query string (see QueryParser)"""
+    return QueryParser(analyzer).parse(query)
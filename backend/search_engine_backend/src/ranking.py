@@ -0,0 +1,82 @@
+from typing import List, Dict, Iterable, Optional, Tuple
+import heapq
+import math
+
+# Matches in short, curated fields say more about a page than body text
+DEFAULT_FIELD_WEIGHTS = {
+    'title': 3.0,
+    'description': 2.0,
+    'keywords': 2.0,
+    'content': 1.0
+}
+
+class BM25Ranker:
+    def __init__(self, field_weights: Optional[Dict[str, float]] = None,
+                 k1: float = 1.2, b: float = 0.75):
+        """
+        Initialize BM25F ranker
+
+        Args:
+            field_weights: Boost per indexed field (missing fields use the defaults)
+            k1: Term frequency saturation
+            b: Strength of document length normalization (0 disables it)
+        """
+        self.field_weights = dict(DEFAULT_FIELD_WEIGHTS)
+        if field_weights:
+            self.field_weights.update(field_weights)
+        self.k1 = k1
+        self.b = b
+
+    def idf(self, doc_freq: int, doc_count: int) -> float:
+        """Inverse document frequency (never negative, even for stale doc_freq > doc_count)"""
+        return max(0.0, math.log(1 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5)))
+
+    def term_score(self, idf: float, field_freqs: Dict[str, int],
+                   field_lengths: Dict[str, int], avg_lengths: Dict[str, float]) -> float:
+        """
+        Score one term in one document
+
+        Field frequencies are length normalized and boosted per field, summed,
+        and then saturated once, so a term repeated across fields cannot
+        outscore a term that is rare in the collection.
+
+        Args:
+            idf: Inverse document frequency of the term
+            field_freqs: Term frequency per field
+            field_lengths: Token count per field of the document
+            avg_lengths: Average token count per field over the collection
+
+        Returns:
+            BM25F score contribution
+        """
+        weighted_freq = 0.0
+        for field, freq in field_freqs.items():
+            avg_length = avg_lengths.get(field) or 1.0
+            norm = 1 - self.b + self.b * field_lengths.get(field, 0) / avg_length
+            weighted_freq += self.field_weights.get(field, 1.0) * freq / norm
+        return idf * weighted_freq / (self.k1 + weighted_freq)
+
+    def top_k(self, scores: Iterable[Tuple[int, float]], k: int) -> List[Tuple[int, float]]:
+        """
+        Select the k best scored documents with a bounded min-heap
+
+        Args:
+            scores: (page_id, score) pairs
+            k: Number of results to keep
+
+        Returns:
+            (page_id, score) pairs, best first (ties go to the lower page id)
+        """
+        if k <= 0:
+            return []
+
+        heap = []
+        for page_id, score in scores:
+            # Negated id so that among equal scores the lowest id survives
+            entry = (score, -page_id)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+        return [(-neg_id, score) for score, neg_id in sorted(heap, reverse=True)]
@@ -0,0 +1,211 @@
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import logging
+import re
+import threading
+import time
+
+import requests
+
+# Only this much of a robots.txt file is parsed (RFC 9309 asks for at least 500 KiB)
+MAX_ROBOTS_SIZE = 512 * 1024
+
+# Seconds before a robots.txt that could not be fetched is tried again
+ERROR_TTL = 300
+
+class RobotsPolicy:
+    def __init__(self, rules: Optional[List[Tuple[bool, str]]] = None,
+                 crawl_delay: Optional[float] = None,
+                 sitemaps: Optional[List[str]] = None):
+        """
+        Crawl rules of one host for our user agent
+
+        Args:
+            rules: (allow, path pattern) pairs; '*' matches any characters and
+                a trailing '$' anchors the pattern at the end of the path
+            crawl_delay: Seconds between requests asked for by the host
+            sitemaps: Sitemap URLs listed in the file
+        """
+        self.rules = [
+            (allow, pattern, self._compile(pattern)) for allow, pattern in (rules or [])
+        ]
+        self.crawl_delay = crawl_delay
+        self.sitemaps = sitemaps or []
+
+    @staticmethod
+    def _compile(pattern: str) -> Optional['re.Pattern']:
+        """Regex for wildcard patterns, None for plain prefixes"""
+        if '*' not in pattern and not pattern.endswith('$'):
+            return None
+        anchored = pattern.endswith('$')
+        body = pattern[:-1] if anchored else pattern
+        return re.compile('.*'.join(re.escape(part) for part in body.split('*')) + ('$' if anchored else ''))
+
+    @classmethod
+    def allow_all(cls) -> 'RobotsPolicy':
+        return cls()
+
+    @classmethod
+    def disallow_all(cls) -> 'RobotsPolicy':
+        return cls([(False, '/')])
+
+    @classmethod
+    def parse(cls, text: str, user_agent: str) -> 'RobotsPolicy':
+        """
+        Parse a robots.txt file (RFC 9309)
+
+        The groups naming our product token apply, or the '*' groups when
+        none does. Crawl-delay (not part of the RFC but widely used) is read
+        from the same groups; Sitemap lines apply to every agent.
+
+        Args:
+            text: File contents
+            user_agent: Our User-Agent header; its product token is matched
+        """
+        token = user_agent.split('/', 1)[0].strip().lower()
+        groups = []
+        sitemaps = []
+        group = None
+        in_agent_lines = False
+
+        for line in text.splitlines():
+            line = line.split('#', 1)[0].strip()
+            key, separator, value = line.partition(':')
+            if not separator:
+                continue
+            key = key.strip().lower()
+            value = value.strip()
+
+            if key == 'user-agent':
+                # Consecutive user-agent lines share one group
+                if not in_agent_lines:
+                    group = {'agents': set(), 'rules': [], 'crawl_delay': None}
+                    groups.append(group)
+                    in_agent_lines = True
+                group['agents'].add(value.lower())
+                continue
+            if key == 'sitemap':
+                if value:
+                    sitemaps.append(value)
+                continue
+
+            in_agent_lines = False
+            if group is None:
+                continue
+            if key in ('allow', 'disallow'):
+                # An empty Disallow allows everything, an empty Allow means nothing
+                if value:
+                    group['rules'].append((key == 'allow', value))
+            elif key == 'crawl-delay' and group['crawl_delay'] is None:
+                try:
+                    group['crawl_delay'] = max(0.0, float(value))
+                except ValueError:
+                    pass
+
+        matched = [group for group in groups if token in group['agents']]
+        if not matched:
+            matched = [group for group in groups if '*' in group['agents']]
+
+        rules = [rule for group in matched for rule in group['rules']]
+        crawl_delay = next(
+            (group['crawl_delay'] for group in matched if group['crawl_delay'] is not None), None
+        )
+        return cls(rules, crawl_delay, sitemaps)
+
+    def allows(self, path: str) -> bool:
+        """
+        Check a path (with query) against the rules
+
+        The longest matching pattern decides; Allow wins a tie. Paths
+        without a matching rule, and /robots.txt itself, are allowed.
+        """
+        if path == '/robots.txt':
+            return True
+
+        allowed = True
+        best_length = -1
+        for allow, pattern, regex in self.rules:
+            matched = regex.match(path) if regex else path.startswith(pattern)
+            if matched and (len(pattern) > best_length or (len(pattern) == best_length and allow)):
+                allowed = allow
+                best_length = len(pattern)
+        return allowed
+
+class RobotsCache:
+    def __init__(self, user_agent: str, ttl: float = 86400, max_entries: int = 10000):
+        """
+        Initialize cache of per-host robots.txt policies
+
+        Every host (scheme and netloc) is fetched at most once per `ttl`
+        seconds, even when several crawler threads ask at the same time.
+        A missing file (4xx) allows everything; a server error or network
+        failure disallows the host for ERROR_TTL seconds, as RFC 9309 asks.
+
+        Args:
+            user_agent: User-Agent whose rules apply
+            ttl: Seconds a fetched policy is used
+            max_entries: Hosts kept (least recently used are dropped)
+        """
+        self.user_agent = user_agent
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._policies = OrderedDict()
+        self._fetch_locks = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def get(self, origin: str, session: requests.Session) -> RobotsPolicy:
+        """
+        Get the policy of a host, fetching robots.txt when needed
+
+        Args:
+            origin: 'scheme://netloc' of the host
+            session: Session used to download robots.txt
+
+        Returns:
+            Policy of the host
+        """
+        policy = self._cached(origin)
+        if policy is not None:
+            return policy
+
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(origin, threading.Lock())
+        with fetch_lock:
+            # Another thread may have fetched it while we waited
+            policy = self._cached(origin)
+            if policy is None:
+                policy, ttl = self._fetch(origin, session)
+                with self._lock:
+                    self._policies[origin] = (policy, time.monotonic() + ttl)
+                    self._policies.move_to_end(origin)
+                    while len(self._policies) > self.max_entries:
+                        self._policies.popitem(last=False)
+        with self._lock:
+            self._fetch_locks.pop(origin, None)
+        return policy
+
+    def _cached(self, origin: str) -> Optional[RobotsPolicy]:
+        with self._lock:
+            entry = self._policies.get(origin)
+            if entry is None:
+                return None
+            policy, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._policies[origin]
+                return None
+            self._policies.move_to_end(origin)
+            return policy
+
+    def _fetch(self, origin: str, session: requests.Session) -> Tuple[RobotsPolicy, float]:
+        url = f'{origin}/robots.txt'
+        try:
+            response = session.get(url, timeout=10)
+            if 400 <= response.status_code < 500:
+                return RobotsPolicy.allow_all(), self.ttl
+            response.raise_for_status()
+            text = response.content[:MAX_ROBOTS_SIZE].decode('utf-8', errors='replace')
+            return RobotsPolicy.parse(text, self.user_agent), self.ttl
+        except requests.RequestException as e:
+            self.logger.warning(f"Could not fetch {url}, not crawling the host for now: {str(e)}")
+            return RobotsPolicy.disallow_all(), min(ERROR_TTL, self.ttl)
@@ -1,18 +1,64 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from src.indexer import SearchIndexer
+from src.jobs import CrawlJobQueue, DEFAULT_LEASE_SECONDS
+from src.cache import QueryCache
+from src.metrics import REGISTRY, Profile, stage, counter
 from src.models.page import AllowedDomain, Page, db
+from typing import Optional, Tuple
+import base64
+import contextlib
+import json
 import logging
 
 search_bp = Blueprint('search', __name__)
 logger = logging.getLogger(__name__)
 
-# Global indexer instance (will be initialized in main.py)
+# Global indexer, job queue and cache instances (will be initialized in main.py)
 indexer = None
+crawl_jobs = None
+query_cache = None
+
+# Request header that asks for a stage breakdown of one search
+PROFILE_HEADER = 'X-Search-Profile'
+
+CACHE_LOOKUPS_HELP = 'Search response cache lookups, by result'
+CACHE_HITS = counter('sse_search_cache_lookups_total', CACHE_LOOKUPS_HELP, result='hit')
+CACHE_MISSES = counter('sse_search_cache_lookups_total', CACHE_LOOKUPS_HELP, result='miss')
+
+def encode_cursor(key: Tuple[str, int]) -> str:
+    """Encode a (domain, id) pagination key as an opaque token"""
+    payload = json.dumps(list(key), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(token: str) -> Optional[Tuple[str, int]]:
+    """Decode a pagination token, None if it is malformed"""
+    try:
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        domain, page_id = json.loads(payload)
+        if not isinstance(domain, str) or not isinstance(page_id, int):
+            return None
+        return domain, page_id
+    except (ValueError, TypeError):
+        return None
 
 def init_search_routes(app):
     """Initialize search routes with app context"""
-    global indexer
+    global indexer, crawl_jobs, query_cache
     indexer = SearchIndexer(app)
+    indexer.ensure_index()
+    indexer.ensure_statistics()
+    indexer.ensure_fingerprints()
+    crawl_jobs = CrawlJobQueue(
+        indexer,
+        workers=app.config.get('CRAWL_JOB_WORKERS', 2),
+        chunk_size=app.config.get('CRAWL_JOB_CHUNK_SIZE', 50),
+        lease_seconds=app.config.get('CRAWL_JOB_LEASE_SECONDS', DEFAULT_LEASE_SECONDS)
+    )
+    crawl_jobs.start()
+    query_cache = QueryCache(
+        max_entries=app.config.get('SEARCH_CACHE_SIZE', 1024),
+        ttl=app.config.get('SEARCH_CACHE_TTL', 300)
+    )
 
 @search_bp.route('/search', methods=['GET'])
 def search():
@@ -22,6 +68,10 @@ def search():
     Query parameters:
     - q: search query (required)
     - limit: maximum results (optional, default 10)
+    
+    With the X-Search-Profile: 1 header (unless SEARCH_PROFILING is off) the
+    cache is bypassed and the response carries the time spent per stage in
+    a "profile" field and a Server-Timing header.
     """
     try:
         query = request.args.get('q', '').strip()
@@ -34,16 +84,70 @@ def search():
         if limit > 50:
             limit = 50  # Maximum limit
         
-        results = indexer.search_pages(query, limit)
+        profiling = (request.headers.get(PROFILE_HEADER, '') not in ('', '0')
+                     and current_app.config.get('SEARCH_PROFILING', True))
+        
+        with Profile() if profiling else contextlib.nullcontext() as profile:
+            # Cached entries hold the serialized results; they are dropped as
+            # soon as the index generation changes
+            generation = indexer.get_index_generation()
+            cache_key = QueryCache.make_key(query, limit)
+            cached = None if profiling else query_cache.get(cache_key, generation)
+            if cached is None:
+                if not profiling:
+                    CACHE_MISSES.inc()
+                results = indexer.search_pages(query, limit)
+                with stage('serialization'):
+                    cached = (current_app.json.dumps(results), len(results))
+                query_cache.put(cache_key, generation, cached)
+            else:
+                CACHE_HITS.inc()
+            results_json, total = cached
+            if total:
+                indexer.suggester.record_query(query)
+        
+        body = f'{{"query": {current_app.json.dumps(query)}, "results": {results_json}, "total": {total}'
+        if profile is None:
+            return current_app.response_class(body + '}', mimetype='application/json')
+        
+        body += f', "profile": {current_app.json.dumps(profile.to_dict())}}}'
+        response = current_app.response_class(body, mimetype='application/json')
+        response.headers['Server-Timing'] = profile.server_timing()
+        return response
+        
+    except Exception as e:
+        logger.error(f"Search error: {str(e)}")
+        return jsonify({
+            'error': 'Internal server error'
+        }), 500
+
+@search_bp.route('/suggest', methods=['GET'])
+def suggest():
+    """
+    Get typeahead suggestions
+    
+    Query parameters:
+    - q: text typed so far (required)
+    - limit: maximum suggestions (optional, default 8, max 20)
+    """
+    try:
+        text = request.args.get('q', '')
+        if not text.strip():
+            return jsonify({
+                'error': 'Query parameter "q" is required'
+            }), 400
+        
+        limit = request.args.get('limit', 8, type=int)
+        if limit > 20:
+            limit = 20  # Maximum limit
         
         return jsonify({
-            'query': query,
-            'results': results,
-            'total': len(results)
+            'query': text,
+            'suggestions': indexer.suggest(text, limit)
         })
         
     except Exception as e:
-        logger.error(f"Search error: {str(e)}")
+        logger.error(f"Suggest error: {str(e)}")
         return jsonify({
             'error': 'Internal server error'
         }), 500
@@ -107,20 +211,27 @@ def add_domain():
 @search_bp.route('/crawl', methods=['POST'])
 def crawl_urls():
     """
-    Crawl and index URLs
+    Queue a job that crawls and indexes URLs
     
     JSON body:
-    - urls: list of URLs to crawl (required)
+    - urls: list of seed URLs to crawl (required unless sitemaps are given)
+    - max_depth: follow links up to this distance from the seeds (optional, default 0)
+    - max_pages: maximum pages to crawl (optional, default CRAWL_MAX_PAGES when max_depth > 0)
+    - sitemaps: list of sitemap URLs whose new or changed pages are crawled (optional)
+    - discover_sitemaps: also read the sitemaps of the seed hosts (optional, default false)
+    
+    Returns 202 with the job id; progress is available at /crawl/jobs/<id>
     """
     try:
         data = request.get_json()
-        if not data or 'urls' not in data:
+        if not data or ('urls' not in data and 'sitemaps' not in data):
             return jsonify({
                 'error': 'URLs list is required'
             }), 400
         
-        urls = data['urls']
-        if not isinstance(urls, list) or not urls:
+        urls = data.get('urls', [])
+        sitemaps = data.get('sitemaps', [])
+        if not isinstance(urls, list) or not isinstance(sitemaps, list) or not (urls or sitemaps):
             return jsonify({
                 'error': 'URLs must be a non-empty list'
             }), 400
@@ -130,19 +241,46 @@ def crawl_urls():
         for url in urls:
             if isinstance(url, str) and url.strip():
                 valid_urls.append(url.strip())
+        valid_sitemaps = [
+            sitemap.strip() for sitemap in sitemaps
+            if isinstance(sitemap, str) and sitemap.strip()
+        ]
         
-        if not valid_urls:
+        if not valid_urls and not valid_sitemaps:
             return jsonify({
                 'error': 'No valid URLs provided'
             }), 400
         
-        indexed_count = indexer.crawl_and_index(valid_urls)
+        discover_sitemaps = data.get('discover_sitemaps', False)
+        if not isinstance(discover_sitemaps, bool):
+            return jsonify({
+                'error': 'discover_sitemaps must be a boolean'
+            }), 400
+        
+        max_depth = data.get('max_depth', 0)
+        max_pages = data.get('max_pages')
+        if not isinstance(max_depth, int) or max_depth < 0:
+            return jsonify({
+                'error': 'max_depth must be a non-negative integer'
+            }), 400
+        if max_pages is not None and (not isinstance(max_pages, int) or max_pages < 1):
+            return jsonify({
+                'error': 'max_pages must be a positive integer'
+            }), 400
+        if max_pages is None and max_depth > 0:
+            max_pages = current_app.config.get('CRAWL_MAX_PAGES', 1000)
+        
+        job = crawl_jobs.submit(
+            valid_urls, max_depth=max_depth, max_pages=max_pages,
+            sitemaps=valid_sitemaps, discover_sitemaps=discover_sitemaps
+        )
         
         return jsonify({
-            'message': f'Successfully indexed {indexed_count}/{len(valid_urls)} pages',
-            'indexed_count': indexed_count,
+            'message': f'Crawl job {job["id"]} queued for {len(valid_urls)} URLs',
+            'job_id': job['id'],
+            'status': job['status'],
             'total_urls': len(valid_urls)
-        })
+        }), 202
         
     except Exception as e:
         logger.error(f"Crawl error: {str(e)}")
@@ -150,11 +288,73 @@ def crawl_urls():
             'error': 'Internal server error'
         }), 500
 
+@search_bp.route('/crawl/jobs', methods=['GET'])
+def list_crawl_jobs():
+    """
+    Get recent crawl jobs
+    
+    Query parameters:
+    - limit: maximum results (optional, default 20)
+    """
+    try:
+        limit = request.args.get('limit', 20, type=int)
+        if limit > 100:
+            limit = 100  # Maximum limit
+        
+        jobs = crawl_jobs.list_jobs(limit)
+        return jsonify({
+            'jobs': jobs,
+            'total': len(jobs)
+        })
+        
+    except Exception as e:
+        logger.error(f"List crawl jobs error: {str(e)}")
+        return jsonify({
+            'error': 'Internal server error'
+        }), 500
+
+@search_bp.route('/crawl/jobs/<int:job_id>', methods=['GET'])
+def get_crawl_job(job_id):
+    """Get progress of a crawl job"""
+    try:
+        job = crawl_jobs.get_job(job_id)
+        if not job:
+            return jsonify({
+                'error': 'Job not found'
+            }), 404
+        
+        return jsonify(job)
+        
+    except Exception as e:
+        logger.error(f"Get crawl job error: {str(e)}")
+        return jsonify({
+            'error': 'Internal server error'
+        }), 500
+
+@search_bp.route('/crawl/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_crawl_job(job_id):
+    """Cancel a queued or running crawl job"""
+    try:
+        job = crawl_jobs.cancel(job_id)
+        if not job:
+            return jsonify({
+                'error': 'Job not found'
+            }), 404
+        
+        return jsonify(job)
+        
+    except Exception as e:
+        logger.error(f"Cancel crawl job error: {str(e)}")
+        return jsonify({
+            'error': 'Internal server error'
+        }), 500
+
 @search_bp.route('/stats', methods=['GET'])
 def get_stats():
     """Get indexing statistics"""
     try:
         stats = indexer.get_stats()
+        stats['query_cache'] = query_cache.stats()
         return jsonify(stats)
         
     except Exception as e:
@@ -163,45 +363,60 @@ def get_stats():
             'error': 'Internal server error'
         }), 500
 
+@search_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Get stage timings and counters of this process in Prometheus text format"""
+    try:
+        return current_app.response_class(
+            REGISTRY.render(), mimetype='text/plain; version=0.0.4'
+        )
+        
+    except Exception as e:
+        logger.error(f"Metrics error: {str(e)}")
+        return jsonify({
+            'error': 'Internal server error'
+        }), 500
+
 @search_bp.route('/pages', methods=['GET'])
 def get_pages():
     """
-    Get list of indexed pages
+    Get list of indexed pages ordered by domain and id
     
     Query parameters:
     - domain: filter by domain (optional)
     - limit: maximum results (optional, default 20)
-    - offset: pagination offset (optional, default 0)
+    - cursor: continuation token from the previous response (optional)
+    - offset: pagination offset (optional, default 0; slow for deep pages, prefer cursor)
     """
     try:
-        domain = request.args.get('domain', '').strip()
+        domain = request.args.get('domain', '').strip().lower()
         limit = request.args.get('limit', 20, type=int)
         offset = request.args.get('offset', 0, type=int)
+        cursor = request.args.get('cursor', '').strip()
         
         if limit > 100:
             limit = 100  # Maximum limit
+        if limit < 1 or offset < 0:
+            return jsonify({
+                'error': 'limit must be positive and offset must not be negative'
+            }), 400
         
-        query = Page.query.filter_by(is_active=True)
-        
-        if domain:
-            query = query.filter_by(domain=domain.lower())
-        
-        pages = query.offset(offset).limit(limit).all()
-        total = query.count()
+        after = None
+        if cursor:
+            after = decode_cursor(cursor)
+            if after is None:
+                return jsonify({
+                    'error': 'Invalid cursor'
+                }), 400
         
-        results = []
-        for page in pages:
-            page_dict = page.to_dict()
-            # Truncate content for listing
-            if page_dict['content'] and len(page_dict['content']) > 200:
-                page_dict['content'] = page_dict['content'][:200] + '...'
-            results.append(page_dict)
+        pages, next_key = indexer.list_pages(domain or None, limit, after, offset)
         
         return jsonify({
-            'pages': results,
-            'total': total,
+            'pages': pages,
+            'total': indexer.count_pages(domain or None),
             'limit': limit,
-            'offset': offset
+            'offset': offset,
+            'next_cursor': encode_cursor(next_key) if next_key else None
         })
         
     except Exception as e:
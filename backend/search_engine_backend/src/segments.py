@@ -0,0 +1,814 @@
+from typing import List, Dict, Iterable, Iterator, Optional, Sequence, Set, Tuple
+from array import array
+from contextlib import contextmanager
+import bisect
+import heapq
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: segments are only safe with a single writer process
+    fcntl = None
+
+MAGIC = b'SSEG'
+VERSION = 1
+
+# magic, version, doc_count, term_count, meta_offset, meta_length,
+# page_ids_offset, lengths_offset, terms_offset, blob_offset, postings_offset
+HEADER = struct.Struct('<4sIQQQQQQQQQ')
+
+# term blob offset, term length, doc_freq, postings offset, doc stream
+# length, position stream length
+TERM_ENTRY = struct.Struct('<QIIQII')
+
+MANIFEST = 'manifest.json'
+
+# Greater than any byte of UTF-8 encoded text
+PREFIX_END = b'\xff'
+
+# (page_id, {(term, field): positions}, {field: length})
+Document = Tuple[int, Dict[Tuple[str, str], Sequence[int]], Dict[str, int]]
+
+def _encode_varint(value: int, out: bytearray) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _decode_varints(data: bytes) -> List[int]:
+    values = []
+    value = 0
+    shift = 0
+    for byte in data:
+        if byte & 0x80:
+            value |= (byte & 0x7f) << shift
+            shift += 7
+        else:
+            values.append(value | (byte << shift))
+            value = 0
+            shift = 0
+    return values
+
+def _align(handle) -> int:
+    """Pad a file to 8 bytes so the arrays that follow can be cast in place"""
+    position = handle.tell()
+    padding = -position % 8
+    handle.write(b'\0' * padding)
+    return position + padding
+
+class SegmentWriter:
+    def __init__(self, path: str, fields: Sequence[str]):
+        """
+        Initialize writer for one immutable segment file
+
+        Layout (little endian, sections aligned to 8 bytes):
+
+            header      HEADER
+            meta        JSON: field names and total field lengths
+            page ids    uint64 per document, ascending
+            lengths     uint32 per document and field
+            terms       TERM_ENTRY per term, sorted by UTF-8 bytes
+            term blob   UTF-8 bytes of all terms
+            postings    per term a document stream and a position stream
+
+        The document stream holds, per document, the delta of its document
+        number, a bitmask of the fields the term occurs in and the term
+        frequency per field. The position stream holds the delta encoded
+        positions of every (document, field) in the same order. All numbers
+        are varints, so term frequencies can be read without decoding any
+        position.
+
+        Documents are set first, then terms are added in sorted order and
+        finish() assembles the file. Postings are spooled to a temporary
+        file, so merging large segments does not hold them in memory.
+
+        Args:
+            path: Destination file (written atomically by finish())
+            fields: Field names in the order used by the field bitmasks
+        """
+        self.path = path
+        self.fields = list(fields)
+        self._page_ids = array('Q')
+        self._lengths = array('I')
+        self._field_totals = [0] * len(self.fields)
+        self._entries = []
+        self._blob = bytearray()
+        self._postings = tempfile.TemporaryFile()
+        self._postings_length = 0
+
+    def set_documents(self, documents: Iterable[Tuple[int, Sequence[int]]]) -> None:
+        """
+        Write the document table
+
+        Args:
+            documents: (page_id, lengths in field order), ascending by page_id
+        """
+        for page_id, lengths in documents:
+            self._page_ids.append(page_id)
+            self._lengths.extend(lengths)
+            for index, length in enumerate(lengths):
+                self._field_totals[index] += length
+
+    def add_term(self, term: bytes, entries: List[Tuple[int, List[Tuple[int, Sequence[int]]]]]) -> None:
+        """
+        Append the postings of a term
+
+        Args:
+            term: UTF-8 encoded term, greater than the previous one
+            entries: (document number, [(field index, positions)]) ascending
+                by document number, fields ascending by index
+        """
+        docs = bytearray()
+        positions = bytearray()
+        previous = 0
+        for number, fields in entries:
+            _encode_varint(number - previous, docs)
+            previous = number
+            mask = 0
+            for field_index, _ in fields:
+                mask |= 1 << field_index
+            _encode_varint(mask, docs)
+            for _, field_positions in fields:
+                _encode_varint(len(field_positions), docs)
+                last = 0
+                for position in field_positions:
+                    _encode_varint(position - last, positions)
+                    last = position
+
+        self._entries.append((
+            len(self._blob), len(term), len(entries),
+            self._postings_length, len(docs), len(positions)
+        ))
+        self._blob += term
+        self._postings.write(docs)
+        self._postings.write(positions)
+        self._postings_length += len(docs) + len(positions)
+
+    def finish(self) -> None:
+        """Assemble the segment file and move it into place"""
+        meta = json.dumps({
+            'fields': self.fields,
+            'field_lengths': dict(zip(self.fields, self._field_totals))
+        }).encode('utf-8')
+
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as handle:
+            handle.write(b'\0' * HEADER.size)
+            meta_offset = _align(handle)
+            handle.write(meta)
+            page_ids_offset = _align(handle)
+            handle.write(self._page_ids.tobytes())
+            lengths_offset = _align(handle)
+            handle.write(self._lengths.tobytes())
+            terms_offset = _align(handle)
+            for entry in self._entries:
+                handle.write(TERM_ENTRY.pack(*entry))
+            blob_offset = _align(handle)
+            handle.write(self._blob)
+            postings_offset = _align(handle)
+            self._postings.seek(0)
+            shutil.copyfileobj(self._postings, handle)
+
+            handle.seek(0)
+            handle.write(HEADER.pack(
+                MAGIC, VERSION, len(self._page_ids), len(self._entries),
+                meta_offset, len(meta), page_ids_offset, lengths_offset,
+                terms_offset, blob_offset, postings_offset
+            ))
+            handle.flush()
+            os.fsync(handle.fileno())
+        self._postings.close()
+        os.replace(temporary, self.path)
+
+def write_segment(path: str, documents: List[Document], fields: Sequence[str]) -> int:
+    """
+    Write analyzed documents as a new segment
+
+    Args:
+        path: Destination file
+        documents: (page_id, {(term, field): positions}, {field: length})
+        fields: Indexed field names
+
+    Returns:
+        Number of documents written
+    """
+    field_numbers = {field: index for index, field in enumerate(fields)}
+    documents = sorted(documents, key=lambda document: document[0])
+
+    writer = SegmentWriter(path, fields)
+    writer.set_documents(
+        (page_id, [lengths.get(field, 0) for field in fields])
+        for page_id, _, lengths in documents
+    )
+
+    # term -> document number -> [(field index, positions)]
+    inverted = {}
+    for number, (_, postings, _) in enumerate(documents):
+        for (term, field), positions in postings.items():
+            inverted.setdefault(term.encode('utf-8'), {}).setdefault(number, []).append(
+                (field_numbers[field], positions)
+            )
+
+    for term in sorted(inverted):
+        writer.add_term(term, [
+            (number, sorted(fields)) for number, fields in sorted(inverted[term].items())
+        ])
+    writer.finish()
+    return len(documents)
+
+class Segment:
+    def __init__(self, path: str, deleted: Iterable[int] = ()):
+        """
+        Open a segment file with mmap
+
+        Nothing is read up front: the page id and length tables are used
+        in place through memoryviews and terms are found by binary search
+        in the mapped term table, so opening is instant and the pages are
+        shared by every process through the page cache.
+
+        Args:
+            path: Segment file
+            deleted: Page ids whose copy in this segment is superseded
+        """
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(path, 'rb') as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, self.doc_count, self.term_count, meta_offset, meta_length,
+         page_ids_offset, lengths_offset, self._terms_offset, self._blob_offset,
+         self._postings_offset) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a segment file: {path}")
+
+        meta = json.loads(self._mmap[meta_offset:meta_offset + meta_length])
+        self.fields = meta['fields']
+        self.field_lengths = meta['field_lengths']
+
+        view = memoryview(self._mmap)
+        self.page_ids = view[page_ids_offset:page_ids_offset + 8 * self.doc_count].cast('Q')
+        self.lengths = view[lengths_offset:lengths_offset + 4 * self.doc_count * len(self.fields)].cast('I')
+        self.deleted = frozenset(deleted)
+        # Document frequencies without the deleted copies, by term index
+        self._live_doc_freqs = {}
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def document_number(self, page_id: int) -> Optional[int]:
+        """Position of a page in the document table (None if absent)"""
+        number = bisect.bisect_left(self.page_ids, page_id)
+        if number < self.doc_count and self.page_ids[number] == page_id:
+            return number
+        return None
+
+    def document_lengths(self, number: int) -> Dict[str, int]:
+        start = number * len(self.fields)
+        return dict(zip(self.fields, self.lengths[start:start + len(self.fields)]))
+
+    def _entry(self, index: int) -> Tuple[int, int, int, int, int, int]:
+        return TERM_ENTRY.unpack_from(self._mmap, self._terms_offset + index * TERM_ENTRY.size)
+
+    def term_at(self, index: int) -> bytes:
+        blob_offset, length = TERM_ENTRY.unpack_from(
+            self._mmap, self._terms_offset + index * TERM_ENTRY.size
+        )[:2]
+        start = self._blob_offset + blob_offset
+        return self._mmap[start:start + length]
+
+    def _lower_bound(self, term: bytes) -> int:
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.term_at(middle) < term:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, term: str) -> Optional[int]:
+        """Index of a term in the term table (None if absent)"""
+        encoded = term.encode('utf-8')
+        index = self._lower_bound(encoded)
+        if index < self.term_count and self.term_at(index) == encoded:
+            return index
+        return None
+
+    def iter_terms(self, tag: int) -> Iterator[Tuple[bytes, int, int]]:
+        """(term, tag, index) of every term in order, for merging several segments"""
+        for index in range(self.term_count):
+            yield self.term_at(index), tag, index
+
+    def doc_freq(self, index: int) -> int:
+        """Number of live documents containing a term"""
+        doc_freq = self._entry(index)[2]
+        if not self.deleted:
+            return doc_freq
+        if index not in self._live_doc_freqs:
+            # The stored frequency still counts superseded copies, so they
+            # are subtracted once per term (the segment never changes)
+            deleted = sum(
+                1 for number, _ in self.read_entries(index, with_positions=False)
+                if self.page_ids[number] in self.deleted
+            )
+            self._live_doc_freqs[index] = doc_freq - deleted
+        return self._live_doc_freqs[index]
+
+    def prefix_range(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        """(term, doc_freq) of every term starting with a prefix"""
+        encoded = prefix.encode('utf-8')
+        for index in range(self._lower_bound(encoded), self._lower_bound(encoded + PREFIX_END)):
+            doc_freq = self.doc_freq(index)
+            if doc_freq:
+                yield self.term_at(index).decode('utf-8'), doc_freq
+
+    def read_entries(self, index: int, with_positions: bool = True) -> Iterator[Tuple[int, List[Tuple[int, int, List[int]]]]]:
+        """
+        Decode the postings of a term
+
+        Args:
+            index: Index of the term
+            with_positions: Also decode the position stream
+
+        Yields:
+            (document number, [(field index, term frequency, positions)])
+            where positions is empty when with_positions is False
+        """
+        _, _, _, offset, docs_length, positions_length = self._entry(index)
+        start = self._postings_offset + offset
+        values = _decode_varints(self._mmap[start:start + docs_length])
+        positions = []
+        if with_positions:
+            start += docs_length
+            positions = _decode_varints(self._mmap[start:start + positions_length])
+
+        cursor = 0
+        position_cursor = 0
+        number = 0
+        while cursor < len(values):
+            number += values[cursor]
+            mask = values[cursor + 1]
+            cursor += 2
+            fields = []
+            field_index = 0
+            while mask:
+                if mask & 1:
+                    term_freq = values[cursor]
+                    cursor += 1
+                    field_positions = []
+                    if with_positions:
+                        last = 0
+                        for delta in positions[position_cursor:position_cursor + term_freq]:
+                            last += delta
+                            field_positions.append(last)
+                        position_cursor += term_freq
+                    fields.append((field_index, term_freq, field_positions))
+                mask >>= 1
+                field_index += 1
+            yield number, fields
+
+class SegmentIndex:
+    def __init__(self, directory: str, fields: Sequence[str], max_segments: int = 8):
+        """
+        Initialize memory-mapped segment store
+
+        Segments are immutable files listed in a manifest. Every committed
+        index batch becomes a new small segment; older copies of its pages
+        are marked deleted in per-segment deletion files. When there are
+        more than max_segments segments the smallest ones are merged into
+        one in a background thread, dropping deleted documents.
+
+        Readers in every process reopen the manifest when it changes (one
+        stat() per query), and writers serialize on a lock file, so all
+        workers of a server can share one directory.
+
+        Args:
+            directory: Directory holding the manifest and segment files
+            fields: Indexed field names
+            max_segments: Segment count above which a merge is started
+        """
+        self.directory = directory
+        self.fields = list(fields)
+        self.max_segments = max(2, max_segments)
+        os.makedirs(directory, exist_ok=True)
+        self._segments = []
+        self._field_statistics = []
+        self._manifest_stamp = None
+        self._read_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._merge_thread = None
+        self.logger = logging.getLogger(__name__)
+
+    # Reading
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST)
+
+    def _read_manifest(self) -> Dict:
+        try:
+            with open(self._manifest_path(), 'r', encoding='utf-8') as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return {'next_id': 1, 'segments': []}
+
+    def segments(self) -> List[Segment]:
+        """Open segments of the current manifest, oldest first"""
+        try:
+            stat = os.stat(self._manifest_path())
+            stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self._manifest_stamp:
+            return self._segments
+
+        with self._read_lock:
+            if stamp != self._manifest_stamp:
+                self._load(stamp)
+        return self._segments
+
+    def _load(self, stamp) -> None:
+        opened = {segment.name: segment for segment in self._segments}
+        segments = []
+        for entry in self._read_manifest()['segments']:
+            deleted = self._read_deletes(entry.get('deletes'))
+            segment = opened.get(entry['name'])
+            if segment is None or segment.deleted != deleted:
+                # Segments that were merged away are released when the
+                # last query using them finishes
+                segment = Segment(os.path.join(self.directory, entry['name']), deleted)
+            segments.append(segment)
+
+        statistics = {field: [0, 0] for field in self.fields}
+        for segment in segments:
+            live = segment.doc_count - len(segment.deleted)
+            for field in segment.fields:
+                totals = statistics.setdefault(field, [0, 0])
+                totals[0] += live
+                totals[1] += segment.field_lengths.get(field, 0)
+            for page_id in segment.deleted:
+                number = segment.document_number(page_id)
+                if number is not None:
+                    for field, length in segment.document_lengths(number).items():
+                        statistics[field][1] -= length
+
+        self._segments = segments
+        self._field_statistics = [
+            (field, doc_count, total_length)
+            for field, (doc_count, total_length) in statistics.items()
+        ]
+        self._manifest_stamp = stamp
+
+    def _read_deletes(self, name: Optional[str]) -> frozenset:
+        if not name:
+            return frozenset()
+        page_ids = array('Q')
+        with open(os.path.join(self.directory, name), 'rb') as handle:
+            page_ids.frombytes(handle.read())
+        return frozenset(page_ids)
+
+    def doc_count(self) -> int:
+        """Number of live documents"""
+        return sum(segment.doc_count - len(segment.deleted) for segment in self.segments())
+
+    def lookup(self, words: Iterable[str]) -> Dict[str, Tuple[str, int]]:
+        """
+        Document frequencies of terms
+
+        Frequencies only count live documents, the same population as
+        doc_count(), so idf stays comparable to the table path after
+        pages are updated or deleted.
+
+        Returns:
+            term -> (term, doc_freq) for every term found in some segment
+        """
+        segments = self.segments()
+        terms = {}
+        for word in words:
+            doc_freq = 0
+            for segment in segments:
+                index = segment.find(word)
+                if index is not None:
+                    doc_freq += segment.doc_freq(index)
+            if doc_freq:
+                terms[word] = (word, doc_freq)
+        return terms
+
+    def expand_prefix(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        """Most frequent (term, doc_freq) pairs starting with a prefix"""
+        doc_freqs = {}
+        for segment in self.segments():
+            for term, doc_freq in segment.prefix_range(prefix):
+                doc_freqs[term] = doc_freqs.get(term, 0) + doc_freq
+        return heapq.nlargest(limit, doc_freqs.items(), key=lambda item: (item[1], item[0]))
+
+    def postings(self, term: str, within: Optional[Set[int]] = None) -> Dict[int, Dict[str, int]]:
+        """page_id -> field -> term frequency of the live documents containing a term"""
+        postings = {}
+        for segment in self.segments():
+            index = segment.find(term)
+            if index is None:
+                continue
+            page_ids = segment.page_ids
+            for number, fields in segment.read_entries(index, with_positions=False):
+                page_id = page_ids[number]
+                if page_id in segment.deleted or (within is not None and page_id not in within):
+                    continue
+                postings[page_id] = {
+                    segment.fields[field_index]: term_freq for field_index, term_freq, _ in fields
+                }
+        return postings
+
+    def positions(self, terms: Iterable[str], page_ids: Set[int]) -> Dict[Tuple[int, str], Dict[str, Set[int]]]:
+        """(page_id, field) -> term -> positions for the given pages"""
+        positions = {}
+        for segment in self.segments():
+            for term in terms:
+                index = segment.find(term)
+                if index is None:
+                    continue
+                for number, fields in segment.read_entries(index):
+                    page_id = segment.page_ids[number]
+                    if page_id not in page_ids or page_id in segment.deleted:
+                        continue
+                    for field_index, _, field_positions in fields:
+                        positions.setdefault((page_id, segment.fields[field_index]), {})[term] = set(field_positions)
+        return positions
+
+    def field_statistics(self) -> List[Tuple[str, int, int]]:
+        """(field, doc_count, total_length) over the live documents"""
+        self.segments()
+        return self._field_statistics
+
+    def document_lengths(self, page_ids: Iterable[int]) -> Dict[int, Dict[str, int]]:
+        """page_id -> field -> length of live documents"""
+        segments = self.segments()
+        lengths = {}
+        for page_id in page_ids:
+            for segment in segments:
+                if page_id in segment.deleted:
+                    continue
+                number = segment.document_number(page_id)
+                if number is not None:
+                    lengths[page_id] = segment.document_lengths(number)
+                    break
+        return lengths
+
+    # Writing
+
+    @contextmanager
+    def _locked(self, name: str = 'write.lock', blocking: bool = True):
+        """Hold a lock file shared by all processes using the directory"""
+        with open(os.path.join(self.directory, name), 'a') as handle:
+            if fcntl is not None:
+                flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+                try:
+                    fcntl.flock(handle.fileno(), flags)
+                except BlockingIOError:
+                    yield False
+                    return
+            try:
+                yield True
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+    def _write_manifest(self, manifest: Dict) -> None:
+        temporary = self._manifest_path() + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as handle:
+            json.dump(manifest, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary, self._manifest_path())
+
+    def _write_deletes(self, manifest: Dict, page_ids: Iterable[int]) -> str:
+        name = f"del_{manifest['next_id']:08d}.bin"
+        manifest['next_id'] += 1
+        with open(os.path.join(self.directory, name), 'wb') as handle:
+            handle.write(array('Q', sorted(page_ids)).tobytes())
+        return name
+
+    def _remove_files(self, names: Iterable[str]) -> None:
+        for name in names:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def commit(self, documents: List[Document], deleted: Iterable[int] = ()) -> None:
+        """
+        Add a segment and mark older copies of its pages deleted
+
+        Args:
+            documents: Analyzed documents of the new segment
+            deleted: Further page ids removed from the index
+        """
+        removed = set(deleted) | {page_id for page_id, _, _ in documents}
+        if not removed:
+            return
+
+        with self._write_lock, self._locked():
+            manifest = self._read_manifest()
+            segments = {segment.name: segment for segment in self.segments()}
+            obsolete = []
+            for entry in manifest['segments']:
+                segment = segments.get(entry['name']) or Segment(
+                    os.path.join(self.directory, entry['name']),
+                    self._read_deletes(entry.get('deletes'))
+                )
+                hits = {
+                    page_id for page_id in removed
+                    if page_id not in segment.deleted and segment.document_number(page_id) is not None
+                }
+                if hits:
+                    if entry.get('deletes'):
+                        obsolete.append(entry['deletes'])
+                    entry['deletes'] = self._write_deletes(manifest, segment.deleted | hits)
+
+            if documents:
+                name = f"seg_{manifest['next_id']:08d}.sseg"
+                manifest['next_id'] += 1
+                count = write_segment(os.path.join(self.directory, name), documents, self.fields)
+                manifest['segments'].append({'name': name, 'deletes': None, 'doc_count': count})
+
+            self._write_manifest(manifest)
+            self._remove_files(obsolete)
+
+        if len(manifest['segments']) > self.max_segments:
+            self.merge_in_background()
+
+    def clear(self) -> None:
+        """Drop every segment"""
+        with self._write_lock, self._locked():
+            manifest = self._read_manifest()
+            names = []
+            for entry in manifest['segments']:
+                names.append(entry['name'])
+                if entry.get('deletes'):
+                    names.append(entry['deletes'])
+            self._write_manifest({'next_id': manifest['next_id'], 'segments': []})
+            self._remove_files(names)
+
+    def merge_in_background(self) -> None:
+        """Start a merge thread unless one is already running"""
+        with self._read_lock:
+            if self._merge_thread is not None and self._merge_thread.is_alive():
+                return
+            self._merge_thread = threading.Thread(target=self._merge_safely, name='segment-merge', daemon=True)
+            self._merge_thread.start()
+
+    def _merge_safely(self) -> None:
+        try:
+            while self.merge():
+                pass
+        except Exception as e:
+            self.logger.error(f"Error merging segments: {str(e)}")
+
+    def merge(self) -> bool:
+        """
+        Merge the smallest segments while there are too many
+
+        The new segment is written without holding the write lock, so
+        indexing continues during a merge; deletions that happen meanwhile
+        are carried over when the manifest is swapped.
+
+        Returns:
+            True if segments were merged
+        """
+        with self._locked('merge.lock', blocking=False) as acquired:
+            if not acquired:
+                return False
+
+            entries = self._read_manifest()['segments']
+            if len(entries) <= self.max_segments:
+                return False
+
+            # Rewriting only small segments keeps the cost of merging
+            # logarithmic in the index size
+            count = max(2, len(entries) - self.max_segments + 1)
+            sources = sorted(entries, key=lambda entry: entry['doc_count'])[:count]
+            source_names = {entry['name'] for entry in sources}
+            opened = {segment.name: segment for segment in self.segments()}
+            segments = [
+                opened.get(entry['name']) or Segment(
+                    os.path.join(self.directory, entry['name']),
+                    self._read_deletes(entry.get('deletes'))
+                )
+                for entry in sources
+            ]
+
+            with self._write_lock, self._locked():
+                manifest = self._read_manifest()
+                name = f"seg_{manifest['next_id']:08d}.sseg"
+                manifest['next_id'] += 1
+                self._write_manifest(manifest)
+
+            merged_count = self._merge_segments(os.path.join(self.directory, name), segments)
+
+            with self._write_lock, self._locked():
+                manifest = self._read_manifest()
+                current = {entry['name']: entry for entry in manifest['segments']}
+                if not source_names <= set(current):
+                    # The index was cleared while merging
+                    self._remove_files([name])
+                    return False
+
+                # Pages deleted from the sources while merging
+                deleted_meanwhile = set()
+                for segment in segments:
+                    entry = current[segment.name]
+                    deleted_meanwhile |= self._read_deletes(entry.get('deletes')) - segment.deleted
+
+                obsolete = []
+                for entry in sources:
+                    obsolete.append(entry['name'])
+                    if current[entry['name']].get('deletes'):
+                        obsolete.append(current[entry['name']]['deletes'])
+
+                merged = {'name': name, 'deletes': None, 'doc_count': merged_count}
+                if deleted_meanwhile:
+                    merged['deletes'] = self._write_deletes(manifest, deleted_meanwhile)
+
+                # The merged segment takes the place of its newest source so
+                # segments stay ordered by age
+                position = max(
+                    index for index, entry in enumerate(manifest['segments'])
+                    if entry['name'] in source_names
+                )
+                segments_list = []
+                for index, entry in enumerate(manifest['segments']):
+                    if index == position:
+                        segments_list.append(merged)
+                    elif entry['name'] not in source_names:
+                        segments_list.append(entry)
+                manifest['segments'] = segments_list
+                self._write_manifest(manifest)
+                self._remove_files(obsolete)
+
+            self.logger.info(f"Merged {len(segments)} segments into {name} ({merged_count} documents)")
+            return True
+
+    def _merge_segments(self, path: str, segments: List[Segment]) -> int:
+        """Write the live documents of several segments as one segment"""
+        live = []
+        for segment_number, segment in enumerate(segments):
+            for number, page_id in enumerate(segment.page_ids):
+                if page_id not in segment.deleted:
+                    live.append((page_id, segment_number, number))
+        live.sort()
+
+        # Old document number -> new document number per source segment
+        renumber = [{} for _ in segments]
+        for new_number, (_, segment_number, number) in enumerate(live):
+            renumber[segment_number][number] = new_number
+
+        field_numbers = {field: index for index, field in enumerate(self.fields)}
+        field_maps = [
+            [field_numbers.get(field) for field in segment.fields] for segment in segments
+        ]
+
+        writer = SegmentWriter(path, self.fields)
+        writer.set_documents(
+            (page_id, [
+                segments[segment_number].document_lengths(number).get(field, 0)
+                for field in self.fields
+            ])
+            for page_id, segment_number, number in live
+        )
+
+        term_streams = [
+            segment.iter_terms(segment_number) for segment_number, segment in enumerate(segments)
+        ]
+        current_term = None
+        entries = []
+        for term, segment_number, index in heapq.merge(*term_streams):
+            if term != current_term:
+                if entries:
+                    entries.sort()
+                    writer.add_term(current_term, entries)
+                current_term = term
+                entries = []
+            numbers = renumber[segment_number]
+            field_map = field_maps[segment_number]
+            for number, fields in segments[segment_number].read_entries(index):
+                new_number = numbers.get(number)
+                if new_number is None:
+                    continue
+                fields = sorted(
+                    (field_map[field_index], positions)
+                    for field_index, _, positions in fields if field_map[field_index] is not None
+                )
+                if fields:
+                    entries.append((new_number, fields))
+        if entries:
+            entries.sort()
+            writer.add_term(current_term, entries)
+
+        writer.finish()
+        return len(live)
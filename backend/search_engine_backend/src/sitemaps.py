@@ -0,0 +1,70 @@
+from datetime import datetime, timezone
+from typing import IO, Iterator, Optional, Tuple
+import xml.etree.ElementTree as ElementTree
+
+def parse_lastmod(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parse a W3C datetime from <lastmod>
+
+    Returns:
+        Naive UTC datetime (like the timestamps stored on pages), None if
+        the value is missing or malformed
+    """
+    value = (value or '').strip()
+    if not value:
+        return None
+    if value.endswith(('Z', 'z')):
+        value = value[:-1] + '+00:00'
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        for pattern in ('%Y-%m', '%Y'):
+            try:
+                return datetime.strptime(value, pattern)
+            except ValueError:
+                continue
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+def parse_sitemap(stream: IO[bytes]) -> Iterator[Tuple[str, str, Optional[datetime]]]:
+    """
+    Stream the entries of a sitemap or sitemap index
+
+    The document is parsed incrementally and every entry is dropped from
+    the tree once it was yielded, so memory does not grow with the size of
+    the sitemap (up to 50,000 URLs / 50 MB per file).
+
+    Args:
+        stream: Readable binary file object (already decompressed)
+
+    Yields:
+        (kind, loc, lastmod) where kind is 'url' for pages and 'sitemap' for
+        the children of a sitemap index
+    """
+    root = None
+    for event, element in ElementTree.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            continue
+
+        kind = _local_name(element.tag)
+        if kind not in ('url', 'sitemap'):
+            continue
+
+        loc = None
+        lastmod = None
+        for child in element:
+            name = _local_name(child.tag)
+            if name == 'loc':
+                loc = (child.text or '').strip()
+            elif name == 'lastmod':
+                lastmod = parse_lastmod(child.text)
+        if loc:
+            yield kind, loc, lastmod
+        root.clear()
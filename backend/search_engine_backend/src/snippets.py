@@ -0,0 +1,148 @@
+from src.models.index import IndexTerm, Posting
+from src.models.page import PageContent, db
+from src.analysis import Analyzer, DEFAULT_ANALYZER, tokenize_with_offsets
+from src.inverted_index import SNIPPET_FIELD
+from collections import Counter
+from typing import List, Dict, Iterable, Optional, Tuple
+import logging
+
+# Characters dropped at most when cutting a snippet back to a word boundary
+WORD_BOUNDARY_SLACK = 20
+
+class SnippetGenerator:
+    def __init__(self, length: int = 300, analyzer: Optional[Analyzer] = None):
+        """
+        Initialize query-aware snippet generator
+
+        The window is chosen from the character offsets stored in the
+        postings of the query terms and only that window is read from
+        page_contents, so the cost per result does not grow with the size
+        of the page.
+
+        Args:
+            length: Target snippet length in characters
+            analyzer: Analyzer the index was built with, used to find the
+                words of the snippet that match the query terms
+        """
+        self.length = max(50, length)
+        self.analyzer = analyzer or DEFAULT_ANALYZER
+        # Part of the window reserved for text before the first match
+        self.lead = self.length // 5
+        self.logger = logging.getLogger(__name__)
+
+    def generate(self, terms: Iterable[str], pages: List) -> Dict[int, Dict]:
+        """
+        Build snippets for search results
+
+        Must be called inside an app context.
+
+        Args:
+            terms: Analyzed query terms
+            pages: Page instances of the results
+
+        Returns:
+            Mapping of page id to {'snippet', 'highlights'} where highlights
+            are [start, end) character ranges of the query terms in the snippet
+        """
+        terms = set(terms)
+        offsets = self._load_offsets(terms, [page.id for page in pages])
+
+        snippets = {}
+        for page in pages:
+            page_offsets = offsets.get(page.id)
+            if page_offsets:
+                start = self._best_window_start(page_offsets)
+                text = db.session.execute(
+                    db.select(db.func.substr(
+                        PageContent.content, start + 1, self.length + WORD_BOUNDARY_SLACK
+                    )).where(PageContent.page_id == page.id)
+                ).scalar() or ''
+            else:
+                # The terms only occur in other fields: fall back to the start of the page
+                start = 0
+                text = page.summary or ''
+            snippet = self._trim(text, start, page.content_length or 0)
+            snippets[page.id] = {
+                'snippet': snippet,
+                'highlights': self._highlights(snippet, terms)
+            }
+        return snippets
+
+    def _load_offsets(self, terms: set, page_ids: List[int]) -> Dict[int, List[Tuple[int, str]]]:
+        """Read the offsets of the query terms in the result pages"""
+        if not terms or not page_ids:
+            return {}
+
+        offsets = {}
+        for page_id, term, term_offsets in db.session.execute(
+            db.select(Posting.page_id, IndexTerm.term, Posting.offsets)
+            .join(IndexTerm, IndexTerm.id == Posting.term_id)
+            .where(
+                IndexTerm.term.in_(list(terms)),
+                Posting.page_id.in_(page_ids),
+                Posting.field == SNIPPET_FIELD,
+                Posting.offsets.isnot(None)
+            )
+        ):
+            offsets.setdefault(page_id, []).extend(
+                (int(offset), term) for offset in term_offsets.split()
+            )
+
+        for page_offsets in offsets.values():
+            page_offsets.sort()
+        return offsets
+
+    def _best_window_start(self, offsets: List[Tuple[int, str]]) -> int:
+        """
+        Pick where the snippet starts
+
+        Slides a window over the sorted matches and keeps the one with the
+        most distinct query terms, then the most matches, then the earliest.
+        """
+        span = self.length - self.lead
+        counts = Counter()
+        best = (0, 0)
+        best_first = offsets[0][0]
+        left = 0
+        for right, (offset, term) in enumerate(offsets):
+            counts[term] += 1
+            while offset - offsets[left][0] > span:
+                left_term = offsets[left][1]
+                counts[left_term] -= 1
+                if not counts[left_term]:
+                    del counts[left_term]
+                left += 1
+            score = (len(counts), right - left + 1)
+            if score > best:
+                best = score
+                best_first = offsets[left][0]
+        return max(0, best_first - self.lead)
+
+    def _trim(self, text: str, start: int, content_length: int) -> str:
+        """Cut the raw window to word boundaries and mark omitted text"""
+        has_more = start + len(text) < content_length
+        if start > 0:
+            # Drop the partial word the window starts in
+            boundary = text.find(' ', 0, WORD_BOUNDARY_SLACK)
+            if boundary >= 0:
+                text = text[boundary + 1:]
+        if len(text) > self.length:
+            boundary = text.rfind(' ', self.length - WORD_BOUNDARY_SLACK, self.length)
+            text = text[:boundary if boundary >= 0 else self.length]
+            has_more = True
+
+        text = text.strip()
+        if start > 0:
+            text = '...' + text
+        if has_more:
+            text += '...'
+        return text
+
+    def _highlights(self, snippet: str, terms: set) -> List[List[int]]:
+        """Character ranges of the words that analyze to a query term"""
+        # Ranges cover the word as written, not its (shorter) stem
+        return [
+            [offset, offset + len(token)]
+            for token, offset in tokenize_with_offsets(snippet)
+            if not terms.isdisjoint(self.analyzer.query_terms(token))
+        ]
@@ -4,6 +4,7 @@ const API_BASE_URL = '/api';
 // DOM Elements
 const searchForm = document.getElementById('searchForm');
 const searchInput = document.getElementById('searchInput');
+const searchSuggestions = document.getElementById('searchSuggestions');
 const searchResults = document.getElementById('searchResults');
 const resultsList = document.getElementById('resultsList');
 const resultsTitle = document.getElementById('resultsTitle');
@@ -28,6 +29,8 @@ const toast = document.getElementById('toast');
 
 // State
 let currentQuery = '';
+let suggestTimer = null;
+let suggestRequest = 0;
 
 // Initialize App
 document.addEventListener('DOMContentLoaded', function() {
@@ -40,6 +43,7 @@ document.addEventListener('DOMContentLoaded', function() {
 function initializeEventListeners() {
     // Search Form
     searchForm.addEventListener('submit', handleSearch);
+    searchInput.addEventListener('input', handleSuggestInput);
     
     // Admin Modal
     adminBtn.addEventListener('click', openAdminModal);
@@ -101,6 +105,39 @@ async function handleSearch(e) {
     }
 }
 
+function handleSuggestInput() {
+    // Wait until typing pauses before asking for suggestions
+    clearTimeout(suggestTimer);
+    suggestTimer = setTimeout(loadSuggestions, 150);
+}
+
+async function loadSuggestions() {
+    const text = searchInput.value;
+    if (!text.trim()) {
+        searchSuggestions.innerHTML = '';
+        return;
+    }
+    
+    const requestId = ++suggestRequest;
+    try {
+        const response = await fetch(`${API_BASE_URL}/suggest?q=${encodeURIComponent(text)}&limit=8`);
+        const data = await response.json();
+        // Ignore answers to input that has changed since
+        if (!response.ok || requestId !== suggestRequest) {
+            return;
+        }
+        
+        searchSuggestions.innerHTML = '';
+        data.suggestions.forEach(suggestion => {
+            const option = document.createElement('option');
+            option.value = suggestion.text;
+            searchSuggestions.appendChild(option);
+        });
+    } catch (error) {
+        console.error('Suggest error:', error);
+    }
+}
+
 function displayResults(results, query) {
     resultsTitle.textContent = `Hasil Pencarian untuk "${query}"`;
     resultsCount.textContent = `${results.length} hasil ditemukan`;
@@ -121,14 +158,16 @@ function createResultElement(result) {
     
     const title = result.title || 'Untitled';
     const url = result.url || '#';
-    const description = result.description || result.content || 'No description available';
+    const description = result.snippet
+        ? highlightSnippet(result.snippet, result.highlights || [])
+        : escapeHtml(result.description || result.content || 'No description available');
     const domain = result.domain || '';
     const lastUpdated = result.last_updated ? new Date(result.last_updated).toLocaleDateString('id-ID') : '';
     
     div.innerHTML = `
         <a href="${url}" target="_blank" class="result-title">${escapeHtml(title)}</a>
         <div class="result-url">${escapeHtml(url)}</div>
-        <div class="result-description">${escapeHtml(description)}</div>
+        <div class="result-description">${description}</div>
         <div class="result-meta">
             <span><i class="fas fa-globe"></i> ${escapeHtml(domain)}</span>
             ${lastUpdated ? `<span><i class="fas fa-clock"></i> ${lastUpdated}</span>` : ''}
@@ -219,9 +258,9 @@ async function handleCrawlUrls(e) {
             throw new Error(data.error || 'Crawl failed');
         }
         
-        showToast(data.message, 'success');
+        showToast(data.message, 'info');
         urlsInput.value = '';
-        loadStats();
+        pollCrawlJob(data.job_id);
         
     } catch (error) {
         showToast('Error: ' + error.message, 'error');
@@ -229,6 +268,30 @@ async function handleCrawlUrls(e) {
     }
 }
 
+async function pollCrawlJob(jobId) {
+    try {
+        const response = await fetch(`${API_BASE_URL}/crawl/jobs/${jobId}`);
+        const job = await response.json();
+        
+        if (!response.ok) {
+            throw new Error(job.error || 'Failed to load crawl job');
+        }
+        
+        if (job.status === 'queued' || job.status === 'running') {
+            setTimeout(() => pollCrawlJob(jobId), 2000);
+            return;
+        }
+        
+        const summary = `Crawl job ${job.id} ${job.status}: ${job.indexed_count}/${job.total_urls} pages indexed`;
+        showToast(summary, job.status === 'completed' ? 'success' : 'error');
+        loadStats();
+        
+    } catch (error) {
+        showToast('Error: ' + error.message, 'error');
+        console.error('Crawl job error:', error);
+    }
+}
+
 async function loadDomains() {
     try {
         const response = await fetch(`${API_BASE_URL}/domains`);
@@ -330,6 +393,17 @@ function showToast(message, type = 'info') {
     }, 4000);
 }
 
+function highlightSnippet(snippet, highlights) {
+    let html = '';
+    let position = 0;
+    highlights.forEach(([start, end]) => {
+        html += escapeHtml(snippet.slice(position, start));
+        html += `<mark>${escapeHtml(snippet.slice(start, end))}</mark>`;
+        position = end;
+    });
+    return html + escapeHtml(snippet.slice(position));
+}
+
 function escapeHtml(text) {
     const div = document.createElement('div');
     div.textContent = text;
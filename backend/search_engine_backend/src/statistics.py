@@ -0,0 +1,93 @@
+from src.models.stats import StatCounter
+from src.models.page import db
+from sqlalchemy import Table
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import List, Dict, Iterable, Optional
+
+# Counters kept in the stat_counters table
+INDEX_TERMS = 'index_terms'
+INDEX_POSTINGS = 'index_postings'
+CRAWL_PAGES_FETCHED = 'crawl_pages_fetched'
+CRAWL_PAGES_INDEXED = 'crawl_pages_indexed'
+CRAWL_MILLISECONDS = 'crawl_milliseconds'
+
+# INSERT constructs with ON CONFLICT clauses, by SQLAlchemy dialect name
+CONFLICT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+def conflict_insert(table: Table):
+    """INSERT statement for the bound database that accepts ON CONFLICT clauses"""
+    return CONFLICT_INSERTS[db.session.get_bind().dialect.name](table)
+
+def increment_rows(table: Table, key: str, rows: List[Dict]) -> None:
+    """
+    Add to the counter columns of rows, creating missing rows
+
+    Each row is one INSERT ... ON CONFLICT DO UPDATE, so an increment is
+    atomic even when several processes create the same row at once (with
+    update-then-insert both see no row and one insert fails). Rows are
+    written in key order, so concurrent transactions lock them in the same
+    order and cannot deadlock. Rows with a negative value are only applied
+    to existing rows.
+
+    Args:
+        table: Table holding the counters
+        key: Primary key column
+        rows: Dictionaries with the key and the amount to add per column
+    """
+    rows = sorted(rows, key=lambda row: row[key])
+    creating = [row for row in rows if all(value >= 0 for name, value in row.items() if name != key)]
+    decreasing = [row for row in rows if row not in creating]
+
+    if creating:
+        statement = conflict_insert(table)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[key],
+            set_={name: table.c[name] + statement.excluded[name] for name in creating[0] if name != key}
+        ), creating)
+    for row in decreasing:
+        db.session.execute(
+            table.update()
+            .where(table.c[key] == row[key])
+            .values({name: table.c[name] + value for name, value in row.items() if name != key})
+        )
+
+def increment_counters(deltas: Dict[str, int]) -> None:
+    """
+    Add to named counters, creating missing ones
+
+    Must be called inside an app context; the caller commits so counters
+    change in the same transaction as the rows they describe.
+
+    Args:
+        deltas: Mapping of counter name to the amount to add
+    """
+    increment_rows(StatCounter.__table__, 'name', [
+        {'name': name, 'value': delta} for name, delta in deltas.items() if delta
+    ])
+
+def set_counters(values: Dict[str, int]) -> None:
+    """Overwrite named counters (caller commits)"""
+    if not values:
+        return
+    db.session.execute(db.delete(StatCounter).where(StatCounter.name.in_(list(values))))
+    db.session.execute(db.insert(StatCounter), [
+        {'name': name, 'value': value} for name, value in values.items()
+    ])
+
+def get_counters(names: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """
+    Read counters
+
+    Args:
+        names: Counters to read (all if omitted); missing counters read as 0
+
+    Returns:
+        Mapping of counter name to value
+    """
+    statement = db.select(StatCounter.name, StatCounter.value)
+    if names is not None:
+        names = list(names)
+        statement = statement.where(StatCounter.name.in_(names))
+    counters = dict.fromkeys(names or [], 0)
+    counters.update(db.session.execute(statement).all())
+    return counters
@@ -0,0 +1,267 @@
+from src.models.page import Page, AllowedDomain, db
+from src.inverted_index import InvertedIndex
+from src.segments import SegmentIndex
+from src.ranking import BM25Ranker
+from src.analysis import Analyzer
+from sqlalchemy import event, bindparam
+from sqlalchemy.engine import make_url, URL
+from typing import List, Dict, Iterable, Optional, Tuple, Type, Union
+import logging
+
+# PRAGMAs run on every new SQLite connection (SQLITE_PRAGMAS overrides them)
+DEFAULT_PRAGMAS = {
+    # Readers keep reading their snapshot while a writer appends to the log,
+    # so searches do not wait for crawl batches and the other way around
+    'journal_mode': 'WAL',
+    # With WAL, NORMAL only syncs at checkpoints and cannot corrupt the database
+    'synchronous': 'NORMAL',
+    # Page cache per connection; negative values are KiB (16 MiB)
+    'cache_size': -16384,
+    # Read up to 256 MiB of the database file through mmap instead of read()
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    # Milliseconds a writer waits for the write lock before failing
+    'busy_timeout': 5000
+}
+
+# Request threads expected next to the crawl job workers when DB_POOL_SIZE is unset
+DEFAULT_REQUEST_THREADS = 4
+
+# Prepared statements kept per connection by the sqlite3 module
+STATEMENT_CACHE_SIZE = 256
+
+# Key of the configured backend in app.extensions
+EXTENSION_KEY = 'sse_storage'
+
+_pages = Page.__table__
+_domains = AllowedDomain.__table__
+
+# Core statements of the lookups run for every indexed page and every
+# request. They are built once, so SQLAlchemy's compiled cache and the
+# driver's statement cache are always hit and no ORM objects are created.
+PAGE_STATE_BY_URL = db.select(
+    _pages.c.id, _pages.c.content_hash, _pages.c.is_active, _pages.c.domain
+).where(_pages.c.url == bindparam('url'))
+
+PAGE_STATES_BY_URLS = db.select(
+    _pages.c.url, _pages.c.id, _pages.c.content_hash, _pages.c.is_active, _pages.c.domain
+).where(_pages.c.url.in_(bindparam('urls', expanding=True)))
+
+PAGE_IDS_BY_URLS = db.select(
+    _pages.c.url, _pages.c.id
+).where(_pages.c.url.in_(bindparam('urls', expanding=True)))
+
+ACTIVE_DOMAINS = db.select(_domains.c.domain).where(_domains.c.is_active == True)
+
+class PageStore:
+    """
+    Lookups of stored pages and allowed domains
+
+    The statements are plain SQL that every supported database runs, so
+    all backends share this store. Methods must be called inside an app
+    context.
+    """
+
+    def state(self, url: str) -> Optional[Tuple[int, Optional[str], bool, str]]:
+        """(id, content_hash, is_active, domain) of a stored page, None if unknown"""
+        row = db.session.execute(PAGE_STATE_BY_URL, {'url': url}).first()
+        return tuple(row) if row else None
+
+    def states(self, urls: Iterable[str]) -> Dict[str, Tuple[int, Optional[str], bool, str]]:
+        """state() of many URLs; unknown URLs are left out"""
+        return {
+            url: (page_id, content_hash, is_active, domain)
+            for url, page_id, content_hash, is_active, domain in db.session.execute(
+                PAGE_STATES_BY_URLS, {'urls': list(urls)}
+            )
+        }
+
+    def ids(self, urls: Iterable[str]) -> Dict[str, int]:
+        """Map stored URLs to their page id"""
+        return dict(db.session.execute(PAGE_IDS_BY_URLS, {'urls': list(urls)}).all())
+
+    def active_domains(self) -> List[str]:
+        """Domains of the active allowed_domains rows"""
+        return list(db.session.execute(ACTIVE_DOMAINS).scalars())
+
+class StorageBackend:
+    # Value of STORAGE_BACKEND and SQLAlchemy backend name of the database
+    name = None
+
+    def __init__(self, app):
+        """
+        Database backend of the pages and the search index
+
+        A backend configures the engine for its database and creates the
+        page store and the index store used by SearchIndexer. Subclasses
+        override the hooks below; this class holds what all of them share.
+
+        Args:
+            app: Flask application instance
+        """
+        self.app = app
+        self.pages = PageStore()
+        self.logger = logging.getLogger(__name__)
+
+    def pool_size(self) -> int:
+        """
+        Connections kept open per process
+
+        Every crawl job worker holds up to two connections at once (the job
+        and its pipeline writer), and request threads need one each.
+        """
+        config = self.app.config
+        if config.get('DB_POOL_SIZE'):
+            return config['DB_POOL_SIZE']
+        return 2 * config.get('CRAWL_JOB_WORKERS', 2) + config.get('DB_REQUEST_THREADS', DEFAULT_REQUEST_THREADS)
+
+    def engine_options(self, url: URL, options: Dict) -> Dict:
+        """
+        Add this backend's settings to SQLALCHEMY_ENGINE_OPTIONS
+
+        Args:
+            url: Parsed database URI
+            options: Options configured by the app (they take precedence)
+
+        Returns:
+            Options passed to create_engine()
+        """
+        size = self.pool_size()
+        options.setdefault('pool_size', size)
+        options.setdefault('max_overflow', self.app.config.get('DB_POOL_OVERFLOW', size))
+        options.setdefault('pool_timeout', self.app.config.get('DB_POOL_TIMEOUT', 30))
+        return options
+
+    def configure_engine(self, engine) -> None:
+        """Called once with the engine created by Flask-SQLAlchemy"""
+
+    def create_index_store(self, ranker: BM25Ranker, analyzer: Analyzer,
+                           segments: Optional[SegmentIndex] = None) -> InvertedIndex:
+        """Create the index store answering queries"""
+        return InvertedIndex(ranker, analyzer, segments)
+
+    def info(self) -> Dict:
+        """
+        Engine settings in effect (inside an app context)
+
+        Returns:
+            Backend name and pool size, plus database specific settings
+        """
+        size = getattr(db.engine.pool, 'size', None)
+        return {
+            'backend': self.name,
+            'pool_size': size() if callable(size) else None
+        }
+
+class SQLiteBackend(StorageBackend):
+    name = 'sqlite'
+
+    def __init__(self, app):
+        """
+        Single-file SQLite database (the default)
+
+        Every new connection is switched to WAL and tuned with the PRAGMAs
+        from pragmas(). Postings live in the index tables, or in segment
+        files when SEARCH_SEGMENT_DIR is set.
+        """
+        super().__init__(app)
+        self.pragmas = self._load_pragmas()
+
+    def _load_pragmas(self) -> Dict[str, object]:
+        pragmas = dict(DEFAULT_PRAGMAS)
+        pragmas.update(self.app.config.get('SQLITE_PRAGMAS') or {})
+        for name in pragmas:
+            if not name.isidentifier():
+                raise ValueError(f'Invalid SQLite pragma name: {name}')
+        return pragmas
+
+    def engine_options(self, url: URL, options: Dict) -> Dict:
+        # In-memory SQLite uses a single static connection, which has no pool size
+        if url.database not in (None, '', ':memory:'):
+            options = super().engine_options(url, options)
+        connect_args = dict(options.get('connect_args') or {})
+        connect_args.setdefault('timeout', self.pragmas.get('busy_timeout', 5000) / 1000)
+        connect_args.setdefault('cached_statements', STATEMENT_CACHE_SIZE)
+        connect_args.setdefault('check_same_thread', False)
+        options['connect_args'] = connect_args
+        return options
+
+    def configure_engine(self, engine) -> None:
+        pragmas = self.pragmas
+
+        def apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for name, value in pragmas.items():
+                    cursor.execute(f'PRAGMA {name}={value}')
+            finally:
+                cursor.close()
+
+        event.listen(engine, 'connect', apply_pragmas)
+
+    def info(self) -> Dict:
+        info = super().info()
+        for name in ('journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'busy_timeout'):
+            info[name] = db.session.execute(db.text(f'PRAGMA {name}')).scalar()
+        return info
+
+def _backend_classes() -> Dict[str, Type[StorageBackend]]:
+    # Imported here because the PostgreSQL module builds on this one
+    from src.postgres import PostgresBackend
+    return {backend.name: backend for backend in (SQLiteBackend, PostgresBackend)}
+
+def create_backend(app) -> StorageBackend:
+    """
+    Create the backend chosen by the app config
+
+    STORAGE_BACKEND names the backend ('sqlite' or 'postgresql') or is a
+    StorageBackend subclass; by default it follows SQLALCHEMY_DATABASE_URI.
+
+    Raises:
+        ValueError: if the backend is unknown or does not match the URI
+    """
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    choice: Union[str, Type[StorageBackend], None] = app.config.get('STORAGE_BACKEND')
+    if isinstance(choice, type) and issubclass(choice, StorageBackend):
+        return choice(app)
+
+    backends = _backend_classes()
+    name = choice or url.get_backend_name()
+    if name not in backends:
+        raise ValueError(f'Unknown storage backend: {name}')
+    if name != url.get_backend_name():
+        raise ValueError(f'Storage backend {name} cannot use a {url.get_backend_name()} database URI')
+    return backends[name](app)
+
+def init_storage(app) -> StorageBackend:
+    """
+    Configure the database engine and bind `db` to the app
+
+    Call this instead of db.init_app(app). The connection pool is sized
+    from the worker settings and the backend tunes the engine for its
+    database.
+
+    Args:
+        app: Flask application with SQLALCHEMY_DATABASE_URI set
+
+    Returns:
+        The backend, also available through get_backend(app)
+    """
+    backend = create_backend(app)
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = backend.engine_options(url, options)
+    db.init_app(app)
+
+    with app.app_context():
+        backend.configure_engine(db.engine)
+    app.extensions[EXTENSION_KEY] = backend
+    return backend
+
+def get_backend(app) -> StorageBackend:
+    """Backend of an app (created from the config if init_storage was not used)"""
+    backend = app.extensions.get(EXTENSION_KEY)
+    if backend is None:
+        backend = create_backend(app)
+        app.extensions[EXTENSION_KEY] = backend
+    return backend
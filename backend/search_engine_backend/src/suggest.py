@@ -0,0 +1,206 @@
+from src.query import QUERY_TOKEN_PATTERN
+from typing import List, Dict, Iterable, Tuple
+import bisect
+import heapq
+import threading
+
+# Ranges with more keys than this have their best completions cached
+CACHE_THRESHOLD = 256
+
+# Completions kept per cached prefix (upper bound for the limit of suggest())
+MAX_SUGGESTIONS = 20
+
+# Prefix lengths whose cache entries are invalidated on updates
+MAX_CACHED_PREFIX_LENGTH = 4
+
+# Query operators (only recognized in upper case)
+OPERATORS = ('AND', 'OR', 'NOT')
+
+class PrefixIndex:
+    def __init__(self, max_entries: int = 50000):
+        """
+        Initialize weighted prefix index
+
+        Keys are kept in a sorted array, so the keys sharing a prefix form
+        one contiguous range found with two binary searches. That is what
+        a trie gives, without one Python object per node. The best
+        completions of short prefixes, whose ranges are large, are cached
+        and invalidated when one of their keys changes.
+
+        Args:
+            max_entries: Keys kept; when twice as many were added the lowest
+                weighted keys are dropped
+        """
+        self.max_entries = max_entries
+        self._keys = []
+        self._weights = {}
+        self._cache = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def load(self, entries: Iterable[Tuple[str, int]]) -> None:
+        """Replace all keys with (key, weight) pairs"""
+        best = heapq.nlargest(self.max_entries, entries, key=lambda entry: entry[1])
+        self._weights = dict(best)
+        self._keys = sorted(self._weights)
+        self._cache = {}
+
+    def add(self, key: str, delta: int) -> None:
+        """
+        Add to the weight of a key, inserting it if needed
+
+        Args:
+            key: Key to update
+            delta: Weight change (keys that drop to zero are removed)
+        """
+        weight = self._weights.get(key, 0) + delta
+        if weight <= 0:
+            self.remove(key)
+            return
+
+        if key not in self._weights:
+            bisect.insort(self._keys, key)
+        self._weights[key] = weight
+        self._invalidate(key)
+
+        if len(self._keys) > 2 * self.max_entries:
+            # Trimming in bulk keeps inserts cheap
+            self.load(list(self._weights.items()))
+
+    def remove(self, key: str) -> None:
+        """Drop a key"""
+        if key not in self._weights:
+            return
+        del self._weights[key]
+        index = bisect.bisect_left(self._keys, key)
+        del self._keys[index]
+        self._invalidate(key)
+
+    def top(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        """
+        Get the heaviest keys starting with a prefix
+
+        Args:
+            prefix: Prefix to complete
+            limit: Maximum number of keys
+
+        Returns:
+            (key, weight) pairs, heaviest first (ties in key order)
+        """
+        cached = self._cache.get(prefix)
+        if cached is not None:
+            return cached[:limit]
+
+        low = bisect.bisect_left(self._keys, prefix)
+        high = bisect.bisect_left(self._keys, prefix + '\U0010ffff', low)
+        if high - low <= CACHE_THRESHOLD or len(prefix) > MAX_CACHED_PREFIX_LENGTH:
+            return self._best(self._keys[low:high], limit)
+
+        best = self._best(self._keys[low:high], MAX_SUGGESTIONS)
+        self._cache[prefix] = best
+        return best[:limit]
+
+    def _best(self, keys: List[str], limit: int) -> List[Tuple[str, int]]:
+        weights = self._weights
+        return [(key, weights[key]) for key in heapq.nsmallest(
+            limit, keys, key=lambda key: (-weights[key], key)
+        )]
+
+    def _invalidate(self, key: str) -> None:
+        for length in range(min(len(key), MAX_CACHED_PREFIX_LENGTH) + 1):
+            self._cache.pop(key[:length], None)
+
+class Suggester:
+    def __init__(self, max_terms: int = 50000, max_queries: int = 5000):
+        """
+        Initialize typeahead suggestions
+
+        Completions come from two prefix indexes: the surface forms of
+        indexed terms weighted by document frequency and past queries
+        weighted by how often they were searched. Both live in memory and are updated as pages are
+        indexed and queries are run.
+
+        Args:
+            max_terms: Most frequent terms kept
+            max_queries: Most popular queries kept
+        """
+        self.terms = PrefixIndex(max_terms)
+        self.queries = PrefixIndex(max_queries)
+        self._lock = threading.Lock()
+
+    def load_terms(self, entries: Iterable[Tuple[str, int]]) -> None:
+        """Replace the term index with (term, doc_freq) pairs"""
+        with self._lock:
+            self.terms.load(entries)
+
+    def add_terms(self, deltas: Dict[str, int]) -> None:
+        """Apply document frequency changes, keyed by the surface form of the terms"""
+        with self._lock:
+            for term, delta in deltas.items():
+                self.terms.add(term, delta)
+
+    def record_query(self, query: str) -> None:
+        """
+        Count a query that returned results
+
+        Only free-text queries are kept: once lowercased, operators become
+        ordinary words, and phrases, groups, exclusions and wildcards would
+        run a different search when picked as a suggestion.
+        """
+        if not is_free_text(query):
+            return
+        query = normalize_query(query)
+        if query:
+            with self._lock:
+                self.queries.add(query, 1)
+
+    def suggest(self, text: str, limit: int = 8) -> List[Dict]:
+        """
+        Complete partially typed input
+
+        Popular queries that start with the input come first, followed by
+        completions of the last word being typed.
+
+        Args:
+            text: Input typed so far
+            limit: Maximum number of suggestions
+
+        Returns:
+            List of {'text', 'type' ('query' or 'term'), 'weight'}
+        """
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        prefix = normalize_query(text)
+        if not prefix:
+            return []
+
+        with self._lock:
+            suggestions = [
+                {'text': query, 'type': 'query', 'weight': weight}
+                for query, weight in self.queries.top(prefix, limit)
+            ]
+
+            # Complete the last word unless the user already finished it
+            if not text[-1].isspace():
+                head, _, word = prefix.rpartition(' ')
+                seen = {suggestion['text'] for suggestion in suggestions}
+                for term, weight in self.terms.top(word, limit):
+                    completion = f'{head} {term}' if head else term
+                    if len(suggestions) >= limit:
+                        break
+                    if completion not in seen:
+                        suggestions.append({'text': completion, 'type': 'term', 'weight': weight})
+
+        return suggestions[:limit]
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace"""
+    return ' '.join((query or '').lower().split())
+
+def is_free_text(query: str) -> bool:
+    """Check whether a query is plain words, without any query syntax"""
+    for token in QUERY_TOKEN_PATTERN.findall(query or ''):
+        if (token in OPERATORS or token in ('(', ')') or token.startswith('"')
+                or (token.startswith('-') and len(token) > 1) or '*' in token):
+            return False
+    return True
@@ -0,0 +1,71 @@
+from urllib.parse import urlsplit, urlunsplit, unquote_plus, SplitResult
+from typing import Iterable, Optional, FrozenSet
+
+# Query parameters that only say where a visitor came from
+TRACKING_PARAMS = frozenset([
+    'fbclid', 'gclid', 'dclid', 'gbraid', 'wbraid', 'msclkid', 'yclid',
+    'mc_cid', 'mc_eid', 'igshid', '_ga', '_gl', '_hsenc', '_hsmi', 'ref_src',
+    'phpsessid', 'jsessionid', 'sessionid'
+])
+TRACKING_PREFIXES = ('utm_',)
+
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+def canonical_query(query: str, allowed_params: Optional[FrozenSet[str]] = None) -> str:
+    """
+    Drop tracking parameters and sort the rest by name
+
+    Parameters are compared by their decoded name but kept exactly as
+    they were encoded; repeated names keep their relative order.
+
+    Args:
+        query: Raw query string (without '?')
+        allowed_params: Keep only these parameter names (None keeps every
+            parameter that is not a tracking parameter)
+    """
+    params = []
+    for param in query.split('&'):
+        if not param:
+            continue
+        name = unquote_plus(param.partition('=')[0])
+        if allowed_params is not None:
+            if name not in allowed_params:
+                continue
+        elif name.lower() in TRACKING_PARAMS or name.lower().startswith(TRACKING_PREFIXES):
+            continue
+        params.append((name, param))
+    params.sort(key=lambda item: item[0])
+    return '&'.join(param for _, param in params)
+
+def canonicalize_parts(parts: SplitResult, allowed_params: Optional[FrozenSet[str]] = None) -> str:
+    """canonicalize_url() for an already split URL"""
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    host, _, port = netloc.rpartition(':')
+    if host and port == DEFAULT_PORTS.get(scheme):
+        netloc = host
+    query = canonical_query(parts.query, allowed_params) if parts.query else ''
+    return urlunsplit((scheme, netloc, parts.path, query, ''))
+
+def canonicalize_url(url: str, allowed_params: Optional[Iterable[str]] = None) -> str:
+    """
+    Canonical form of a URL
+
+    The scheme and host are lowercased, default ports and the fragment
+    are removed and the query is reduced by canonical_query(), so URL
+    variants that only differ in tracking parameters or parameter order
+    map to the same page.
+
+    Args:
+        url: Absolute URL
+        allowed_params: Query parameter whitelist (see canonical_query)
+
+    Returns:
+        Canonical URL (the input unchanged if it cannot be parsed)
+    """
+    if allowed_params is not None and not isinstance(allowed_params, frozenset):
+        allowed_params = frozenset(allowed_params)
+    try:
+        return canonicalize_parts(urlsplit(url), allowed_params)
+    except ValueError:
+        return url
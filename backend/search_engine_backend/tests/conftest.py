@@ -0,0 +1,106 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from src.models.page import db, upgrade_schema
+from src.storage import init_storage
+from src.routes import search as search_routes
+
+# Database URL of a PostgreSQL server the backend tests may wipe. Without it
+# a throwaway container is started when testcontainers is installed,
+# otherwise the PostgreSQL variants are skipped
+POSTGRES_URL_ENV = 'TEST_POSTGRES_URL'
+
+def create_app(database_uri: str, **config) -> Flask:
+    """Application with the search blueprint on the given database"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TESTING'] = True
+    app.config['CRAWL_JOB_WORKERS'] = 1
+    app.config.update(config)
+    app.register_blueprint(search_routes.search_bp, url_prefix='/api')
+    init_storage(app)
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+        search_routes.init_search_routes(app)
+    return app
+
+def make_page(number: int, title: str, content: str, domain: str = 'example.com') -> dict:
+    """Page dictionary as produced by the crawler"""
+    return {
+        'url': f'http://{domain}/page/{number}',
+        'domain': domain,
+        'title': title,
+        'description': '',
+        'keywords': '',
+        'content': content,
+        'content_hash': f'{number}-{hash(content)}'
+    }
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app(f"sqlite:///{tmp_path / 'test.db'}")
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def indexer(app):
+    return search_routes.indexer
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def reset_postgres(url: str) -> None:
+    """Drop every table of the app so a test starts from an empty database"""
+    from src.postgres import search_metadata
+    engine = create_engine(url)
+    try:
+        search_metadata.drop_all(engine)
+        db.metadata.drop_all(engine)
+    finally:
+        engine.dispose()
+
+@pytest.fixture(scope='session')
+def postgres_url():
+    pytest.importorskip('psycopg2')
+    url = os.environ.get(POSTGRES_URL_ENV)
+    if url:
+        yield url
+        return
+
+    try:
+        from testcontainers.postgres import PostgresContainer
+    except ImportError:
+        pytest.skip(f'Set {POSTGRES_URL_ENV} or install testcontainers to test PostgreSQL')
+    container = PostgresContainer('postgres:16', driver='psycopg2')
+    try:
+        container.start()
+    except Exception as e:
+        pytest.skip(f'Cannot start a PostgreSQL container: {str(e)}')
+    try:
+        yield container.get_connection_url()
+    finally:
+        container.stop()
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def backend_app(request, tmp_path):
+    """App on every storage backend"""
+    if request.param == 'sqlite':
+        url = f"sqlite:///{tmp_path / 'test.db'}"
+    else:
+        url = request.getfixturevalue('postgres_url')
+        reset_postgres(url)
+    app = create_app(url)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
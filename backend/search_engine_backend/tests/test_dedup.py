@@ -0,0 +1,27 @@
+import hashlib
+from src.analysis import tokenize
+from src.dedup import simhash, hamming_distance
+
+def reference_simhash(text, shingle_size=3):
+    """Straightforward per-bit vote count the fast version must reproduce"""
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+    shingles = [' '.join(tokens[i:i + shingle_size]) for i in range(max(1, len(tokens) - shingle_size + 1))]
+    votes = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+        for bit in range(64):
+            votes[bit] += value >> bit & 1
+    return sum(1 << bit for bit in range(64) if votes[bit] > len(shingles) / 2)
+
+TEXT = ' '.join(f'word{i % 37} topic{i % 11} item{i}' for i in range(300))
+
+def test_matches_reference_votes():
+    for text in ('', 'hello', 'two words', 'one two three', TEXT, TEXT[:500]):
+        assert simhash(text) == reference_simhash(text)
+
+def test_near_duplicates_are_close():
+    edited = TEXT.replace('item150', 'changed150')
+    assert hamming_distance(simhash(TEXT), simhash(edited)) <= 3
+    assert hamming_distance(simhash(TEXT), simhash('completely different words here')) > 3
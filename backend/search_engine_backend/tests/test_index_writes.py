@@ -0,0 +1,48 @@
+from src import inverted_index
+from src.models.index import FieldStatistics
+from src.models.page import db
+from src.routes import search as search_routes
+from src.statistics import get_counters, increment_counters, increment_rows, INDEX_TERMS
+
+def test_term_ids_survive_terms_added_by_another_writer(backend_app, monkeypatch):
+    store = search_routes.indexer.inverted_index
+    with backend_app.app_context():
+        existing = store.get_term_ids(['crawler'], create=True)
+        db.session.commit()
+        before = get_counters([INDEX_TERMS])[INDEX_TERMS]
+
+        # The first lookup misses 'crawler', as if another process inserted
+        # it between our lookup and our insert
+        real_chunks = inverted_index._chunks
+        lookups = []
+        def stale_first_lookup(items, *args):
+            lookups.append(items)
+            return iter(()) if len(lookups) == 1 else real_chunks(items, *args)
+        monkeypatch.setattr(inverted_index, '_chunks', stale_first_lookup)
+
+        term_ids = store.get_term_ids(['crawler', 'spider'], create=True)
+        db.session.commit()
+
+        assert term_ids['crawler'] == existing['crawler']
+        assert set(term_ids) == {'crawler', 'spider'}
+        assert get_counters([INDEX_TERMS])[INDEX_TERMS] == before + 1
+
+def test_increment_rows_creates_and_adds(backend_app):
+    table = FieldStatistics.__table__
+    with backend_app.app_context():
+        increment_rows(table, 'field', [{'field': 'extra', 'doc_count': 2, 'total_length': 10}])
+        increment_rows(table, 'field', [{'field': 'extra', 'doc_count': 1, 'total_length': 5}])
+        increment_rows(table, 'field', [{'field': 'extra', 'doc_count': -1, 'total_length': -4},
+                                        {'field': 'missing', 'doc_count': -1, 'total_length': -4}])
+        db.session.commit()
+
+        row = db.session.get(FieldStatistics, 'extra')
+        assert (row.doc_count, row.total_length) == (2, 11)
+        assert db.session.get(FieldStatistics, 'missing') is None
+
+def test_increment_counters(backend_app):
+    with backend_app.app_context():
+        increment_counters({'test_counter': 3})
+        increment_counters({'test_counter': 4, 'unchanged': 0})
+        db.session.commit()
+        assert get_counters(['test_counter', 'unchanged']) == {'test_counter': 7, 'unchanged': 0}
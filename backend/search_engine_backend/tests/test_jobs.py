@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+import threading
+from src.jobs import CrawlJobQueue
+from src.models.job import CrawlJob
+from src.models.page import db
+
+def add_job(status, owner=None, heartbeat_age=None):
+    updated_at = datetime.utcnow() - timedelta(seconds=heartbeat_age) if heartbeat_age is not None else None
+    job = CrawlJob(urls='["http://example.com/"]', total_urls=1, status=status,
+                   owner=owner, updated_at=updated_at)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+def queued_ids(jobs):
+    ids = []
+    while not jobs._queue.empty():
+        ids.append(jobs._queue.get_nowait())
+    return ids
+
+def test_resume_only_takes_over_expired_leases(app, indexer):
+    with app.app_context():
+        queued = add_job('queued')
+        expired = add_job('running', owner='other:1:a', heartbeat_age=600)
+        live = add_job('running', owner='other:2:b', heartbeat_age=5)
+        finished = add_job('completed', owner='other:1:a', heartbeat_age=600)
+
+    jobs = CrawlJobQueue(indexer, lease_seconds=120)
+    jobs._resume_unfinished_jobs()
+
+    assert queued_ids(jobs) == [queued, expired]
+    with app.app_context():
+        assert db.session.get(CrawlJob, expired).status == 'queued'
+        assert db.session.get(CrawlJob, expired).owner is None
+        assert db.session.get(CrawlJob, live).status == 'running'
+        assert db.session.get(CrawlJob, live).owner == 'other:2:b'
+        assert db.session.get(CrawlJob, finished).status == 'completed'
+
+def test_renew_leases_only_touches_own_jobs(app, indexer):
+    jobs = CrawlJobQueue(indexer, lease_seconds=120)
+    with app.app_context():
+        own = add_job('running', owner=jobs.owner, heartbeat_age=100)
+        other = add_job('running', owner='other:2:b', heartbeat_age=100)
+
+    assert jobs.renew_leases() == 1
+    with app.app_context():
+        cutoff = datetime.utcnow() - timedelta(seconds=10)
+        assert db.session.get(CrawlJob, own).updated_at > cutoff
+        assert db.session.get(CrawlJob, other).updated_at < cutoff
+
+def test_finish_ignores_jobs_owned_by_another_process(app, indexer):
+    jobs = CrawlJobQueue(indexer, lease_seconds=120)
+    with app.app_context():
+        other = add_job('running', owner='other:2:b', heartbeat_age=5)
+
+    jobs._finish(other, 'completed')
+    with app.app_context():
+        assert db.session.get(CrawlJob, other).status == 'running'
+
+def test_heartbeat_sweep_reclaims_leases_that_expire_later(app, indexer):
+    jobs = CrawlJobQueue(indexer, lease_seconds=120)
+    with app.app_context():
+        job_id = add_job('running', owner='other:2:b', heartbeat_age=5)
+
+    assert jobs.reclaim_expired_leases() == []
+    with app.app_context():
+        job = db.session.get(CrawlJob, job_id)
+        job.updated_at = datetime.utcnow() - timedelta(seconds=600)
+        db.session.commit()
+
+    assert jobs.reclaim_expired_leases() == [job_id]
+    with app.app_context():
+        job = db.session.get(CrawlJob, job_id)
+        assert job.status == 'queued'
+        assert job.owner is None
+    assert jobs.reclaim_expired_leases() == []
+
+def test_heartbeat_queues_jobs_whose_lease_expires(app, indexer):
+    jobs = CrawlJobQueue(indexer, lease_seconds=1)
+    with app.app_context():
+        job_id = add_job('running', owner='other:2:b', heartbeat_age=0)
+
+    threading.Thread(target=jobs._heartbeat, daemon=True).start()
+    assert jobs._queue.get(timeout=5) == job_id
@@ -0,0 +1,63 @@
+import pytest
+from conftest import make_page
+from src.metrics import MetricsRegistry
+
+def test_render_counters_and_histograms():
+    registry = MetricsRegistry()
+    registry.counter('sse_pages_total', 'Pages seen', outcome='indexed').inc(3)
+    registry.counter('sse_pages_total', 'Pages seen', outcome='failed').inc()
+    histogram = registry.histogram('sse_wait_seconds', 'Time spent waiting')
+    histogram.observe(0.0001)
+    histogram.observe(0.3)
+    histogram.observe(20.0)
+
+    lines = registry.render().splitlines()
+    assert lines[:4] == [
+        '# HELP sse_pages_total Pages seen',
+        '# TYPE sse_pages_total counter',
+        'sse_pages_total{outcome="failed"} 1',
+        'sse_pages_total{outcome="indexed"} 3'
+    ]
+    assert lines[4:6] == ['# HELP sse_wait_seconds Time spent waiting', '# TYPE sse_wait_seconds histogram']
+    # Buckets are cumulative and the upper bound is inclusive
+    assert 'sse_wait_seconds_bucket{le="0.0001"} 1' in lines
+    assert 'sse_wait_seconds_bucket{le="0.25"} 1' in lines
+    assert 'sse_wait_seconds_bucket{le="0.5"} 2' in lines
+    assert 'sse_wait_seconds_bucket{le="10.0"} 2' in lines
+    assert lines[-3:] == [
+        'sse_wait_seconds_bucket{le="+Inf"} 3',
+        'sse_wait_seconds_sum 20.3001',
+        'sse_wait_seconds_count 3'
+    ]
+
+def test_render_labels_histograms_and_escapes_values():
+    registry = MetricsRegistry()
+    registry.histogram('sse_stage_seconds', 'Stages', stage='fetch').observe(0.002)
+    registry.counter('sse_errors_total', 'Errors', message='bad "quote"\\\n').inc()
+
+    text = registry.render()
+    assert text.endswith('\n')
+    assert 'sse_stage_seconds_bucket{stage="fetch",le="0.0025"} 1\n' in text
+    assert 'sse_stage_seconds_count{stage="fetch"} 1\n' in text
+    assert 'sse_errors_total{message="bad \\"quote\\"\\\\\\n"} 1\n' in text
+
+def test_metric_kind_cannot_change():
+    registry = MetricsRegistry()
+    registry.counter('sse_thing', 'A counter')
+    with pytest.raises(ValueError):
+        registry.histogram('sse_thing', 'Not a counter', stage='x')
+
+def test_metrics_endpoint_and_search_profile(client, indexer):
+    indexer.index_pages([make_page(1, 'Search engines', 'how search engines rank pages')])
+
+    response = client.get('/api/search', query_string={'q': 'search'}, headers={'X-Search-Profile': '1'})
+    data = response.get_json()
+    assert data['total'] == 1
+    assert {'query_parse', 'ranking', 'serialization'} <= set(data['profile'])
+    assert 'ranking;dur=' in response.headers['Server-Timing']
+
+    response = client.get('/api/metrics')
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert '# TYPE sse_stage_duration_seconds histogram' in text
+    assert 'sse_stage_duration_seconds_count{stage="ranking"}' in text
@@ -0,0 +1,60 @@
+import pytest
+from conftest import make_page
+from src.routes.search import encode_cursor
+
+# Pages per domain, deliberately inserted out of domain order
+DOMAIN_PAGES = {'b.example': 4, 'a.example': 3, 'c.example': 2}
+
+@pytest.fixture
+def listed(indexer):
+    pages = []
+    for domain, count in DOMAIN_PAGES.items():
+        for number in range(count):
+            pages.append(make_page(number, f'{domain} page {number}', f'listing {domain} {number}', domain))
+    assert indexer.index_pages(pages) == len(pages)
+    return sorted((page['domain'], page['url']) for page in pages)
+
+def walk(client, limit, domain=None):
+    """Follow next_cursor to the end, returning every response"""
+    responses = []
+    params = {'limit': limit}
+    if domain:
+        params['domain'] = domain
+    while True:
+        response = client.get('/api/pages', query_string=params)
+        assert response.status_code == 200
+        responses.append(response.get_json())
+        cursor = responses[-1]['next_cursor']
+        if not cursor:
+            return responses
+        params['cursor'] = cursor
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 4, 9, 20])
+def test_cursor_walk_returns_every_page_once_in_order(client, listed, limit):
+    responses = walk(client, limit)
+
+    listed_pages = [(page['domain'], page['url']) for data in responses for page in data['pages']]
+    assert listed_pages == listed
+    assert all(len(data['pages']) == limit for data in responses[:-1])
+    # A full last page must not be followed by an empty one
+    assert 0 < len(responses[-1]['pages']) <= limit
+    assert all(data['total'] == len(listed) for data in responses)
+
+def test_cursor_walk_stays_within_the_domain_filter(client, listed):
+    responses = walk(client, 3, domain='b.example')
+
+    urls = [page['url'] for data in responses for page in data['pages']]
+    assert urls == [url for domain, url in listed if domain == 'b.example']
+    assert [len(data['pages']) for data in responses] == [3, 1]
+    assert responses[0]['total'] == DOMAIN_PAGES['b.example']
+
+def test_cursor_of_another_domain_returns_nothing(client, listed):
+    cursor = encode_cursor(('a.example', 1))
+    data = client.get('/api/pages', query_string={'domain': 'b.example', 'cursor': cursor}).get_json()
+    assert data['pages'] == []
+    assert data['next_cursor'] is None
+
+def test_malformed_cursor_is_rejected(client, listed):
+    for cursor in ('not a cursor', encode_cursor(('a.example', 'x'))):
+        response = client.get('/api/pages', query_string={'cursor': cursor})
+        assert response.status_code == 400
@@ -0,0 +1,57 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from src.crawler import WebCrawler
+from src.pipeline import CrawlPipeline
+
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = f'<html><head><title>Page {self.path}</title></head><body><p>pipeline page {self.path}</p></body></html>'.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+def pipeline_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith('pipeline-')]
+
+def make_pipeline(indexer, host):
+    crawler = WebCrawler([host], delay=0, max_workers=1)
+    # Small queues so the fetch and dispatch stages block on the writer
+    return CrawlPipeline(crawler, indexer, processes=1, queue_size=2, batch_size=1), crawler
+
+def test_pipeline_indexes_pages(indexer, server):
+    pipeline, crawler = make_pipeline(indexer, server)
+    try:
+        pages, indexed = pipeline.run([f'http://{server}/page/{number}' for number in range(5)])
+    finally:
+        pipeline.close()
+        crawler.close()
+    assert indexed == 5
+    assert len(pages) == 5
+
+def test_writer_failure_stops_the_other_stages(indexer, server, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError('database is gone')
+    monkeypatch.setattr(indexer, 'index_pages', fail)
+
+    pipeline, crawler = make_pipeline(indexer, server)
+    try:
+        with pytest.raises(RuntimeError):
+            pipeline.run([f'http://{server}/page/{number}' for number in range(40)])
+        assert pipeline_threads() == []
+    finally:
+        pipeline.close()
+        crawler.close()
@@ -0,0 +1,30 @@
+import pytest
+from conftest import make_page
+
+@pytest.fixture
+def pages(indexer):
+    indexer.index_pages([
+        make_page(1, 'Search engines', 'how search engines rank pages'),
+        make_page(2, 'Engineering notes', 'engineering a small web crawler'),
+        make_page(3, 'Database guide', 'storing an inverted index in a database')
+    ])
+
+def search_urls(client, query):
+    data = client.get('/api/search', query_string={'q': query}).get_json()
+    return sorted(result['url'] for result in data['results'])
+
+def test_prefix_matches_every_expansion(client, pages):
+    assert search_urls(client, 'engin*') == ['http://example.com/page/1', 'http://example.com/page/2']
+    assert search_urls(client, 'Engin*') == search_urls(client, 'engin*')
+
+def test_phrase_and_boolean_operators(client, pages):
+    assert search_urls(client, '"search engines"') == ['http://example.com/page/1']
+    assert search_urls(client, '"engines search"') == []
+    assert search_urls(client, 'crawler OR database') == ['http://example.com/page/2', 'http://example.com/page/3']
+    assert search_urls(client, 'engin* -crawler') == ['http://example.com/page/1']
+
+def test_prefix_of_a_whole_word_matches_its_stem(client, pages):
+    # "engines" is indexed as the stem "engin", which also starts "engineering"
+    assert search_urls(client, 'engines*') == search_urls(client, 'engin*')
+    assert search_urls(client, 'databases*') == ['http://example.com/page/3']
+    assert search_urls(client, 'search engines*') == ['http://example.com/page/1']
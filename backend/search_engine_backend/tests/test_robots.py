@@ -0,0 +1,106 @@
+import pytest
+from src.robots import RobotsPolicy
+
+# Example file of RFC 9309, section 2.2.2
+RFC_EXAMPLE = """
+User-Agent: *
+Disallow: *.gif$
+Disallow: /example/
+Allow: /publications/
+
+User-Agent: foobot
+Disallow:/
+Allow:/example/page.html
+Allow:/example/allowed.gif
+
+User-Agent: barbot
+User-Agent: bazbot
+Disallow: /example/page.html
+
+User-Agent: quxbot
+
+Sitemap: https://example.com/sitemap.xml
+"""
+
+@pytest.mark.parametrize('user_agent, path, allowed', [
+    # foobot: its own group applies and the longest match wins
+    ('FooBot/1.0', '/', False),
+    ('FooBot/1.0', '/example/page.html', True),
+    ('FooBot/1.0', '/example/allowed.gif', True),
+    ('FooBot/1.0', '/example/other.html', False),
+    # barbot and bazbot share one group
+    ('barbot', '/example/page.html', False),
+    ('bazbot/2.1', '/example/page.html', False),
+    ('bazbot/2.1', '/example/', True),
+    # quxbot has an empty group, so nothing is disallowed
+    ('quxbot', '/example/page.html', True),
+    # Everybody else gets the '*' group
+    ('SimpleSearchEngine/1.0', '/example/page.html', False),
+    # "/publications/" is a longer match than "*.gif$"
+    ('SimpleSearchEngine/1.0', '/publications/report.gif', True),
+    ('SimpleSearchEngine/1.0', '/images/logo.gif?size=large', True),
+    ('SimpleSearchEngine/1.0', '/publications/report.html', True),
+    ('SimpleSearchEngine/1.0', '/images/logo.gif', False),
+    ('SimpleSearchEngine/1.0', '/robots.txt', True)
+])
+def test_rfc_example_groups(user_agent, path, allowed):
+    assert RobotsPolicy.parse(RFC_EXAMPLE, user_agent).allows(path) is allowed
+
+def test_longest_match_takes_precedence():
+    # RFC 9309, section 5.2
+    policy = RobotsPolicy.parse(
+        'User-Agent: foobot\nAllow: /example/page/\nDisallow: /example/page/disallowed.gif\n',
+        'foobot'
+    )
+    assert policy.allows('/example/page/')
+    assert policy.allows('/example/page/allowed.gif')
+    assert not policy.allows('/example/page/disallowed.gif')
+
+    # Order in the file does not matter, only the length of the match
+    policy = RobotsPolicy([(False, '/shop/'), (True, '/shop/public'), (False, '/shop/public/drafts')])
+    assert not policy.allows('/shop/cart')
+    assert policy.allows('/shop/public/item')
+    assert not policy.allows('/shop/public/drafts/1')
+
+def test_allow_wins_a_tie():
+    assert RobotsPolicy([(False, '/page'), (True, '/page')]).allows('/page')
+    assert RobotsPolicy([(True, '/page'), (False, '/page')]).allows('/page')
+
+def test_wildcards_and_end_anchor():
+    policy = RobotsPolicy([(False, '/*.php$'), (False, '/private*/'), (True, '/public-$')])
+    assert not policy.allows('/index.php')
+    assert policy.allows('/index.php?page=1')
+    assert policy.allows('/index.phps')
+    assert not policy.allows('/private-area/file')
+    assert policy.allows('/private-area')
+    assert policy.allows('/public-')
+    # Regex characters in patterns are literal
+    assert RobotsPolicy([(False, '/a.b')]).allows('/axb')
+
+def test_empty_rules_comments_and_other_lines():
+    policy = RobotsPolicy.parse(
+        '# robots.txt\n'
+        'User-agent: *   # everyone\n'
+        'Disallow:\n'
+        'Allow:\n'
+        'Noindex: /hidden\n'
+        'Crawl-delay: 2.5\n'
+        'Crawl-delay: 10\n'
+        'Disallow: /tmp # scratch\n',
+        'SimpleSearchEngine/1.0'
+    )
+    assert policy.allows('/')
+    assert policy.allows('/hidden')
+    assert not policy.allows('/tmp/file')
+    assert policy.crawl_delay == 2.5
+
+def test_sitemaps_and_crawl_delay_of_the_matching_group():
+    policy = RobotsPolicy.parse(RFC_EXAMPLE + '\nUser-agent: quxbot\nCrawl-delay: 4\n', 'quxbot/1.0')
+    assert policy.sitemaps == ['https://example.com/sitemap.xml']
+    assert policy.crawl_delay == 4.0
+    assert RobotsPolicy.parse(RFC_EXAMPLE, 'foobot').crawl_delay is None
+
+def test_missing_and_unreachable_robots_files():
+    assert RobotsPolicy.allow_all().allows('/anything')
+    assert not RobotsPolicy.disallow_all().allows('/anything')
+    assert RobotsPolicy.disallow_all().allows('/robots.txt')
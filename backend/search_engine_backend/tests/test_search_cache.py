@@ -0,0 +1,19 @@
+from src.cache import QueryCache
+from conftest import make_page
+
+def test_key_ignores_whitespace_but_keeps_case():
+    assert QueryCache.make_key('  rust   OR flask ', 10) == QueryCache.make_key('rust OR flask', 10)
+    assert QueryCache.make_key('rust OR flask', 10) != QueryCache.make_key('rust or flask', 10)
+
+def test_lowercase_operator_is_not_served_from_cache(indexer, client):
+    indexer.index_pages([
+        make_page(1, 'Rust guide', 'systems programming with rust and cargo'),
+        make_page(2, 'Flask guide', 'web applications with flask and jinja')
+    ])
+
+    first = client.get('/api/search', query_string={'q': 'rust OR flask'}).get_json()
+    second = client.get('/api/search', query_string={'q': 'rust or flask'}).get_json()
+
+    assert first['total'] == 2
+    # "or" is an ordinary (stop)word, so both words must match one page
+    assert second['total'] == 0
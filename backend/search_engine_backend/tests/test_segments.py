@@ -0,0 +1,127 @@
+import pytest
+from conftest import create_app, make_page
+from src.inverted_index import InvertedIndex
+from src.models.page import db
+from src.routes import search as search_routes
+from src.segments import Segment, SegmentIndex, write_segment
+
+FIELDS = ['title', 'content']
+
+@pytest.fixture
+def segment_app(tmp_path):
+    app = create_app(
+        f"sqlite:///{tmp_path / 'test.db'}",
+        SEARCH_SEGMENT_DIR=str(tmp_path / 'segments'),
+        SEARCH_SEGMENT_MAX=2
+    )
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def segment_indexer(segment_app):
+    return search_routes.indexer
+
+def table_results(app, indexer, query):
+    """Results of the same query answered from the index tables"""
+    tables = InvertedIndex(indexer.inverted_index.ranker, indexer.analyzer)
+    with app.app_context():
+        return tables.search(query, limit=50)
+
+def segment_results(app, indexer, query):
+    with app.app_context():
+        return indexer.inverted_index.search(query, limit=50)
+
+def assert_same_results(app, indexer, query):
+    expected = table_results(app, indexer, query)
+    actual = segment_results(app, indexer, query)
+    assert [page_id for page_id, _ in actual] == [page_id for page_id, _ in expected]
+    for (_, actual_score), (_, expected_score) in zip(actual, expected):
+        assert actual_score == pytest.approx(expected_score)
+
+def test_segment_round_trip(tmp_path):
+    path = str(tmp_path / 'one.sseg')
+    documents = [
+        (7, {('crawl', 'title'): [0], ('crawl', 'content'): [2, 5], ('web', 'content'): [1]}, {'title': 1, 'content': 6}),
+        (3, {('web', 'title'): [0, 1]}, {'title': 2, 'content': 0})
+    ]
+    assert write_segment(path, documents, FIELDS) == 2
+
+    segment = Segment(path)
+    assert list(segment.page_ids) == [3, 7]
+    assert segment.document_number(7) == 1
+    assert segment.document_number(5) is None
+    assert segment.document_lengths(1) == {'title': 1, 'content': 6}
+    assert segment.find('missing') is None
+
+    web = segment.find('web')
+    assert segment.doc_freq(web) == 2
+    assert list(segment.read_entries(web)) == [(0, [(0, 2, [0, 1])]), (1, [(1, 1, [1])])]
+    crawl = segment.find('crawl')
+    assert list(segment.read_entries(crawl, with_positions=False)) == [(1, [(0, 1, []), (1, 2, [])])]
+    assert list(segment.prefix_range('cr')) == [('crawl', 1)]
+
+def test_updates_and_deletes_are_visible(tmp_path):
+    index = SegmentIndex(str(tmp_path), FIELDS, max_segments=10)
+    index.commit([
+        (1, {('old', 'content'): [0]}, {'title': 0, 'content': 1}),
+        (2, {('old', 'content'): [0]}, {'title': 0, 'content': 1})
+    ])
+    index.commit([(1, {('new', 'content'): [0]}, {'title': 0, 'content': 1})])
+
+    assert index.doc_count() == 2
+    # The superseded copy of page 1 is neither matched nor counted
+    assert index.postings('old') == {2: {'content': 1}}
+    assert index.lookup(['old', 'new']) == {'old': ('old', 1), 'new': ('new', 1)}
+    assert index.expand_prefix('o', 10) == [('old', 1)]
+
+    index.commit([], deleted=[2])
+    assert index.doc_count() == 1
+    assert index.postings('old') == {}
+    assert index.lookup(['old']) == {}
+    assert index.field_statistics() == [('title', 1, 0), ('content', 1, 1)]
+
+def test_merge_drops_deleted_documents(tmp_path):
+    index = SegmentIndex(str(tmp_path), FIELDS, max_segments=10)
+    for page_id in range(1, 5):
+        index.commit([(page_id, {('page', 'content'): [0, 1]}, {'title': 0, 'content': 2})])
+    index.commit([], deleted=[2])
+
+    index.max_segments = 1
+    assert index.merge()
+    while index.merge():
+        pass
+
+    segments = index.segments()
+    assert len(segments) == 1
+    assert list(segments[0].page_ids) == [1, 3, 4]
+    assert segments[0].deleted == frozenset()
+    assert index.lookup(['page']) == {'page': ('page', 3)}
+    assert index.positions(['page'], {3}) == {(3, 'content'): {'page': {0, 1}}}
+
+def test_segment_scores_match_tables_after_updates(segment_app, segment_indexer):
+    segment_indexer.index_pages([
+        make_page(1, 'Search engines', 'how search engines rank pages'),
+        make_page(2, 'Engineering notes', 'engineering a small web crawler'),
+        make_page(3, 'Database guide', 'storing an inverted index in a database'),
+        make_page(4, 'Crawler design', 'a polite crawler fetches pages per host')
+    ])
+    # Updates leave superseded copies behind in older segments
+    segment_indexer.index_pages([
+        make_page(1, 'Search engines', 'search engines rank pages with an inverted index'),
+        make_page(4, 'Crawler design', 'the crawler obeys robots rules')
+    ])
+    segment_indexer.index_page(make_page(3, 'Database guide', 'a database stores the crawler index'))
+    segment_indexer.deactivate_pages(['http://example.com/page/2'])
+
+    for query in ['crawler', 'index', 'search engin*', '"inverted index"', 'crawler OR pages']:
+        assert_same_results(segment_app, segment_indexer, query)
+
+    segments = segment_indexer.inverted_index.segments
+    if segments._merge_thread is not None:
+        segments._merge_thread.join()
+    while segments.merge():
+        pass
+    assert len(segments.segments()) <= 2
+    assert_same_results(segment_app, segment_indexer, 'crawler')
@@ -0,0 +1,64 @@
+from conftest import make_page
+from src.models.index import IndexTerm, Posting, DocumentLength
+from src.models.page import Page, db
+
+def baseline(app):
+    """The statistics recomputed from the tables with COUNT(*)"""
+    with app.app_context():
+        per_domain = dict(db.session.execute(
+            db.select(Page.domain, db.func.count(Page.id))
+            .where(Page.is_active == True)
+            .group_by(Page.domain)
+        ).all())
+        return {
+            'total_pages': sum(per_domain.values()),
+            'pages_per_domain': per_domain,
+            'terms': db.session.execute(db.select(db.func.count(IndexTerm.id))).scalar(),
+            'postings': db.session.execute(db.select(db.func.count()).select_from(Posting)).scalar(),
+            'tokens': db.session.execute(db.select(db.func.sum(DocumentLength.length))).scalar() or 0
+        }
+
+def assert_counters_match(client, app):
+    stats = client.get('/api/stats').get_json()
+    expected = baseline(app)
+    assert stats['total_pages'] == expected['total_pages']
+    assert stats['pages_per_domain'] == expected['pages_per_domain']
+    assert stats['index']['terms'] == expected['terms']
+    assert stats['index']['postings'] == expected['postings']
+    assert stats['index']['tokens'] == expected['tokens']
+
+def crawl(indexer, numbers, domain, version=0):
+    return indexer.index_pages([
+        make_page(number, f'{domain} page {number}',
+                  f'statistics page {number} of {domain} version {version} ' * (number + 1), domain)
+        for number in numbers
+    ])
+
+def test_counters_follow_inserts_and_updates(client, app, indexer):
+    crawl(indexer, range(5), 'a.example')
+    crawl(indexer, range(3), 'b.example')
+    assert_counters_match(client, app)
+
+    crawl(indexer, range(2, 7), 'a.example', version=1)
+    indexer.index_page(make_page(9, 'single page', 'indexed on its own', 'c.example'))
+    assert_counters_match(client, app)
+    assert client.get('/api/stats').get_json()['total_pages'] == 11
+
+def test_counters_follow_deactivation_and_reactivation(client, app, indexer):
+    crawl(indexer, range(4), 'a.example')
+    crawl(indexer, range(2), 'b.example')
+
+    deactivated = [f'http://a.example/page/{number}' for number in (0, 1)] + ['http://b.example/page/0']
+    assert indexer.deactivate_pages(deactivated) == 3
+    assert_counters_match(client, app)
+    assert client.get('/api/stats').get_json()['pages_per_domain'] == {'a.example': 2, 'b.example': 1}
+
+    # Deactivating again changes nothing
+    assert indexer.deactivate_pages(deactivated) == 0
+    assert_counters_match(client, app)
+
+    # A crawl reactivates the pages, through both write paths
+    crawl(indexer, range(2), 'a.example')
+    indexer.index_page(make_page(0, 'b.example page 0', 'statistics page 0 of b.example version 0 ', 'b.example'))
+    assert_counters_match(client, app)
+    assert client.get('/api/stats').get_json()['total_pages'] == 6
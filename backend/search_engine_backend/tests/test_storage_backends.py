@@ -0,0 +1,91 @@
+import pytest
+from src.models.page import Page, db
+from src.routes import search as search_routes
+from conftest import make_page
+
+PAGES = [
+    make_page(1, 'Rust guide', 'systems programming with rust and cargo'),
+    make_page(2, 'Flask guide', 'web applications with flask and jinja in python'),
+    make_page(3, 'Python guide', 'python scripting for data analysis and automation'),
+    make_page(4, 'Crawler notes', 'a crawler programmed in python fetches web pages', domain='docs.example.com')
+]
+
+@pytest.fixture
+def client(backend_app):
+    search_routes.indexer.index_pages(PAGES)
+    return backend_app.test_client()
+
+def result_ids(client, query):
+    response = client.get('/api/search', query_string={'q': query, 'limit': 50})
+    assert response.status_code == 200
+    return {int(result['url'].rsplit('/', 1)[1]) for result in response.get_json()['results']}
+
+def test_indexed_pages_are_found(client):
+    assert result_ids(client, 'rust') == {1}
+    assert result_ids(client, 'python') == {2, 3, 4}
+    assert result_ids(client, 'unknownword') == set()
+
+@pytest.mark.parametrize('query, expected', [
+    ('python web', {2, 4}),
+    ('python AND web', {2, 4}),
+    ('rust OR flask', {1, 2}),
+    ('python -flask', {3, 4}),
+    ('python NOT (flask OR crawler)', {3}),
+    ('(rust OR scripting) AND programming', {1})
+])
+def test_boolean_queries(client, query, expected):
+    assert result_ids(client, query) == expected
+
+def test_phrase_queries(client):
+    assert result_ids(client, '"web applications"') == {2}
+    assert result_ids(client, '"applications web"') == set()
+    assert result_ids(client, '"fetches web pages"') == {4}
+
+def test_prefix_queries(client):
+    assert result_ids(client, 'prog*') == {1, 4}
+    assert result_ids(client, 'autom*') == {3}
+    # Whole words are also expanded by their stem
+    assert result_ids(client, 'applications*') == {2}
+    assert result_ids(client, 'programmed*') == {1, 4}
+
+def test_suggestions_are_words(client):
+    search_routes.indexer.load_suggestions()
+    data = client.get('/api/suggest', query_string={'q': 'appl'}).get_json()
+    assert [suggestion['text'] for suggestion in data['suggestions']] == ['applications']
+
+def test_keyset_pagination(client):
+    seen = []
+    cursor = ''
+    while True:
+        body = client.get('/api/pages', query_string={'limit': 3, 'cursor': cursor}).get_json()
+        assert body['total'] == len(PAGES)
+        seen += [page['url'] for page in body['pages']]
+        cursor = body['next_cursor']
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(page['url'] for page in PAGES)
+    assert len(seen) == len(set(seen))
+
+def test_reindexing_replaces_old_terms(client):
+    changed = make_page(1, 'Rust guide', 'asynchronous rust with tokio')
+    search_routes.indexer.index_pages([changed])
+    assert result_ids(client, 'cargo') == set()
+    assert result_ids(client, 'tokio') == {1}
+
+def test_removed_documents_no_longer_match(backend_app, client):
+    indexer = search_routes.indexer
+    with backend_app.app_context():
+        page_id = db.session.execute(db.select(Page.id).where(Page.url == PAGES[2]['url'])).scalar()
+        indexer.inverted_index.remove_documents([page_id])
+        db.session.commit()
+    assert result_ids(client, 'scripting') == set()
+    assert result_ids(client, 'python') == {2, 4}
+
+def test_deactivated_pages_no_longer_match(client):
+    assert search_routes.indexer.deactivate_pages([PAGES[0]['url']]) == 1
+    assert result_ids(client, 'rust') == set()
+    assert result_ids(client, 'prog*') == {4}
+
+def test_analyzer_checksum_is_recorded(backend_app):
+    with backend_app.app_context():
+        assert search_routes.indexer.inverted_index.uses_current_analyzer()
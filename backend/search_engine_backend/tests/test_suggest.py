@@ -0,0 +1,44 @@
+from conftest import make_page
+from src.suggest import Suggester, is_free_text
+
+def test_free_text_detection():
+    assert is_free_text('python web crawler')
+    assert is_free_text('python and not rust')
+    assert is_free_text('e-mail client')
+    assert not is_free_text('python AND NOT rust')
+    assert not is_free_text('pyth*')
+    assert not is_free_text('"web crawler"')
+    assert not is_free_text('python -django')
+    assert not is_free_text('(python OR ruby) web')
+
+def test_only_free_text_queries_become_suggestions():
+    suggester = Suggester()
+    for query in ('Python Flask', 'python AND NOT rust', 'pyth*', 'python OR ruby'):
+        suggester.record_query(query)
+
+    suggestions = suggester.suggest('py')
+    assert [suggestion['text'] for suggestion in suggestions] == ['python flask']
+
+def suggested_words(client, text):
+    data = client.get('/api/suggest', query_string={'q': text}).get_json()
+    return [suggestion['text'] for suggestion in data['suggestions'] if suggestion['type'] == 'term']
+
+def test_term_suggestions_are_words_not_stems(client, indexer):
+    indexer.index_pages([
+        make_page(1, 'Search engines', 'search engines index a database of pages'),
+        make_page(2, 'Engine notes', 'an engine reads databases and a database stores pages'),
+        make_page(3, 'Databases', 'choosing a database for a search engine')
+    ])
+    # Written one by one as well, through index_page
+    indexer.index_page(make_page(4, 'Engineering', 'engineering a database engine'))
+
+    assert suggested_words(client, 'eng') == ['engine', 'engineering']
+    assert suggested_words(client, 'datab') == ['database']
+    assert suggested_words(client, 'search eng') == ['search engine', 'search engineering']
+    # The typed word may be longer than the stem
+    assert suggested_words(client, 'engine') == ['engine', 'engineering']
+
+    # Reloaded from the database, the surface forms stay
+    indexer.load_suggestions()
+    assert suggested_words(client, 'eng') == ['engine', 'engineering']
+    assert suggested_words(client, 'datab') == ['database']
@@ -0,0 +1,22 @@
+from conftest import make_page
+
+def canonical_page(number, requested_url):
+    page = make_page(number, 'Guide', f'conditional requests number {number} with etags')
+    page.update(requested_url=requested_url, etag=f'"v{number}"', last_modified='Sat, 01 Jan 2026 00:00:00 GMT')
+    return page
+
+def test_validators_found_by_requested_url(indexer):
+    indexer.index_pages([canonical_page(1, 'http://example.com/page/1?ref=home')])
+    indexer.index_page(canonical_page(2, 'http://example.com/old/2'))
+
+    validators = indexer.get_validators([
+        'http://example.com/page/1?ref=home', 'http://example.com/old/2', 'http://example.com/page/1'
+    ])
+
+    assert validators['http://example.com/page/1?ref=home']['etag'] == '"v1"'
+    assert validators['http://example.com/old/2']['etag'] == '"v2"'
+    assert validators['http://example.com/page/1']['etag'] == '"v1"'
+
+def test_unknown_urls_have_no_validators(indexer):
+    indexer.index_pages([canonical_page(1, 'http://example.com/page/1')])
+    assert indexer.get_validators(['http://example.com/missing']) == {}